@@ -0,0 +1,249 @@
+"""Run a JSONL file of questions through the Dexter graph in bulk.
+
+Each input line is a JSON object with a "question" field, an optional "id"
+(the line number is used otherwise) and an optional "team" used for fair
+scheduling between teams and to search that team's own document index.
+Answers are appended to the output JSONL as they complete, and completed ids are recorded in a progress
+checkpoint so an interrupted run can be resumed with the same command.
+
+    python batch_runner.py questions.jsonl answers.jsonl --concurrency 8
+    python batch_runner.py questions.jsonl answers.jsonl --fake  # no network
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+def load_questions(input_path: str) -> List[Dict]:
+    """Read questions from JSONL, assigning line-number ids where missing."""
+    questions = []
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "question" not in item:
+                raise ValueError(f"Line {line_number} has no 'question' field")
+            item["id"] = str(item.get("id", line_number))
+            questions.append(item)
+    return questions
+
+
+def load_completed_ids(output_path: str, checkpoint_path: str) -> Set[str]:
+    """Collect ids already answered, from the checkpoint and the output file.
+
+    The output file is also scanned because a crash can land between writing
+    an answer and updating the checkpoint.
+    """
+    completed = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding="utf-8") as f:
+            completed.update(json.load(f).get("completed_ids", []))
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written line from a crash
+                if "answer" in record:
+                    completed.add(str(record["id"]))
+    return completed
+
+
+class ProgressCheckpoint:
+    """Thread-safe progress file, rewritten atomically after each answer."""
+
+    def __init__(self, path: str, completed_ids: Set[str], total: int):
+        self.path = path
+        self.completed_ids = set(completed_ids)
+        self.failed_ids: Set[str] = set()
+        self.total = total
+        self.started_at = datetime.now().isoformat()
+        self._lock = threading.Lock()
+
+    def mark(self, question_id: str, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.completed_ids.add(question_id)
+                self.failed_ids.discard(question_id)
+            else:
+                self.failed_ids.add(question_id)
+            self._write()
+
+    def _write(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "started_at": self.started_at,
+                    "updated_at": datetime.now().isoformat(),
+                    "total": self.total,
+                    "completed": len(self.completed_ids),
+                    "failed_ids": sorted(self.failed_ids),
+                    "completed_ids": sorted(self.completed_ids),
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+
+def answer_question(app, item: Dict, budget_seconds: float = 0) -> Dict:
+    """Run one question through the compiled graph and time it.
+
+    Upstream calls are scheduled as batch work, with the item's "team" (if
+    any) as the fairness tenant and as the index namespace searched.
+    Batch work waits behind chat turns, so it only gets a latency budget
+    when `budget_seconds` is set.
+    """
+    from core.budget import budget_overruns
+    from core.scheduler import scheduling
+
+    started = time.perf_counter()
+    configurable = {"budget_seconds": budget_seconds}
+    if item.get("team"):
+        configurable["team_id"] = item["team"]
+    config = {"configurable": configurable}
+    with scheduling(priority="batch", tenant=str(item.get("team", "batch"))):
+        state = app.invoke(
+            {
+                "messages": [HumanMessage(content=item["question"])],
+                "needs_pci_context": False,
+                "pci_context": None,
+            },
+            config=config,
+        )
+    elapsed = time.perf_counter() - started
+
+    answer = next(
+        (
+            msg.content
+            for msg in reversed(state["messages"])
+            if isinstance(msg, AIMessage)
+        ),
+        "",
+    )
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        "answer": answer,
+        "used_context": bool(state.get("needs_pci_context")),
+        "budget_overruns": budget_overruns(state.get("budget_log", [])),
+        "seconds": round(elapsed, 3),
+        "completed_at": datetime.now().isoformat(),
+    }
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    checkpoint_path: Optional[str] = None,
+    budget_seconds: float = 0,
+) -> Dict:
+    """Answer every pending question with bounded concurrency."""
+    # Imported lazily so --fake can switch providers before models are built
+    from core.rag import team_namespaces
+    from core.resilience import resilience_stats
+    from core.scheduler import scheduler_metrics
+    from core.singleflight import coalescing_stats
+    from main import app
+
+    checkpoint_path = checkpoint_path or f"{output_path}.progress.json"
+    questions = load_questions(input_path)
+    completed = load_completed_ids(output_path, checkpoint_path)
+    pending = [item for item in questions if item["id"] not in completed]
+
+    print(
+        f"📋 {len(questions)} questions, {len(questions) - len(pending)} already done, "
+        f"{len(pending)} to run with concurrency {concurrency}"
+    )
+
+    checkpoint = ProgressCheckpoint(checkpoint_path, completed, len(questions))
+    timings = []
+    failures = 0
+    overrun = 0
+    started = time.perf_counter()
+
+    with (
+        open(output_path, "a", encoding="utf-8") as out,
+        ThreadPoolExecutor(max_workers=concurrency) as executor,
+    ):
+        futures = {
+            executor.submit(answer_question, app, item, budget_seconds): item
+            for item in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                record = future.result()
+                ok = True
+                timings.append(record["seconds"])
+                overrun += bool(record["budget_overruns"])
+            except Exception as e:
+                record = {
+                    "id": item["id"],
+                    "question": item["question"],
+                    "error": str(e),
+                }
+                ok = False
+                failures += 1
+
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            checkpoint.mark(item["id"], ok)
+
+            status = "✓" if ok else "✗"
+            print(f"   {status} [{done}/{len(pending)}] {item['id']}")
+
+    wall_time = time.perf_counter() - started
+    summary = {
+        "answered": len(timings),
+        "failed": failures,
+        "wall_seconds": round(wall_time, 3),
+        "mean_seconds": round(sum(timings) / len(timings), 3) if timings else 0.0,
+        "max_seconds": round(max(timings), 3) if timings else 0.0,
+        "budget_overruns": overrun,
+        "coalescing": coalescing_stats(),
+        "scheduler": scheduler_metrics(),
+        "resilience": resilience_stats(),
+        "namespaces": team_namespaces.metrics(),
+    }
+    print(f"\n✅ Batch complete: {json.dumps(summary)}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch question answering")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("output", help="JSONL file answers are appended to")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--checkpoint", help="Progress file (default: <output>.progress.json)"
+    )
+    parser.add_argument(
+        "--fake",
+        action="store_true",
+        help="Use the local fake LLM and embedding provider",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0,
+        help="Per-question latency budget in seconds (default: none)",
+    )
+    args = parser.parse_args()
+
+    if args.fake:
+        os.environ["LLM_PROVIDER"] = "fake"
+
+    print("\n=== Dexter Batch Runner ===")
+    run_batch(args.input, args.output, args.concurrency, args.checkpoint, args.budget)
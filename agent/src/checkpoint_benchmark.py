@@ -0,0 +1,168 @@
+"""Compare checkpoint write and read latency: pickle files vs SQLite.
+
+The pickle baseline is what local and dev serving use: InMemorySaver over
+PersistentDicts, written out whole after every checkpoint. SQLiteSaver
+writes only the changed channels of one thread. Both stores are first
+filled with `--threads` conversation threads, then a sample of threads
+gets one more turn (a write) and has its latest checkpoint read back.
+
+    python checkpoint_benchmark.py --threads 10000 --samples 50
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from core.persistence import SQLiteSaver, connect
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver, PersistentDict
+
+QUESTION = "What does PCI DSS require for multi-factor authentication on {}?"
+ANSWER = (
+    "Requirement 8.4.2 requires MFA for all non-console access into the CDE. "
+    "Testing procedure 8.4.2 examines network and system configurations. "
+) * 6
+
+
+def pickle_saver(directory: str) -> InMemorySaver:
+    """InMemorySaver persisted the way the dev server does it."""
+    names = iter(["storage", "writes", "blobs"])
+
+    def factory(*args):
+        return PersistentDict(
+            *args, filename=os.path.join(directory, f"{next(names)}.pckl")
+        )
+
+    return InMemorySaver(factory=factory)
+
+
+def sync_pickles(saver: InMemorySaver) -> None:
+    for part in (saver.storage, saver.writes, saver.blobs):
+        part.sync()
+
+
+def add_turn(saver, thread: int, turn: int, previous: Dict) -> Dict:
+    """Write one turn's checkpoint with a realistic state delta."""
+    checkpoint = empty_checkpoint()
+    messages = list(previous.get("messages", [])) + [
+        HumanMessage(content=QUESTION.format(f"thread {thread} turn {turn}")),
+        AIMessage(content=ANSWER),
+    ]
+    values = {
+        "messages": messages,
+        "last_doc_ids": [f"doc.pdf::8.4.{i}" for i in range(4)],
+        "last_query_vector": [((thread + i) % 97) / 97 for i in range(1536)],
+    }
+    versions = {
+        channel: saver.get_next_version(previous.get("versions", {}).get(channel), None)
+        for channel in values
+    }
+    checkpoint["channel_values"] = values
+    checkpoint["channel_versions"] = versions
+    config = {"configurable": {"thread_id": f"thread-{thread}", "checkpoint_ns": ""}}
+    if previous.get("checkpoint_id"):
+        config["configurable"]["checkpoint_id"] = previous["checkpoint_id"]
+    saver.put(config, checkpoint, {"source": "loop", "step": turn}, versions)
+    return {
+        "messages": messages,
+        "versions": versions,
+        "checkpoint_id": checkpoint["id"],
+    }
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[math.ceil(fraction * len(ordered)) - 1] if ordered else 0.0
+
+
+def measure(name: str, saver, threads: int, samples: int, sync) -> Dict:
+    started = time.perf_counter()
+    states = {thread: add_turn(saver, thread, 1, {}) for thread in range(threads)}
+    sync()
+    fill_seconds = time.perf_counter() - started
+
+    sample = list(
+        itertools.islice(range(0, threads, max(1, threads // samples)), samples)
+    )
+    writes, reads = [], []
+    for thread in sample:
+        started = time.perf_counter()
+        states[thread] = add_turn(saver, thread, 2, states[thread])
+        sync()
+        writes.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        found = saver.get_tuple({"configurable": {"thread_id": f"thread-{thread}"}})
+        reads.append(time.perf_counter() - started)
+        assert len(found.checkpoint["channel_values"]["messages"]) == 4
+
+    writes.sort()
+    reads.sort()
+    return {
+        "store": name,
+        "threads": threads,
+        "fill_s": round(fill_seconds, 1),
+        "write_p50_ms": round(1000 * _percentile(writes, 0.50), 2),
+        "write_p95_ms": round(1000 * _percentile(writes, 0.95), 2),
+        "read_p50_ms": round(1000 * _percentile(reads, 0.50), 3),
+        "read_p95_ms": round(1000 * _percentile(reads, 0.95), 3),
+    }
+
+
+def _size_mb(paths: List[str]) -> float:
+    return round(sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / 2**20, 1)
+
+
+def run_benchmark(threads: int, samples: int, output: str = "") -> List[Dict]:
+    directory = tempfile.mkdtemp(prefix="checkpoint_benchmark_")
+    rows = []
+
+    print(f"🥒 Pickle store, {threads} threads...")
+    saver = pickle_saver(directory)
+    row = measure("pickle", saver, threads, samples, lambda: sync_pickles(saver))
+    row["size_mb"] = _size_mb(
+        [
+            os.path.join(directory, f"{name}.pckl")
+            for name in ("storage", "writes", "blobs")
+        ]
+    )
+    rows.append(row)
+
+    print(f"🗄️ SQLite store, {threads} threads...")
+    path = os.path.join(directory, "langgraph.sqlite")
+    saver = SQLiteSaver(connect(path))
+    row = measure("sqlite", saver, threads, samples, lambda: None)
+    row["size_mb"] = _size_mb([path, f"{path}-wal"])
+    rows.append(row)
+
+    print(
+        f"\n{'store':<8} {'fill s':>7} {'write p50':>10} {'write p95':>10} "
+        f"{'read p50':>9} {'read p95':>9} {'MB':>7}"
+    )
+    for row in rows:
+        print(
+            f"{row['store']:<8} {row['fill_s']:>7} {row['write_p50_ms']:>10} "
+            f"{row['write_p95_ms']:>10} {row['read_p50_ms']:>9} "
+            f"{row['read_p95_ms']:>9} {row['size_mb']:>7}"
+        )
+    if output:
+        with open(output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"💾 Report written to {output}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpoint store benchmark")
+    parser.add_argument("--threads", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    print("\n=== Checkpoint Store Benchmark ===\n")
+    run_benchmark(args.threads, args.samples, args.output)
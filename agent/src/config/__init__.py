@@ -2,32 +2,176 @@
 
 from .config import (
     AGENT_DIR,
+    ANSWER_WORKERS,
+    ASSESSMENT_MAX_WORKERS,
+    CHECKPOINT_COMPRESS_MIN_BYTES,
+    CHECKPOINT_DB_PATH,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    COALESCE_REQUESTS,
     DATA_DIR,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MAX_CONCURRENCY,
     EMBEDDING_MODEL_NAME,
+    EMBEDDING_PRICE_PER_MILLION_TOKENS,
+    EMBEDDING_TOKENS_PER_MINUTE,
     FAISS_INDEX_DIR,
     FAISS_INDEX_PATH,
+    FAKE_EMBEDDING_LATENCY_MS,
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_SLOW_MS,
+    FAKE_LLM_SLOW_RATE,
+    FOLLOWUP_DELTA_K,
+    FOLLOWUP_REUSE,
+    FOLLOWUP_SIMILARITY,
     GEMINI_MODEL_NAME,
     GOOGLE_API_KEY,
+    INDEX_DEDUP,
+    INDEX_DEDUP_THRESHOLD,
+    INDEX_HASH_SHARDS,
+    INDEX_HOT_RELOAD,
+    INDEX_KEEP_VERSIONS,
+    INDEX_PQ_SUBQUANTIZERS,
+    INDEX_QUANTIZATION,
+    INDEX_RELOAD_INTERVAL,
+    INDEX_RESCORE,
+    INDEX_RESCORE_FACTOR,
+    INDEX_SHARD_STRATEGY,
+    INDEX_SHARED_MEMORY,
+    INDEX_WORKERS,
+    INGEST_EMBED_WORKERS,
+    INGEST_EXTRACT_WORKERS,
+    INGEST_POLL_INTERVAL,
+    INGEST_QUEUE_SIZE,
+    INGEST_WATCH_DIR,
     INPUT_DIR,
     JSON_OUTPUT_PATH,
+    LLM_CALL_DEADLINE,
+    LLM_HEDGE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_MAX_CONCURRENCY,
+    LLM_OUTPUT_TOKEN_ESTIMATE,
+    LLM_PROVIDER,
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_TOKENS_PER_MINUTE,
+    LOCAL_EMBEDDING_DIMENSIONS,
+    LOCAL_EMBEDDING_MAX_FEATURES,
+    LOCAL_EMBEDDING_PATH,
+    MATERIALIZE_ANSWERS,
     OPENAI_API_KEY,
     OUTPUT_DIR,
+    PAGE_CACHE_DIR,
+    PAGE_CACHE_ENABLED,
     PDF_PATH,
-    RETRIEVER_K,
+    PROMPT_CACHE_TTL_SECONDS,
+    PROMPT_CONTEXT_CACHE,
+    QUERY_CONTEXT_CHARS,
+    QUERY_CONTEXT_TURNS,
+    REQUEST_BUDGET_SECONDS,
+    REQUIREMENT_GRAPH_MIN_SIMILARITY,
+    REQUIREMENT_GRAPH_NEIGHBORS,
+    RETRIEVER_EXPAND_PARENTS,
+    RETRIEVER_EXPAND_RELATED,
+    RETRIEVER_MAX_K,
+    RETRIEVER_MIN_K,
+    RETRIEVER_RELATED_K,
+    RETRIEVER_RELATIVE_GAP,
+    RETRIEVER_SCORE_THRESHOLD,
+    SHARD_SEARCH_WORKERS,
+    TEAM_INDEX_DIR,
+    TEAM_INDEX_MEMORY_MB,
+    TEAM_INPUT_DIR,
+    TOOL_BUDGET_SECONDS,
+    TOPIC_BOOST_WEIGHT,
 )
 
 __all__ = [
     "AGENT_DIR",
+    "ANSWER_WORKERS",
+    "ASSESSMENT_MAX_WORKERS",
+    "CHECKPOINT_COMPRESS_MIN_BYTES",
+    "CHECKPOINT_DB_PATH",
+    "CIRCUIT_FAILURE_THRESHOLD",
+    "CIRCUIT_RESET_SECONDS",
+    "COALESCE_REQUESTS",
     "DATA_DIR",
+    "EMBEDDING_DIMENSIONS",
+    "EMBEDDING_MAX_CONCURRENCY",
     "EMBEDDING_MODEL_NAME",
+    "EMBEDDING_PRICE_PER_MILLION_TOKENS",
+    "EMBEDDING_TOKENS_PER_MINUTE",
     "FAISS_INDEX_DIR",
     "FAISS_INDEX_PATH",
+    "FAKE_EMBEDDING_LATENCY_MS",
+    "FAKE_LLM_ERROR_RATE",
+    "FAKE_LLM_LATENCY_MS",
+    "FAKE_LLM_SLOW_MS",
+    "FAKE_LLM_SLOW_RATE",
+    "FOLLOWUP_DELTA_K",
+    "FOLLOWUP_REUSE",
+    "FOLLOWUP_SIMILARITY",
     "GEMINI_MODEL_NAME",
     "GOOGLE_API_KEY",
+    "INDEX_DEDUP",
+    "INDEX_DEDUP_THRESHOLD",
+    "INDEX_HASH_SHARDS",
+    "INDEX_HOT_RELOAD",
+    "INDEX_KEEP_VERSIONS",
+    "INDEX_PQ_SUBQUANTIZERS",
+    "INDEX_QUANTIZATION",
+    "INDEX_RELOAD_INTERVAL",
+    "INDEX_RESCORE",
+    "INDEX_RESCORE_FACTOR",
+    "INDEX_SHARD_STRATEGY",
+    "INDEX_SHARED_MEMORY",
+    "INDEX_WORKERS",
+    "INGEST_EMBED_WORKERS",
+    "INGEST_EXTRACT_WORKERS",
+    "INGEST_POLL_INTERVAL",
+    "INGEST_QUEUE_SIZE",
+    "INGEST_WATCH_DIR",
     "INPUT_DIR",
     "JSON_OUTPUT_PATH",
+    "LLM_CALL_DEADLINE",
+    "LLM_HEDGE",
+    "LLM_HEDGE_MIN_SAMPLES",
+    "LLM_MAX_CONCURRENCY",
+    "LLM_OUTPUT_TOKEN_ESTIMATE",
+    "LLM_PROVIDER",
+    "LLM_RETRY_ATTEMPTS",
+    "LLM_RETRY_BASE_DELAY",
+    "LLM_RETRY_MAX_DELAY",
+    "LLM_TOKENS_PER_MINUTE",
+    "LOCAL_EMBEDDING_DIMENSIONS",
+    "LOCAL_EMBEDDING_MAX_FEATURES",
+    "LOCAL_EMBEDDING_PATH",
+    "MATERIALIZE_ANSWERS",
     "OPENAI_API_KEY",
     "OUTPUT_DIR",
+    "PAGE_CACHE_DIR",
+    "PAGE_CACHE_ENABLED",
     "PDF_PATH",
-    "RETRIEVER_K",
+    "PROMPT_CACHE_TTL_SECONDS",
+    "PROMPT_CONTEXT_CACHE",
+    "QUERY_CONTEXT_CHARS",
+    "QUERY_CONTEXT_TURNS",
+    "REQUEST_BUDGET_SECONDS",
+    "REQUIREMENT_GRAPH_MIN_SIMILARITY",
+    "REQUIREMENT_GRAPH_NEIGHBORS",
+    "RETRIEVER_EXPAND_PARENTS",
+    "RETRIEVER_EXPAND_RELATED",
+    "RETRIEVER_MAX_K",
+    "RETRIEVER_MIN_K",
+    "RETRIEVER_RELATED_K",
+    "RETRIEVER_RELATIVE_GAP",
+    "RETRIEVER_SCORE_THRESHOLD",
+    "SHARD_SEARCH_WORKERS",
+    "TEAM_INDEX_DIR",
+    "TEAM_INDEX_MEMORY_MB",
+    "TEAM_INPUT_DIR",
+    "TOOL_BUDGET_SECONDS",
+    "TOPIC_BOOST_WEIGHT",
 ]
@@ -27,11 +27,180 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 # Model Configuration
+# LLM_PROVIDER=fake swaps Gemini and OpenAI for local deterministic stand-ins
+# (see core/providers.py) so batch jobs and tests can run without a network.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.0-flash")
+# Static prompt instructions are bound once per prompt kind as the model's
+# system instruction. With PROMPT_CONTEXT_CACHE they are also stored in a
+# Gemini context cache (re-created after PROMPT_CACHE_TTL_SECONDS); kinds whose
+# instructions are below the provider's minimum cache size fall back to
+# sending them inline.
+PROMPT_CONTEXT_CACHE = os.getenv("PROMPT_CONTEXT_CACHE", "false").lower() == "true"
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "0"))
+# Fault injection for the fake provider: share of calls that fail with a
+# transient error, and share that take FAKE_LLM_SLOW_MS instead.
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", "0"))
+FAKE_LLM_SLOW_MS = float(os.getenv("FAKE_LLM_SLOW_MS", "0"))
+# EMBEDDING_MODEL_NAME=local-lsa embeds in-process with a TF-IDF + truncated
+# SVD model that setup_index.py fits on the shared corpus, so query embeddings
+# need no network round-trip. Each index version stores the model it was
+# embedded with; LOCAL_EMBEDDING_PATH is only read for indexes built before.
+LOCAL_EMBEDDING_PATH = Path(
+    os.getenv("LOCAL_EMBEDDING_PATH", str(FAISS_INDEX_DIR / "local_embeddings.npz"))
+)
+LOCAL_EMBEDDING_DIMENSIONS = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "256"))
+LOCAL_EMBEDDING_MAX_FEATURES = int(os.getenv("LOCAL_EMBEDDING_MAX_FEATURES", "50000"))
 
 # RAG Configuration
-RETRIEVER_K = int(os.getenv("RETRIEVER_K", "4"))
+# Retrieval fetches up to RETRIEVER_MAX_K scored candidates and keeps only those
+# above RETRIEVER_SCORE_THRESHOLD (cosine similarity) that are within
+# RETRIEVER_RELATIVE_GAP of the best hit, never returning fewer than
+# RETRIEVER_MIN_K. RETRIEVER_K is still honoured as the upper bound.
+RETRIEVER_MIN_K = int(os.getenv("RETRIEVER_MIN_K", "1"))
+RETRIEVER_MAX_K = int(os.getenv("RETRIEVER_MAX_K", os.getenv("RETRIEVER_K", "8")))
+RETRIEVER_SCORE_THRESHOLD = float(os.getenv("RETRIEVER_SCORE_THRESHOLD", "0.3"))
+RETRIEVER_RELATIVE_GAP = float(os.getenv("RETRIEVER_RELATIVE_GAP", "0.1"))
+# Add the parent chunk (e.g. 6.4 for a retrieved 6.4.1) ahead of retrieved
+# sub-requirements and testing procedures.
+RETRIEVER_EXPAND_PARENTS = (
+    os.getenv("RETRIEVER_EXPAND_PARENTS", "false").lower() == "true"
+)
+# Append up to RETRIEVER_RELATED_K requirements linked to the results in the
+# requirement graph built with the index (references, numbering, similar
+# embeddings), fetched by lookup rather than by further vector searches.
+RETRIEVER_EXPAND_RELATED = (
+    os.getenv("RETRIEVER_EXPAND_RELATED", "true").lower() == "true"
+)
+RETRIEVER_RELATED_K = int(os.getenv("RETRIEVER_RELATED_K", "3"))
+# Requirement graph construction: embedding-neighbour links per requirement
+# and the cosine similarity they need.
+REQUIREMENT_GRAPH_NEIGHBORS = int(os.getenv("REQUIREMENT_GRAPH_NEIGHBORS", "3"))
+REQUIREMENT_GRAPH_MIN_SIMILARITY = float(
+    os.getenv("REQUIREMENT_GRAPH_MIN_SIMILARITY", "0.85")
+)
+
+# Query construction: how many earlier user turns (truncated to
+# QUERY_CONTEXT_CHARS) are embedded with the question, and how strongly
+# detected topic centroids pull the query vector.
+QUERY_CONTEXT_TURNS = int(os.getenv("QUERY_CONTEXT_TURNS", "2"))
+QUERY_CONTEXT_CHARS = int(os.getenv("QUERY_CONTEXT_CHARS", "200"))
+TOPIC_BOOST_WEIGHT = float(os.getenv("TOPIC_BOOST_WEIGHT", "0.25"))
+# Follow-up turns reuse the chunks retrieved for the previous turn of the
+# thread: anaphoric follow-ups ("what about the testing procedure for that?")
+# skip embedding and search entirely, and queries whose vector is within
+# FOLLOWUP_SIMILARITY (cosine) of the previous one only run a small delta
+# search for FOLLOWUP_DELTA_K new chunks.
+FOLLOWUP_REUSE = os.getenv("FOLLOWUP_REUSE", "true").lower() == "true"
+FOLLOWUP_SIMILARITY = float(os.getenv("FOLLOWUP_SIMILARITY", "0.9"))
+FOLLOWUP_DELTA_K = int(os.getenv("FOLLOWUP_DELTA_K", "3"))
+
+# Identical embedding, retrieval and generation calls that are in flight at
+# the same time share one upstream request (see core/singleflight.py).
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+
+# Upstream admission control (see core/scheduler.py): concurrent calls and
+# token-per-minute budgets per API; 0 tokens per minute means unlimited.
+# Generation cost is the prompt estimate plus LLM_OUTPUT_TOKEN_ESTIMATE.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "512"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "0"))
+
+# Upstream resilience (see core/resilience.py): jittered exponential retries
+# within a per-call deadline, a hedged duplicate request once a call runs past
+# the observed p95 latency, and a circuit breaker that fails fast to degraded
+# no-LLM answers after repeated failures.
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "60"))
+# End-to-end latency budget for one chat turn, split between the graph nodes
+# (see core/budget.py); a node that overruns its slice is replaced by its
+# fallback. 0 disables it. Tool calls get TOOL_BUDGET_SECONDS each.
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "20"))
+TOOL_BUDGET_SECONDS = float(os.getenv("TOOL_BUDGET_SECONDS", "60"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# Tools Configuration
+ASSESSMENT_MAX_WORKERS = int(os.getenv("ASSESSMENT_MAX_WORKERS", "4"))
+
+# Indexing Configuration
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Shard the vector store by "standard" (one shard per standard version), by
+# "hash" (INDEX_HASH_SHARDS buckets) or not at all ("none").
+INDEX_SHARD_STRATEGY = os.getenv("INDEX_SHARD_STRATEGY", "standard").lower()
+INDEX_HASH_SHARDS = int(os.getenv("INDEX_HASH_SHARDS", "4"))
+SHARD_SEARCH_WORKERS = int(os.getenv("SHARD_SEARCH_WORKERS", "8"))
+# setup_index.py writes versioned index directories; serving processes poll
+# for a newly published version every INDEX_RELOAD_INTERVAL seconds.
+INDEX_HOT_RELOAD = os.getenv("INDEX_HOT_RELOAD", "true").lower() == "true"
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "10"))
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+# Compact vector storage: "none" (float32), "fp16", "sq8" (int8 scalar) or
+# "pq" (product quantization). Quantized shards keep exact vectors on disk so
+# the top candidates can be re-scored exactly when INDEX_RESCORE is enabled.
+INDEX_QUANTIZATION = os.getenv("INDEX_QUANTIZATION", "none").lower()
+INDEX_PQ_SUBQUANTIZERS = int(os.getenv("INDEX_PQ_SUBQUANTIZERS", "64"))
+INDEX_RESCORE = os.getenv("INDEX_RESCORE", "true").lower() == "true"
+INDEX_RESCORE_FACTOR = int(os.getenv("INDEX_RESCORE_FACTOR", "4"))
+# Multi-worker serving: attach each shard read-only through memory maps (the
+# FAISS codes plus a flat text file exported next to it at build time), so
+# every worker process serving a version shares one copy in the page cache
+# instead of unpickling its own.
+INDEX_SHARED_MEMORY = os.getenv("INDEX_SHARED_MEMORY", "false").lower() == "true"
+# Near-duplicate chunks of the same document and type (boilerplate repeated
+# across sections) are collapsed before embedding when their estimated
+# Jaccard similarity reaches INDEX_DEDUP_THRESHOLD; the kept chunk carries
+# every collapsed number and page. The build report prices the embedding
+# tokens saved at EMBEDDING_PRICE_PER_MILLION_TOKENS (USD).
+INDEX_DEDUP = os.getenv("INDEX_DEDUP", "true").lower() == "true"
+INDEX_DEDUP_THRESHOLD = float(os.getenv("INDEX_DEDUP_THRESHOLD", "0.8"))
+EMBEDDING_PRICE_PER_MILLION_TOKENS = float(
+    os.getenv("EMBEDDING_PRICE_PER_MILLION_TOKENS", "0.02")
+)
+# Cleaned PDF page text is cached by file hash so re-indexing unchanged
+# documents skips PDF parsing entirely.
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+PAGE_CACHE_DIR = Path(os.getenv("PAGE_CACHE_DIR", str(DATA_DIR / "page_cache")))
+# Optionally precompute a cited explanation per requirement at index time;
+# pure lookups ("explain 3.4.1") are then served without retrieval or Gemini.
+MATERIALIZE_ANSWERS = os.getenv("MATERIALIZE_ANSWERS", "false").lower() == "true"
+ANSWER_WORKERS = int(os.getenv("ANSWER_WORKERS", "4"))
+# Each team's uploaded policies (TEAM_INPUT_DIR/<team_id>/*.pdf) get their own
+# versioned index under TEAM_INDEX_DIR/<team_id>, searched together with the
+# shared standards corpus. Team indexes load on first use and the least
+# recently used are evicted once they exceed TEAM_INDEX_MEMORY_MB.
+TEAM_INPUT_DIR = INPUT_DIR / "teams"
+TEAM_INDEX_DIR = FAISS_INDEX_DIR / "teams"
+TEAM_INDEX_MEMORY_MB = float(os.getenv("TEAM_INDEX_MEMORY_MB", "512"))
+# ingest_service.py watches INGEST_WATCH_DIR (PDFs at the top level go to the
+# shared corpus, <team_id>/ subdirectories to that team's namespace) and runs
+# extract -> section -> embed -> index stages over bounded queues of
+# INGEST_QUEUE_SIZE jobs, so a slow stage holds back the ones before it.
+INGEST_WATCH_DIR = Path(os.getenv("INGEST_WATCH_DIR", str(INPUT_DIR / "uploads")))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", "2"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+# The LangGraph server keeps thread checkpoints and its store in this SQLite
+# database (WAL mode, see core/persistence.py) instead of pickle files that
+# are rewritten whole; payloads above CHECKPOINT_COMPRESS_MIN_BYTES are
+# zlib-compressed.
+CHECKPOINT_DB_PATH = Path(
+    os.getenv("CHECKPOINT_DB_PATH", str(DATA_DIR / "langgraph.sqlite"))
+)
+CHECKPOINT_COMPRESS_MIN_BYTES = int(os.getenv("CHECKPOINT_COMPRESS_MIN_BYTES", "512"))
 
 # File Paths
 PDF_PATH = INPUT_DIR / "Prioritized-Approach-for-PCI-DSS-v3_2_1.pdf"
@@ -47,9 +216,15 @@ JSON_OUTPUT_PATH = str(JSON_OUTPUT_PATH)
 INPUT_DIR = str(INPUT_DIR)
 OUTPUT_DIR = str(OUTPUT_DIR)
 FAISS_INDEX_DIR = str(FAISS_INDEX_DIR)
+PAGE_CACHE_DIR = str(PAGE_CACHE_DIR)
+TEAM_INPUT_DIR = str(TEAM_INPUT_DIR)
+TEAM_INDEX_DIR = str(TEAM_INDEX_DIR)
+INGEST_WATCH_DIR = str(INGEST_WATCH_DIR)
+LOCAL_EMBEDDING_PATH = str(LOCAL_EMBEDDING_PATH)
+CHECKPOINT_DB_PATH = str(CHECKPOINT_DB_PATH)
 
 # Validate required environment variables
-required_vars = ["OPENAI_API_KEY", "GOOGLE_API_KEY"]
+required_vars = [] if LLM_PROVIDER == "fake" else ["OPENAI_API_KEY", "GOOGLE_API_KEY"]
 missing_vars = [var for var in required_vars if not os.getenv(var)]
 
 if missing_vars:
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from config import ANSWER_WORKERS
+
+ANSWERS_FILE = "answers.json"
+
+# Requirement-level chunk types that get a precomputed explanation
+ANSWERABLE_TYPES = ("requirement", "subrequirement")
+
+# A pure lookup names one requirement number and asks for nothing else,
+# e.g. "explain 3.4.1", "What does requirement 6.4 say?", "req 8.2.3"
+LOOKUP_PATTERN = re.compile(
+    r"(?:please\s+)?"
+    r"(?P<verb>explain|describe|define|summari[sz]e|show(?:\s+me)?"
+    r"|tell\s+me\s+about|what\s+(?:is|are|does))?\s*"
+    r"(?:the\s+)?(?:pci(?:\s+dss)?\s+)?(?:sub-?)?"
+    r"(?P<keyword>requirement|req\.?)?\s*"
+    r"(?P<number>\d{1,2}(?:\.\d{1,2}){0,3})\s*"
+    r"(?:say|mean|require|cover)?\s*[?.!]*",
+    re.IGNORECASE,
+)
+
+
+def detect_lookup(query: str) -> Optional[str]:
+    """Return the requirement number if the query is a pure lookup.
+
+    A bare top-level number ("1", "2.") is more likely a reply to a
+    numbered list than a lookup, so it needs a verb or "requirement".
+    """
+    match = LOOKUP_PATTERN.fullmatch(" ".join(query.split()))
+    if not match:
+        return None
+    number = match.group("number")
+    if match.group("verb") or match.group("keyword") or "." in number:
+        return number
+    return None
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def answer_key(document: str, number: str) -> str:
+    return f"{document}::{number}"
+
+
+def _answer_prompt(number: str, metadata: Dict, source: str) -> str:
+    """Prompt for the canonical explanation of one requirement."""
+    return f"""You are Dexter.ai, a precise security compliance assistant. Write the canonical explanation of {metadata.get("standard", "PCI DSS")} v{metadata.get("version", "N/A")} requirement {number}.
+
+SOURCE TEXT (Page {metadata.get("page", "N/A")}):
+{source}
+
+Guidelines:
+1. Quote the requirement text verbatim first
+2. Cite it as: "According to {metadata.get("standard", "PCI DSS")} v{metadata.get("version", "N/A")} requirement {number} (Page {metadata.get("page", "N/A")})"
+3. Explain what it requires in plain language, with technical terms in [brackets]
+4. Summarise any listed sub-requirements
+5. Only use the source text; do not add requirements that are not in it"""
+
+
+def collect_sources(texts: List[str], metadatas: List[Dict]) -> Dict[str, Dict]:
+    """Group each requirement chunk with its direct children's text.
+
+    The hash of this source text decides whether an answer is regenerated.
+    """
+    children: Dict[str, List[str]] = {}
+    for text, metadata in zip(texts, metadatas):
+        parent = metadata.get("parent_requirement")
+        if parent:
+            key = answer_key(metadata.get("document", ""), parent)
+            children.setdefault(key, []).append(text)
+
+    sources = {}
+    for text, metadata in zip(texts, metadatas):
+        if metadata.get("type") not in ANSWERABLE_TYPES:
+            continue
+        key = answer_key(metadata.get("document", ""), metadata.get("number", ""))
+        if key in sources:
+            continue
+        source = "\n\n".join([text, *children.get(key, [])])
+        sources[key] = {
+            "source": source,
+            "chunk_hash": chunk_hash(source),
+            "metadata": metadata,
+        }
+    return sources
+
+
+def materialize_answers(
+    texts: List[str],
+    metadatas: List[Dict],
+    model,
+    previous: Optional[Dict[str, Dict]] = None,
+    workers: int = ANSWER_WORKERS,
+) -> Dict[str, Dict]:
+    """Generate a cited explanation per requirement, reusing unchanged ones.
+
+    An answer from `previous` is kept when its chunk hash still matches, so
+    only new or edited requirements cost a generation.
+    """
+    previous = previous or {}
+    sources = collect_sources(texts, metadatas)
+    answers = {
+        key: previous[key]
+        for key, item in sources.items()
+        if key in previous and previous[key].get("chunk_hash") == item["chunk_hash"]
+    }
+    pending = [key for key in sources if key not in answers]
+    print(f"   {len(answers)} unchanged, {len(pending)} to generate")
+
+    def generate(key: str) -> Optional[Dict]:
+        item = sources[key]
+        metadata = item["metadata"]
+        try:
+            response = model.generate_content(
+                _answer_prompt(metadata["number"], metadata, item["source"])
+            )
+            text = response.text.strip()
+        except Exception as e:
+            print(f"   ✗ {key}: {str(e)}")
+            return None
+        if not text:
+            return None
+        return {
+            "number": metadata["number"],
+            "document": metadata.get("document", ""),
+            "standard": metadata.get("standard", ""),
+            "version": metadata.get("version", ""),
+            "page": metadata.get("page", "N/A"),
+            "chunk_hash": item["chunk_hash"],
+            "answer": text,
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for key, answer in zip(pending, executor.map(generate, pending)):
+            if answer:
+                answers[key] = answer
+    return answers
+
+
+def save_answers(index_path: str, answers: Dict[str, Dict]) -> None:
+    with open(os.path.join(index_path, ANSWERS_FILE), "w", encoding="utf-8") as f:
+        json.dump(answers, f, ensure_ascii=False, indent=2)
+
+
+def load_answers(index_path: str) -> Dict[str, Dict]:
+    """Load materialized answers saved with an index version, if any."""
+    answers_path = os.path.join(index_path, ANSWERS_FILE)
+    if not os.path.exists(answers_path):
+        return {}
+    with open(answers_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_answer(entries: List[Dict]) -> str:
+    """Render the stored answers for one number, one block per standard version."""
+    blocks = []
+    for entry in entries:
+        citation = (
+            f"📄 Source: {entry['standard']} v{entry['version']}, "
+            f"Requirement {entry['number']} (Page {entry['page']})"
+        )
+        blocks.append(f"{entry['answer']}\n\n{citation}")
+    return "\n\n---\n\n".join(blocks)
@@ -0,0 +1,116 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Optional
+
+from config import REQUEST_BUDGET_SECONDS
+from core.resilience import deadline
+
+# Share of the remaining budget each budgeted node gets, in graph order. A
+# node's slice is its share of what is left among itself and later nodes, so
+# time an earlier node did not use rolls forward.
+NODE_BUDGET_SHARES = {
+    "understand": 0.15,
+    "get_context": 0.35,
+    "generate_response": 0.5,
+}
+
+
+def _in_background(name: str, fn: Callable, *args) -> Future:
+    """Run `fn` on its own daemon thread, in a copy of the current context.
+
+    Budgeted nodes run this way so the graph can move on when one overruns;
+    the overrunning node finishes in the background and its result is
+    dropped. A fixed pool would let abandoned nodes hold workers that new
+    requests then wait for.
+    """
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        try:
+            future.set_result(context.run(fn, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"budget-{name}", daemon=True).start()
+    return future
+
+
+def start_budget(state: Dict, seconds: float = REQUEST_BUDGET_SECONDS) -> None:
+    """Give the request in `state` a fresh budget; 0 disables budgeting."""
+    # Wall-clock time so the deadline stays meaningful in persisted state
+    state["deadline"] = time.time() + seconds if seconds > 0 else None
+    state["budget_seconds"] = seconds
+    state["budget_log"] = []
+
+
+def node_slice(state: Dict, name: str) -> Optional[float]:
+    """Seconds the node may take, or None when it is not budgeted."""
+    until = state.get("deadline")
+    if until is None or name not in NODE_BUDGET_SHARES:
+        return None
+    names = list(NODE_BUDGET_SHARES)
+    later = sum(NODE_BUDGET_SHARES[node] for node in names[names.index(name) :])
+    return max(0.0, (until - time.time()) * NODE_BUDGET_SHARES[name] / later)
+
+
+def _log(state: Dict, name: str, budget: Optional[float], spent: float, outcome: str):
+    entry = {
+        "node": name,
+        "budget_ms": round(1000 * budget, 1) if budget is not None else None,
+        "spent_ms": round(1000 * spent, 1),
+        "outcome": outcome,
+    }
+    state.setdefault("budget_log", []).append(entry)
+    if budget is None:
+        return
+    left = state["deadline"] - time.time()
+    print(
+        f"⏱️ {name}: {entry['spent_ms']:.0f} of {entry['budget_ms']:.0f} ms "
+        f"({outcome}), {max(0.0, 1000 * left):.0f} ms of the request budget left"
+    )
+
+
+def run_budgeted(
+    name: str, node: Callable, state: Dict, on_overrun: Callable[[Dict], Dict]
+) -> Dict:
+    """Run a node within its slice of the request budget.
+
+    The node works on a copy of the state, with upstream calls bounded by
+    the slice. If it has not returned when the slice ends (or no time is
+    left), `on_overrun` decides the state instead and the graph moves on.
+    """
+    budget = node_slice(state, name)
+    started = time.monotonic()
+    if budget is None:
+        result = node(state)
+        _log(result, name, None, time.monotonic() - started, "ok")
+        return result
+    if budget <= 0:
+        result = on_overrun(state)
+        _log(result, name, budget, 0.0, "skipped")
+        return result
+
+    def bounded(working: Dict) -> Dict:
+        with deadline(budget):
+            return node(working)
+
+    # A late result must not touch the state the graph has moved on with
+    working = {**state, "messages": list(state["messages"])}
+    future = _in_background(name, bounded, working)
+    try:
+        result = future.result(timeout=budget)
+        outcome = "ok"
+    except FutureTimeout:
+        result = on_overrun(state)
+        outcome = "overrun"
+    _log(result, name, budget, time.monotonic() - started, outcome)
+    return result
+
+
+def budget_overruns(log: List[Dict]) -> List[str]:
+    """Nodes of one request that overran or were skipped."""
+    return [entry["node"] for entry in log if entry["outcome"] != "ok"]
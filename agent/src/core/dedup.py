@@ -0,0 +1,172 @@
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+from config import EMBEDDING_PRICE_PER_MILLION_TOKENS, INDEX_DEDUP_THRESHOLD
+from core.scheduler import estimate_tokens
+
+# MinHash signature length and LSH banding: 32 bands of 4 rows make pairs
+# with Jaccard similarity 0.8 candidates with near certainty, while pairs
+# below 0.3 rarely share a bucket. Chunks are short, so shingles are word
+# trigrams; one changed word then costs only three shingles.
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32
+SHINGLE_WORDS = 3
+
+# Metadata fields kept as lists on the chunk a duplicate is collapsed into
+MERGED_FIELDS = {
+    "number": "numbers",
+    "page": "pages",
+    "parent_requirement": "parent_requirements",
+}
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes; a stays
+# below 2**32 so the products fit in uint64.
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, 2**32 - 1, NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2**32 - 1, NUM_PERMUTATIONS, dtype=np.uint64)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NUMBER = re.compile(r"^\d+(?:\.\d+)*(?:\.[a-z])?\b")
+
+
+def _body(text: str, metadata: Dict) -> str:
+    """Chunk text without the section prefix and leading requirement number.
+
+    Sub-requirement chunks repeat their section heading, which would make
+    every short item in a section look alike.
+    """
+    section = metadata.get("section", "")
+    if section and text.startswith(section):
+        text = text[len(section) :]
+    return _NUMBER.sub("", text.strip().lower(), count=1)
+
+
+def _shingles(body: str) -> np.ndarray:
+    words = _WORD.findall(body)
+    grams = {
+        " ".join(words[i : i + SHINGLE_WORDS])
+        for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    return np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) for gram in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+def minhash_signature(body: str) -> np.ndarray:
+    hashes = _shingles(body)
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def near_duplicate_groups(
+    texts: List[str], metadatas: List[Dict], threshold: float = INDEX_DEDUP_THRESHOLD
+) -> List[List[int]]:
+    """Positions grouped by near-duplicate text, canonical (first) chunk first.
+
+    Only chunks of the same document and type are compared, so a standard
+    version or a chunk type filter never loses its own copy. LSH buckets
+    propose candidates and the estimated Jaccard similarity to the canonical
+    chunk decides, so groups do not chain through intermediate chunks.
+    """
+    signatures = np.stack(
+        [
+            minhash_signature(_body(text, metadata))
+            for text, metadata in zip(texts, metadatas)
+        ]
+    )
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    buckets: Dict[Tuple, List[int]] = {}
+    bucket_keys: List[List[Tuple]] = []
+    for position, metadata in enumerate(metadatas):
+        scope = (metadata.get("document"), metadata.get("type"))
+        keys = [
+            (
+                scope,
+                band,
+                signatures[position, band * rows : (band + 1) * rows].tobytes(),
+            )
+            for band in range(LSH_BANDS)
+        ]
+        for key in keys:
+            buckets.setdefault(key, []).append(position)
+        bucket_keys.append(keys)
+
+    assigned = set()
+    groups = []
+    for position in range(len(texts)):
+        if position in assigned:
+            continue
+        group = [position]
+        candidates = {other for key in bucket_keys[position] for other in buckets[key]}
+        for other in sorted(candidates):
+            if other <= position or other in assigned:
+                continue
+            similarity = float(np.mean(signatures[position] == signatures[other]))
+            if similarity >= threshold:
+                group.append(other)
+                assigned.add(other)
+        groups.append(group)
+    return groups
+
+
+def _merged_metadata(metadatas: List[Dict]) -> Dict:
+    merged = dict(metadatas[0])
+    for field, list_field in MERGED_FIELDS.items():
+        values = []
+        for metadata in metadatas:
+            value = metadata.get(field)
+            if value is not None and value not in values:
+                values.append(value)
+        if len(values) > 1:
+            merged[list_field] = values
+    return merged
+
+
+def collapse_near_duplicates(
+    texts: List[str], metadatas: List[Dict], threshold: float = INDEX_DEDUP_THRESHOLD
+) -> Tuple[List[str], List[Dict], Dict]:
+    """Keep one chunk per near-duplicate group, carrying every number and page.
+
+    Returns the kept texts and metadata in their original order, plus a
+    report of the chunks removed and the embedding tokens and spend saved.
+    """
+    if not texts:
+        return texts, metadatas, {"chunks_before": 0, "chunks_after": 0}
+    groups = near_duplicate_groups(texts, metadatas, threshold)
+    kept_texts = [texts[group[0]] for group in groups]
+    kept_metadatas = [
+        _merged_metadata([metadatas[position] for position in group])
+        if len(group) > 1
+        else metadatas[group[0]]
+        for group in groups
+    ]
+
+    tokens_before = sum(estimate_tokens(text) for text in texts)
+    tokens_after = sum(estimate_tokens(text) for text in kept_texts)
+    report = {
+        "chunks_before": len(texts),
+        "chunks_after": len(kept_texts),
+        "collapsed_groups": sum(1 for group in groups if len(group) > 1),
+        "chunk_reduction": round(1 - len(kept_texts) / len(texts), 4),
+        "embedding_tokens_before": tokens_before,
+        "embedding_tokens_saved": tokens_before - tokens_after,
+        "embedding_usd_saved": round(
+            (tokens_before - tokens_after) * EMBEDDING_PRICE_PER_MILLION_TOKENS / 1e6,
+            6,
+        ),
+        "threshold": threshold,
+    }
+    return kept_texts, kept_metadatas, report
+
+
+def metadata_values(metadata: Dict, field: str) -> List:
+    """A field's value plus any values merged in from collapsed duplicates."""
+    values = list(metadata.get(MERGED_FIELDS.get(field, ""), ()))
+    value = metadata.get(field)
+    if value is not None and value not in values:
+        values.insert(0, value)
+    return values
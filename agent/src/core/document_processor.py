@@ -1,44 +1,102 @@
 import json
+import os
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import PyPDF2
+from config import PAGE_CACHE_ENABLED
+from core.page_cache import PageCache, file_sha256
+
+# Part of the page cache key; bump when extraction or _clean_text changes
+EXTRACTOR_VERSION = f"pypdf2-{PyPDF2.__version__}-clean1"
+
+# Requirement headers ("Requirement 6: ...", "Appendix A1: ...") and numbered items ("6.4.1 ...",
+# testing procedures "6.4.1.a ..."). Items must be followed by a capitalised
+# word so cross-references and version numbers are not mistaken for items.
+HEADER_PATTERN = re.compile(r"(requirement|appendix)\s+(A?\d{1,2}):\s+", re.IGNORECASE)
+ITEM_PATTERN = re.compile(
+    r"(?<![\w.])(?<![Rr]equirement )(?<![Rr]equirements )"
+    r"(A?\d{1,2}(?:\.\d{1,2}){1,3})(?:\.([a-z]))?\s+(?=[A-Z])"
+)
+
+# Standards recognised from file names or document text, with version patterns
+STANDARD_PATTERNS = [
+    ("PCI DSS", r"PCI[\s_-]*DSS[\s_-]*v?(\d+(?:[._]\d+)*)"),
+    ("ISO 27001", r"ISO(?:[\s_/-]*IEC)?[\s_-]*27001(?:[\s_:-]*(\d{4}))?"),
+    (
+        "NIST",
+        r"NIST[\s_-]*(?:SP[\s_-]*)?(\d{3}-\d+\w*(?:[\s_-]*r(?:ev)?\.?[\s_-]*\d+)?)",
+    ),
+    (
+        "NIST CSF",
+        r"NIST[\s_-]*(?:CSF|Cybersecurity[\s_-]*Framework)[\s_-]*v?(\d+(?:\.\d+)?)?",
+    ),
+]
 
 
 class DocumentProcessor:
-    def __init__(self, pdf_path: str):
+    def __init__(
+        self,
+        pdf_path: str,
+        verbose: bool = True,
+        use_cache: bool = PAGE_CACHE_ENABLED,
+    ):
         """Initialize the document processor with a PDF path."""
         self.pdf_path = Path(pdf_path)
+        self.verbose = verbose
+        self.use_cache = use_cache
         if not self.pdf_path.exists():
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
-    def extract_text_from_pdf(self) -> str:
-        """Extract text from PDF while preserving structure."""
-        print(f"📄 Reading PDF from: {self.pdf_path}")
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
 
+    def _read_pages(self) -> List[str]:
+        """Parse every page with PyPDF2 and return its cleaned text."""
         with open(self.pdf_path, "rb") as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
+            pages = []
             total_pages = len(pdf_reader.pages)
-            print(f"📑 Processing {total_pages} pages...")
+            self._log(f"📑 Processing {total_pages} pages...")
 
             for i, page in enumerate(pdf_reader.pages, 1):
-                page_text = page.extract_text()
                 # Clean and normalize text
-                page_text = self._clean_text(page_text)
-                text += page_text + "\n\n"
+                pages.append(self._clean_text(page.extract_text()))
                 if i % 5 == 0:  # Progress update every 5 pages
-                    print(f"   ✓ Processed {i}/{total_pages} pages")
+                    self._log(f"   ✓ Processed {i}/{total_pages} pages")
+            return pages
+
+    def extract_pages(self) -> List[str]:
+        """Return cleaned text per page, from the page cache when possible."""
+        if not self.use_cache:
+            return self._read_pages()
 
-            print(f"✅ Extracted {len(text)} characters of text")
-            print("\nFirst 500 characters of extracted text:")
-            print("-" * 80)
-            print(text[:500])
-            print("-" * 80)
+        sha256 = file_sha256(str(self.pdf_path))
+        cache = PageCache(EXTRACTOR_VERSION)
+        pages = cache.get_pages(sha256)
+        if pages is not None:
+            self._log(f"⚡ Loaded {len(pages)} cached pages")
+            return pages
 
-            return text.strip()
+        pages = self._read_pages()
+        cache.put_pages(sha256, pages)
+        return pages
+
+    def extract_text_from_pdf(self) -> str:
+        """Extract text from PDF while preserving structure."""
+        self._log(f"📄 Reading PDF from: {self.pdf_path}")
+        text = "\n\n".join(self.extract_pages())
+
+        self._log(f"✅ Extracted {len(text)} characters of text")
+        self._log("\nFirst 500 characters of extracted text:")
+        self._log("-" * 80)
+        self._log(text[:500])
+        self._log("-" * 80)
+
+        return text.strip()
 
     def _clean_text(self, text: str) -> str:
         """Clean and normalize extracted text."""
@@ -50,90 +108,217 @@ class DocumentProcessor:
         text = text.replace("•", "\n•")
         return text.strip()
 
-    def extract_sections(self, text: str) -> List[Dict[str, str]]:
-        """Extract sections from text based on PCI DSS Prioritized Approach structure."""
-        sections = []
-        current_requirement = None
-        current_content = []
-
-        # Split text into lines and clean up
-        lines = [line.strip() for line in text.split("\n") if line.strip()]
-
-        print("\nLooking for requirements in text...")
-
-        # Regex patterns for requirements
-        req_header_pattern = r"requirement\s+(\d+):\s+(.+?)(?:\s+\d|$)"
-        req_item_pattern = r"^(\d+\.\d+(?:\.\d+)?)\s+(.+?)(?:\s+\d|$)"
-
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-
-            # Check for requirement header
-            header_match = re.search(req_header_pattern, line, re.IGNORECASE)
-            if header_match:
-                print(
-                    f"\nFound requirement header: {header_match.group(1)} - {header_match.group(2)}"
-                )
-                # Save previous requirement if exists
-                if current_requirement and current_content:
-                    sections.append(
-                        {
-                            "type": "requirement",
-                            "number": current_requirement["number"],
-                            "title": current_requirement["title"],
-                            "content": "\n".join(current_content),
-                            "subrequirements": [],
-                        }
-                    )
-
-                current_requirement = {
-                    "number": header_match.group(1),
-                    "title": header_match.group(2).strip(),
-                }
-                current_content = [line]
-                i += 1
-                continue
+    def _strip_running_header(self, pages: List[str]) -> List[str]:
+        """Remove the page number and boilerplate repeated at the top of pages.
+
+        Without this, text that continues onto the next page would pick up the
+        document's running header in the middle of a requirement.
+        """
+        bodies = [re.sub(r"^\d+\s+", "", page) for page in pages]
+        candidates = [body for body in bodies if ITEM_PATTERN.search(body)]
+        if len(candidates) < 2:
+            return bodies
+        prefix = os.path.commonprefix(candidates)
+        prefix = prefix[: prefix.rfind(" ") + 1]
+        if len(prefix) < 40:
+            return bodies
+        return [
+            body[len(prefix) :] if body.startswith(prefix) else body for body in bodies
+        ]
 
-            # Check for requirement item
-            item_match = re.search(req_item_pattern, line)
-            if item_match and current_requirement:
-                print(
-                    f"  Found requirement item: {item_match.group(1)} - {item_match.group(2)}"
-                )
-                current_content.append(f"{item_match.group(1)} {item_match.group(2)}")
+    def _split_milestone(self, content: str, has_milestones: bool) -> Tuple[str, str]:
+        """Separate the trailing Prioritized Approach milestone digit, if any."""
+        if has_milestones:
+            match = re.search(r"\s*([1-6])$", content)
+            if match:
+                return content[: match.start()].strip(), match.group(1)
+        return content, ""
 
-            i += 1
+    def extract_sections(self, pages: List[str]) -> List[Dict]:
+        """Parse requirements, sub-requirements and testing procedures per page.
 
-        # Add last requirement
-        if current_requirement and current_content:
-            sections.append(
-                {
+        Returns one entry per top-level requirement. Its "subrequirements" hold
+        every numbered item below it (e.g. 6.4, 6.4.5.1) and testing procedure
+        (e.g. 6.4.1.a), each with its page, section and parent number.
+        """
+        self._log("\nLooking for requirements in text...")
+        bodies = self._strip_running_header(pages)
+        has_milestones = any("milestone" in page.lower() for page in pages)
+
+        # Collect accepted headers and items in reading order. Items are only
+        # accepted under a requirement with the same leading number, so
+        # references like "PCI DSS Requirement 10.7.2" stay in the text.
+        markers = []
+        current = None
+        for page_number, body in enumerate(bodies, 1):
+            found = [
+                (match.start(), match.end(), "header", match.group(2), "")
+                for match in HEADER_PATTERN.finditer(body)
+            ]
+            found += [
+                (match.start(), match.end(), "item", match.group(1), match.group(2))
+                for match in ITEM_PATTERN.finditer(body)
+            ]
+            for start, end, kind, number, letter in sorted(found):
+                if kind == "header":
+                    current = number
+                elif current is None or number.split(".")[0] != current:
+                    continue
+                markers.append((page_number, start, end, kind, number, letter))
+
+        # Text of a marker runs until the next marker, possibly across pages
+        def marker_text(position: int) -> str:
+            page_number, _, end, *_ = markers[position]
+            if position + 1 < len(markers):
+                next_page, next_start = markers[position + 1][:2]
+            else:
+                next_page, next_start = len(bodies), len(bodies[-1])
+            if next_page == page_number:
+                return bodies[page_number - 1][end:next_start].strip()
+            parts = [bodies[page_number - 1][end:]]
+            parts += bodies[page_number : next_page - 1]
+            parts.append(bodies[next_page - 1][:next_start])
+            return " ".join(part.strip() for part in parts if part.strip())
+
+        requirements: Dict[str, Dict] = {}
+        items: Dict[Tuple[str, str], Dict] = {}
+        requirement = None
+        for position, (page_number, _, _, kind, number, letter) in enumerate(markers):
+            text = marker_text(position)
+
+            if kind == "header":
+                if number in requirements:
+                    requirement = requirements[number]
+                    continue
+                # The title is the header text up to the first item
+                label = "Appendix" if number.startswith("A") else "Requirement"
+                requirement = {
                     "type": "requirement",
-                    "number": current_requirement["number"],
-                    "title": current_requirement["title"],
-                    "content": "\n".join(current_content),
+                    "number": number,
+                    "title": text[:200],
+                    "content": "",
+                    "page": page_number,
+                    "section": f"{label} {number}: {text[:200]}",
                     "subrequirements": [],
                 }
-            )
+                requirements[number] = requirement
+                self._log(f"\nFound requirement header: {number} - {text[:80]}")
+                continue
+
+            full_number = f"{number}.{letter}" if letter else number
+            key = (requirement["number"], full_number)
+            if key in items:
+                items[key]["content"] = f"{items[key]['content']} {text}".strip()
+                continue
+
+            content, milestone = self._split_milestone(text, has_milestones)
+            parent = number if letter else number.rsplit(".", 1)[0]
+            while parent != requirement["number"] and (
+                (requirement["number"], parent) not in items
+            ):
+                parent = parent.rsplit(".", 1)[0]
+
+            item = {
+                "type": "testing_procedure" if letter else "subrequirement",
+                "number": full_number,
+                "title": re.split(r"(?<=[.:])\s", content, maxsplit=1)[0][:120],
+                "content": content,
+                "parent_requirement": parent,
+                "page": page_number,
+                "section": requirement["section"],
+            }
+            if milestone:
+                item["milestone"] = milestone
+            items[key] = item
+            requirement["subrequirements"].append(item)
+            self._log(f"  Found {item['type']}: {full_number} - {item['title'][:60]}")
+
+        # Requirement chunks stay small: header plus an outline of direct children
+        sections = list(requirements.values())
+        for requirement in sections:
+            outline = [
+                f"{item['number']} {item['title']}"
+                for item in requirement["subrequirements"]
+                if item["parent_requirement"] == requirement["number"]
+            ]
+            requirement["content"] = "\n".join([requirement["section"], *outline])
+
+        item_count = sum(len(section["subrequirements"]) for section in sections)
+        self._log(f"\nFound {len(sections)} requirements with {item_count} items")
+        return [section for section in sections if section["subrequirements"]]
+
+    def extract_passages(self, pages: List[str], max_chars: int = 2000) -> List[Dict]:
+        """Split unstructured text into paragraph-aligned passages.
+
+        Used for documents that do not follow the PCI DSS requirement layout.
+        Each passage records the page it starts on.
+        """
+        paragraphs = [
+            (page_number, paragraph.strip())
+            for page_number, page in enumerate(pages, 1)
+            for paragraph in re.split(r"\n\s*\n", page)
+            if paragraph.strip()
+        ]
+        passages = []
+        current = ""
+        current_page = 1
+        for page_number, paragraph in paragraphs:
+            if current and len(current) + len(paragraph) > max_chars:
+                passages.append((current_page, current))
+                current = ""
+            if not current:
+                current_page = page_number
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            passages.append((current_page, current))
+
+        return [
+            {
+                "type": "section",
+                "number": str(i),
+                "title": passage.split("\n", 1)[0][:120],
+                "content": passage,
+                "page": page_number,
+                "section": passage.split("\n", 1)[0][:120],
+                "subrequirements": [],
+            }
+            for i, (page_number, passage) in enumerate(passages, 1)
+        ]
+
+    def detect_standard(self, text: str) -> Tuple[str, str]:
+        """Identify the standard and version from the file name, then the text."""
+        for source in (self.pdf_path.stem, text[:20000]):
+            for standard, pattern in STANDARD_PATTERNS:
+                match = re.search(pattern, source, re.IGNORECASE)
+                if match:
+                    version = match.group(1) or "Unknown"
+                    return standard, version.replace("_", ".")
+        return self.pdf_path.stem, "Unknown"
 
-        print(f"\nFound {len(sections)} requirements")
-        return sections
+    def convert_to_json(
+        self, output_path: Optional[str] = None, pages: Optional[List[str]] = None
+    ) -> Dict:
+        """Convert PDF to structured JSON format.
 
-    def convert_to_json(self, output_path: Optional[str] = None) -> Dict:
-        """Convert PDF to structured JSON format."""
-        text = self.extract_text_from_pdf()
-        sections = self.extract_sections(text)
+        Pass `pages` from an earlier `extract_pages` call to skip reading the PDF.
+        """
+        if pages is None:
+            self._log(f"📄 Reading PDF from: {self.pdf_path}")
+            pages = self.extract_pages()
+        text = "\n\n".join(pages)
+        sections = self.extract_sections(pages)
+        if not sections:
+            # Fall back to plain passages for non PCI DSS layouts
+            sections = self.extract_passages(pages)
 
-        # Extract version from text or filename
-        version_pattern = r"PCI\s+DSS\s+v(\d+\.\d+(?:\.\d+)?)"
-        version_match = re.search(version_pattern, text)
-        version = version_match.group(1) if version_match else "Unknown"
+        # Extract standard and version from filename or text
+        standard, version = self.detect_standard(text)
 
         json_data = {
             "document_name": self.pdf_path.name,
             "metadata": {
-                "type": "PCI DSS Standard",
+                "type": f"{standard} Standard",
+                "standard": standard,
                 "version": version,
                 "processed_date": datetime.now().isoformat(),
             },
@@ -0,0 +1,164 @@
+import os
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from config import (
+    FAISS_INDEX_DIR,
+    FAISS_INDEX_PATH,
+    INDEX_KEEP_VERSIONS,
+    INDEX_RELOAD_INTERVAL,
+)
+from core.answers import load_answers
+from core.local_embeddings import embeddings_for_index
+from core.query_builder import load_topic_centroids
+from core.requirement_graph import RequirementGraph, load_requirement_graph
+from core.shards import ShardedIndex
+
+
+def new_index_version(index_dir: str = FAISS_INDEX_DIR) -> Tuple[str, str]:
+    """Create an empty, timestamped version directory for a new build."""
+    version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(index_dir, "versions", version)
+    os.makedirs(path)
+    return version, path
+
+
+def publish_index_version(
+    version: str, keep: int = INDEX_KEEP_VERSIONS, index_dir: str = FAISS_INDEX_DIR
+) -> None:
+    """Atomically point CURRENT at a finished version and prune old ones."""
+    current_file = os.path.join(index_dir, "CURRENT")
+    versions_dir = os.path.join(index_dir, "versions")
+    tmp_path = f"{current_file}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, current_file)
+
+    versions = sorted(os.listdir(versions_dir))
+    for old_version in versions[: max(0, len(versions) - keep)]:
+        if old_version != version:
+            shutil.rmtree(os.path.join(versions_dir, old_version), ignore_errors=True)
+
+
+def current_index_version(
+    index_dir: str = FAISS_INDEX_DIR, legacy_path: Optional[str] = FAISS_INDEX_PATH
+) -> Tuple[Optional[str], Optional[str]]:
+    """Return the published version and its path, or the legacy index path."""
+    current_file = os.path.join(index_dir, "CURRENT")
+    if os.path.exists(current_file):
+        with open(current_file, encoding="utf-8") as f:
+            version = f.read().strip()
+        path = os.path.join(index_dir, "versions", version)
+        if version and os.path.isdir(path):
+            return version, path
+    return None, legacy_path
+
+
+class IndexBundle:
+    """Everything loaded from one index version, swapped as a single unit."""
+
+    def __init__(
+        self,
+        version: Optional[str],
+        path: str,
+        index: ShardedIndex,
+        topic_centroids: Dict[str, np.ndarray],
+        answers: Optional[Dict[str, Dict]] = None,
+        graph: Optional[RequirementGraph] = None,
+        embeddings=None,
+    ):
+        self.version = version
+        self.path = path
+        self.index = index
+        # Queries must be embedded by the model that embedded this version
+        self.embeddings = embeddings
+        self.topic_centroids = topic_centroids
+        self.answers_by_number: Dict[str, List[Dict]] = {}
+        for answer in (answers or {}).values():
+            self.answers_by_number.setdefault(answer["number"], []).append(answer)
+        self.graph: RequirementGraph = graph or {}
+
+    @classmethod
+    def load(cls, version: Optional[str], path: str, embedding_model) -> "IndexBundle":
+        embeddings = embeddings_for_index(path, embedding_model)
+        return cls(
+            version=version,
+            path=path,
+            index=ShardedIndex.load(path, embeddings),
+            topic_centroids=load_topic_centroids(path),
+            answers=load_answers(path),
+            graph=load_requirement_graph(path),
+            embeddings=embeddings,
+        )
+
+    def warm_up(self) -> None:
+        self.index.warm_up()
+
+
+class IndexHolder:
+    """Holds the serving bundle; readers snapshot `current` once per request.
+
+    Swapping replaces a single reference, so requests that already took a
+    snapshot finish on the old version while new requests see the new one.
+    """
+
+    def __init__(self, bundle: Optional[IndexBundle] = None):
+        self.current = bundle
+        self._swap_lock = threading.Lock()
+
+    def swap(self, bundle: IndexBundle) -> Optional[IndexBundle]:
+        with self._swap_lock:
+            previous, self.current = self.current, bundle
+        return previous
+
+
+class IndexWatcher(threading.Thread):
+    """Background thread that loads, warms and swaps in newly published versions."""
+
+    def __init__(
+        self,
+        holder: IndexHolder,
+        embedding_model,
+        interval: float = INDEX_RELOAD_INTERVAL,
+    ):
+        super().__init__(name="index-watcher", daemon=True)
+        self.holder = holder
+        self.embedding_model = embedding_model
+        self.interval = interval
+        self._failed_version: Optional[str] = None
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def check_once(self) -> bool:
+        """Load the published version if it differs from the serving one."""
+        version, path = current_index_version()
+        serving = self.holder.current
+        if version is None or version == self._failed_version:
+            return False
+        if serving and serving.version == version:
+            return False
+
+        print(f"🔄 Loading index version {version}...")
+        try:
+            bundle = IndexBundle.load(version, path, self.embedding_model)
+            bundle.warm_up()
+        except Exception as e:
+            print(f"❌ Error loading index version {version}: {str(e)}")
+            self._failed_version = version
+            return False
+
+        previous = self.holder.swap(bundle)
+        print(
+            f"✅ Now serving index version {version} "
+            f"(was {previous.version if previous else 'none'})"
+        )
+        return True
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.check_once()
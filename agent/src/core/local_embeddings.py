@@ -0,0 +1,237 @@
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from config import (
+    LOCAL_EMBEDDING_DIMENSIONS,
+    LOCAL_EMBEDDING_MAX_FEATURES,
+    LOCAL_EMBEDDING_PATH,
+)
+from langchain_core.embeddings import Embeddings
+
+# EMBEDDING_MODEL_NAME value that selects this backend
+LOCAL_EMBEDDING_MODEL = "local-lsa"
+# Each index version keeps the model its vectors were embedded with
+LOCAL_EMBEDDING_FILE = "local_embeddings.npz"
+
+# Words plus requirement numbers such as 8.3.1, which carry most of the signal
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+STOP_WORDS = set(
+    (
+        "a an and any are as at be been by can for from has have if in into is "
+        "it its may must not of on or such that the their these this those to "
+        "was were which will with"
+    ).split()
+)
+
+# Extra random directions and power iterations for the randomized SVD
+SVD_OVERSAMPLES = 10
+SVD_POWER_ITERATIONS = 2
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words and numbers, plus adjacent-word bigrams."""
+    words = [
+        word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOP_WORDS
+    ]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+# A sparse row: (feature indices, weights)
+_Row = Tuple[np.ndarray, np.ndarray]
+
+
+def _tfidf_rows(
+    texts: List[str], vocabulary: Dict[str, int], idf: np.ndarray
+) -> List[_Row]:
+    """Sublinear TF-IDF rows, L2 normalised, over the fitted vocabulary."""
+    rows = []
+    for text in texts:
+        counts = Counter(
+            vocabulary[token] for token in tokenize(text) if token in vocabulary
+        )
+        if not counts:
+            rows.append((np.zeros(0, np.int64), np.zeros(0, np.float32)))
+            continue
+        indices = np.fromiter(counts.keys(), np.int64, len(counts))
+        tf = np.fromiter(counts.values(), np.float32, len(counts))
+        weights = (1.0 + np.log(tf)) * idf[indices]
+        rows.append((indices, weights / np.linalg.norm(weights)))
+    return rows
+
+
+def _times(rows: List[_Row], matrix: np.ndarray) -> np.ndarray:
+    """X @ matrix for sparse rows X."""
+    return np.stack([weights @ matrix[indices] for indices, weights in rows])
+
+
+def _transpose_times(rows: List[_Row], matrix: np.ndarray, features: int) -> np.ndarray:
+    """X.T @ matrix for sparse rows X."""
+    result = np.zeros((features, matrix.shape[1]), np.float32)
+    for (indices, weights), row in zip(rows, matrix):
+        result[indices] += weights[:, None] * row[None, :]
+    return result
+
+
+def _truncated_svd(rows: List[_Row], features: int, dimensions: int) -> np.ndarray:
+    """Top right singular vectors (features x dimensions) by randomized SVD.
+
+    Only thin dense matrices are formed, so memory grows with the corpus and
+    vocabulary sizes rather than their product.
+    """
+    rng = np.random.default_rng(0)
+    width = min(dimensions + SVD_OVERSAMPLES, len(rows), features)
+    basis, _ = np.linalg.qr(
+        _times(rows, rng.standard_normal((features, width), np.float32))
+    )
+    for _ in range(SVD_POWER_ITERATIONS):
+        projected, _ = np.linalg.qr(_transpose_times(rows, basis, features))
+        basis, _ = np.linalg.qr(_times(rows, projected))
+    # B = Q.T @ X is small (width x features); its SVD gives X's right vectors
+    _, _, right = np.linalg.svd(
+        _transpose_times(rows, basis, features).T, full_matrices=False
+    )
+    return np.ascontiguousarray(right[:dimensions].T, dtype=np.float32)
+
+
+def fit_local_embeddings(
+    texts: List[str],
+    path: str = LOCAL_EMBEDDING_PATH,
+    dimensions: int = LOCAL_EMBEDDING_DIMENSIONS,
+    max_features: int = LOCAL_EMBEDDING_MAX_FEATURES,
+) -> "LocalEmbeddings":
+    """Fit TF-IDF + truncated SVD on the corpus chunks and save the model.
+
+    Terms seen in a single chunk are dropped (unless the corpus is tiny) and
+    the `max_features` most frequent remaining terms form the vocabulary.
+    Vectors from a previous fit are not comparable, so every index embedded
+    with it has to be rebuilt.
+    """
+    document_frequency = Counter()
+    for text in texts:
+        document_frequency.update(set(tokenize(text)))
+    min_df = 2 if len(texts) >= 50 else 1
+    terms = [
+        term
+        for term, df in document_frequency.most_common(max_features)
+        if df >= min_df
+    ]
+    vocabulary = {term: i for i, term in enumerate(terms)}
+    idf = np.asarray(
+        [
+            math.log((1 + len(texts)) / (1 + document_frequency[term])) + 1
+            for term in terms
+        ],
+        np.float32,
+    )
+
+    rows = [row for row in _tfidf_rows(texts, vocabulary, idf) if len(row[0])]
+    components = _truncated_svd(
+        rows, len(terms), min(dimensions, len(rows), len(terms))
+    )
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write next to the target and rename so readers never see a partial file
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, terms=np.asarray(terms), idf=idf, components=components)
+    os.replace(tmp_path, path)
+    print(
+        f"✅ Fitted local embeddings on {len(texts)} chunks "
+        f"({len(terms)} terms, {components.shape[1]} dimensions)"
+    )
+    return LocalEmbeddings(path)
+
+
+class LocalEmbeddings(Embeddings):
+    """In-process TF-IDF + truncated SVD embeddings fitted on the corpus.
+
+    A text is embedded by projecting its sparse TF-IDF vector onto the
+    saved singular vectors, which takes microseconds and needs no network.
+    The model file is loaded on first use.
+    """
+
+    def __init__(self, path: str = LOCAL_EMBEDDING_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._vocabulary: Optional[Dict[str, int]] = None
+        self._idf: Optional[np.ndarray] = None
+        self._components: Optional[np.ndarray] = None
+
+    @property
+    def fitted(self) -> bool:
+        return self._components is not None or os.path.exists(self.path)
+
+    @property
+    def dimensions(self) -> int:
+        self._load()
+        return self._components.shape[1]
+
+    def _load(self) -> None:
+        if self._components is not None:
+            return
+        with self._lock:
+            if self._components is not None:
+                return
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(
+                    f"No local embedding model at {self.path}; "
+                    "run setup_index.py with EMBEDDING_MODEL_NAME="
+                    f"{LOCAL_EMBEDDING_MODEL} first"
+                )
+            with np.load(self.path) as model:
+                terms = model["terms"].tolist()
+                self._idf = model["idf"]
+                components = model["components"]
+            self._vocabulary = {term: i for i, term in enumerate(terms)}
+            self._components = components
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        self._load()
+        vectors = []
+        for indices, weights in _tfidf_rows(texts, self._vocabulary, self._idf):
+            vector = weights @ self._components[indices]
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+            vectors.append(vector.tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    # Embedding is cheaper than handing the call to a worker thread
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+
+def embeddings_for_index(index_path: Optional[str], embedding_model):
+    """The embeddings to query the index version at `index_path` with.
+
+    A version built with local embeddings carries its own model file, so a
+    refit goes live together with the vectors it produced. Hosted models and
+    versions without a model file keep `embedding_model`.
+    """
+    if not isinstance(embedding_model, LocalEmbeddings) or not index_path:
+        return embedding_model
+    path = os.path.join(index_path, LOCAL_EMBEDDING_FILE)
+    return LocalEmbeddings(path) if os.path.exists(path) else embedding_model
+
+
+def store_with_index(embeddings, index_path: str) -> None:
+    """Copy the local model that embedded a version's vectors into it."""
+    if not isinstance(embeddings, LocalEmbeddings):
+        return
+    target = os.path.join(index_path, LOCAL_EMBEDDING_FILE)
+    if os.path.abspath(embeddings.path) != os.path.abspath(target):
+        shutil.copy2(embeddings.path, target)
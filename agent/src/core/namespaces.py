@@ -0,0 +1,188 @@
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from config import INDEX_RELOAD_INTERVAL, TEAM_INDEX_DIR, TEAM_INDEX_MEMORY_MB
+from core.index_manager import IndexBundle, current_index_version
+from core.requirement_graph import load_requirement_graph
+from core.shards import ShardedIndex
+from core.singleflight import SingleFlight
+
+MB = 1024 * 1024
+
+# Team ids become directory names, so only plain slugs are accepted
+TEAM_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,127}")
+
+# Team whose namespace the current request may search; set with `namespace(...)`
+_namespace: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "index_namespace", default=None
+)
+
+
+@contextmanager
+def namespace(team_id: Optional[str]) -> Iterator[None]:
+    """Search the team's own index alongside the shared corpus inside the block."""
+    token = _namespace.set(str(team_id) if team_id else None)
+    try:
+        yield
+    finally:
+        _namespace.reset(token)
+
+
+def current_namespace() -> Optional[str]:
+    return _namespace.get()
+
+
+def team_index_dir(team_id: str) -> str:
+    if not TEAM_ID_PATTERN.fullmatch(team_id):
+        raise ValueError(f"Invalid team id '{team_id}'")
+    return os.path.join(TEAM_INDEX_DIR, team_id)
+
+
+class _TeamEntry:
+    def __init__(self, bundle: IndexBundle, memory_bytes: int):
+        self.bundle = bundle
+        self.memory_bytes = memory_bytes
+        self.checked_at = time.monotonic()
+        # Merged view over the shared bundle it was built from
+        self.shared: Optional[IndexBundle] = None
+        self.merged: Optional[IndexBundle] = None
+
+
+class NamespaceManager:
+    """Lazily loaded per-team indexes with LRU eviction under a memory budget.
+
+    A team's index is loaded the first time one of its requests searches,
+    and concurrent first requests share a single load. Loaded teams are
+    checked for a newly published version at most every `reload_interval`
+    seconds. When the loaded indexes exceed `memory_budget_mb`, the least
+    recently used teams are dropped; requests that already hold a bundle
+    finish on it.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: float = TEAM_INDEX_MEMORY_MB,
+        reload_interval: float = INDEX_RELOAD_INTERVAL,
+    ):
+        self.memory_budget = int(memory_budget_mb * MB)
+        self.reload_interval = reload_interval
+        self._teams: "OrderedDict[str, _TeamEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loads = SingleFlight("namespace-load", enabled=True)
+        self.stats: Dict[str, int] = {"hits": 0, "loads": 0, "evictions": 0}
+
+    def _load(self, team_id: str, embedding_model) -> Optional[_TeamEntry]:
+        version, path = current_index_version(team_index_dir(team_id), legacy_path=None)
+        if version is None:
+            return None
+        started = time.perf_counter()
+        bundle = IndexBundle(
+            version=version,
+            path=path,
+            index=ShardedIndex.load(path, embedding_model),
+            topic_centroids={},
+            graph=load_requirement_graph(path),
+            embeddings=embedding_model,
+        )
+        bundle.warm_up()
+        entry = _TeamEntry(bundle, bundle.index.memory_bytes())
+        self.stats["loads"] += 1
+        print(
+            f"📂 Loaded index for team {team_id} (version {version}, "
+            f"{bundle.index.ntotal} chunks, {entry.memory_bytes / MB:.1f} MB) "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return entry
+
+    def _is_stale(self, team_id: str, entry: _TeamEntry) -> bool:
+        if time.monotonic() - entry.checked_at < self.reload_interval:
+            return False
+        entry.checked_at = time.monotonic()
+        version, _ = current_index_version(team_index_dir(team_id), legacy_path=None)
+        return version is not None and version != entry.bundle.version
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used teams until the budget holds (lock held)."""
+        used = sum(entry.memory_bytes for entry in self._teams.values())
+        for team_id in list(self._teams):
+            if used <= self.memory_budget:
+                break
+            if team_id == keep:
+                continue
+            used -= self._teams.pop(team_id).memory_bytes
+            self.stats["evictions"] += 1
+            print(f"♻️ Evicted index for team {team_id}")
+
+    def get(self, team_id: str, embedding_model) -> Optional[_TeamEntry]:
+        with self._lock:
+            entry = self._teams.get(team_id)
+            if entry is not None:
+                self._teams.move_to_end(team_id)
+        if entry is not None and not self._is_stale(team_id, entry):
+            self.stats["hits"] += 1
+            return entry
+
+        entry = self._loads.do(team_id, self._load, team_id, embedding_model)
+        with self._lock:
+            if entry is None:
+                self._teams.pop(team_id, None)
+                return None
+            self._teams[team_id] = entry
+            self._teams.move_to_end(team_id)
+            self._evict(keep=team_id)
+        return entry
+
+    def bundle_for(
+        self, shared: Optional[IndexBundle], team_id: Optional[str], embedding_model
+    ) -> Optional[IndexBundle]:
+        """The shared bundle, merged with the team's index when it has one.
+
+        The merged bundle searches the team's shards next to the shared ones
+        in a single query and keeps the shared topic centroids and answers.
+        It is cached until either side changes, so its identity is stable
+        for request coalescing.
+        """
+        if not shared or not team_id:
+            return shared
+        try:
+            # Team vectors come from the shared model, queries are embedded once
+            entry = self.get(team_id, shared.embeddings or embedding_model)
+        except Exception as e:
+            print(f"❌ Error loading index for team {team_id}: {str(e)}")
+            return shared
+        if entry is None:
+            return shared
+
+        with self._lock:
+            if entry.shared is not shared:
+                entry.merged = IndexBundle(
+                    version=f"{shared.version}+{team_id}@{entry.bundle.version}",
+                    path=shared.path,
+                    index=shared.index.with_namespace(
+                        f"team-{team_id}", entry.bundle.index
+                    ),
+                    topic_centroids=shared.topic_centroids,
+                    embeddings=shared.embeddings,
+                )
+                entry.merged.answers_by_number = shared.answers_by_number
+                # Graph keys carry the document name, so the two never collide
+                entry.merged.graph = {**shared.graph, **entry.bundle.graph}
+                entry.shared = shared
+            return entry.merged
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "loaded": list(self._teams),
+                "memory_mb": round(
+                    sum(entry.memory_bytes for entry in self._teams.values()) / MB, 1
+                ),
+                "budget_mb": round(self.memory_budget / MB, 1),
+            }
@@ -0,0 +1,68 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from config import PAGE_CACHE_DIR
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's contents in blocks so large PDFs are never fully loaded."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageCache:
+    """Cleaned page text keyed by (file SHA-256, page index, extractor version).
+
+    Each document is stored as one gzip-compressed JSON file named after its
+    hash and the extractor version, so edited PDFs and extractor changes both
+    miss the cache naturally. Files are replaced atomically, which keeps
+    parallel indexing workers from ever reading a half-written entry.
+    """
+
+    def __init__(self, extractor_version: str, cache_dir: str = PAGE_CACHE_DIR):
+        self.extractor_version = extractor_version
+        self.cache_dir = cache_dir
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(
+            self.cache_dir, f"{sha256}.{self.extractor_version}.json.gz"
+        )
+
+    def _read(self, sha256: str) -> Optional[Dict]:
+        try:
+            with gzip.open(self._path(sha256), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None  # Missing or corrupt entries are simply re-extracted
+
+    def get_pages(self, sha256: str) -> Optional[List[str]]:
+        """Return every page of a document, or None unless all are cached."""
+        entry = self._read(sha256)
+        if entry is None:
+            return None
+        pages = entry["pages"]
+        if any(str(page) not in pages for page in range(entry["page_count"])):
+            return None
+        return [pages[str(page)] for page in range(entry["page_count"])]
+
+    def put_pages(self, sha256: str, pages: List[str]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(sha256)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "extractor_version": self.extractor_version,
+                    "page_count": len(pages),
+                    "pages": {str(page): text for page, text in enumerate(pages)},
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
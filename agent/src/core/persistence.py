@@ -0,0 +1,572 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import CHECKPOINT_COMPRESS_MIN_BYTES, CHECKPOINT_DB_PATH
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    Item,
+    ListNamespacesOp,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+)
+from langgraph.store.memory import _compare_values, _does_match
+
+# Serialized payloads above this size are stored zlib-compressed, marked by
+# this suffix on their serde type
+COMPRESSED_SUFFIX = "+zlib"
+
+# Namespace labels are joined with a separator that cannot appear in them
+NAMESPACE_SEPARATOR = "\x1f"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store (
+    prefix TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (prefix, key)
+) WITHOUT ROWID;
+"""
+
+
+def connect(path: str = CHECKPOINT_DB_PATH) -> sqlite3.Connection:
+    """Open the database in WAL mode so readers never block the writer."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # `with conn:` wraps each write batch in a single transaction
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL makes NORMAL durable against application crashes, and much cheaper
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def pack(typed: Tuple[str, bytes], min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES):
+    """Compress a serialized payload when it is large enough to be worth it."""
+    type_, data = typed
+    if min_bytes >= 0 and len(data) >= min_bytes:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return f"{type_}{COMPRESSED_SUFFIX}", compressed
+    return type_, data
+
+
+def unpack(type_: str, data: bytes) -> Tuple[str, bytes]:
+    if type_.endswith(COMPRESSED_SUFFIX):
+        return type_[: -len(COMPRESSED_SUFFIX)], zlib.decompress(data)
+    return type_, data
+
+
+class SQLiteSaver(BaseCheckpointSaver[str]):
+    """Checkpointer that keeps each thread's checkpoints as rows in SQLite.
+
+    A checkpoint only writes the channel values whose version changed, so
+    the cost of a write depends on that turn's delta rather than on how many
+    threads or turns exist. Every table is keyed by thread id first, and
+    large payloads (message histories, query vectors) are compressed.
+    """
+
+    def __init__(
+        self,
+        conn: Optional[sqlite3.Connection] = None,
+        compress_min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.conn = conn or connect()
+        self.compress_min_bytes = compress_min_bytes
+        self._lock = threading.Lock()
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        return pack(self.serde.dumps_typed(value), self.compress_min_bytes)
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        return self.serde.loads_typed(unpack(type_, data))
+
+    def _tuple(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        parent_checkpoint_id: Optional[str],
+        checkpoint_type: str,
+        checkpoint_data: bytes,
+        metadata_type: str,
+        metadata_data: bytes,
+    ) -> CheckpointTuple:
+        checkpoint = self._load(checkpoint_type, checkpoint_data)
+        versions = checkpoint["channel_versions"]
+        values = {}
+        if versions:
+            # Point lookups on the primary key, one per channel version
+            pairs = " OR ".join(["(channel = ? AND version = ?)"] * len(versions))
+            rows = self.conn.execute(
+                "SELECT channel, type, blob FROM blobs "
+                f"WHERE thread_id = ? AND checkpoint_ns = ? AND ({pairs})",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    *(
+                        value
+                        for channel, version in versions.items()
+                        for value in (channel, str(version))
+                    ),
+                ),
+            ).fetchall()
+            for channel, type_, blob in rows:
+                if type_ != "empty":
+                    values[channel] = self._load(type_, blob)
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, blob FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self._load(metadata_type, metadata_data),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self._load(type_, blob))
+                for task_id, channel, type_, blob in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params: List[Any] = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self.conn.execute(query, params).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, *row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints WHERE 1 = 1"
+        )
+        params: List[Any] = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self._load(row[6], row[7])
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            with self._lock:
+                item = self._tuple(*row)
+            yield item
+            if limit is not None:
+                limit -= 1
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        blobs = [
+            (
+                thread_id,
+                checkpoint_ns,
+                channel,
+                str(version),
+                *(
+                    self._dump(values[channel])
+                    if channel in values
+                    else ("empty", None)
+                ),
+            )
+            for channel, version in new_versions.items()
+        ]
+        checkpoint_type, checkpoint_data = self._dump(stored)
+        metadata_type, metadata_data = self._dump(
+            get_checkpoint_metadata(config, metadata)
+        )
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    checkpoint_type,
+                    checkpoint_data,
+                    metadata_type,
+                    metadata_data,
+                ),
+            )
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes,
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # As in InMemorySaver, regular writes keep the first value stored for
+        # a task, while errors and interrupts replace it
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        rows = [
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self._dump(value),
+                task_path,
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self.conn:
+            for table in ("checkpoints", "blobs", "writes"):
+                self.conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,)
+                )
+
+    # SQLite calls block, so the async API runs them in worker threads
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes,
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+class SQLiteStore(BaseStore):
+    """Long-term memory store kept in the same SQLite database.
+
+    Values are JSON, compressed above the size threshold. Namespaces are
+    stored as one joined prefix column so a namespace-prefix search is an
+    index range scan. Semantic search is not supported: a search with a
+    query warns, then returns the same unranked matches (score None), most
+    recently updated first.
+    """
+
+    def __init__(
+        self,
+        conn: Optional[sqlite3.Connection] = None,
+        compress_min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES,
+    ):
+        self.conn = conn or connect()
+        self.compress_min_bytes = compress_min_bytes
+        self._lock = threading.Lock()
+        self._warned_query = False
+
+    def _encode(self, value: Dict[str, Any]) -> bytes:
+        data = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        type_, data = pack(("json", data), self.compress_min_bytes)
+        return type_.encode("ascii") + b"\n" + data
+
+    def _decode(self, stored: bytes) -> Dict[str, Any]:
+        type_, data = stored.split(b"\n", 1)
+        return json.loads(unpack(type_.decode("ascii"), data)[1])
+
+    def _get(self, op: GetOp) -> Optional[Item]:
+        row = self.conn.execute(
+            "SELECT prefix, key, value, created_at, updated_at FROM store "
+            "WHERE prefix = ? AND key = ?",
+            (NAMESPACE_SEPARATOR.join(op.namespace), op.key),
+        ).fetchone()
+        return self._row_item(row) if row else None
+
+    def _row_item(self, row, cls=Item, **extra) -> Item:
+        prefix, key, value, created_at, updated_at = row
+        return cls(
+            value=self._decode(value),
+            key=key,
+            namespace=tuple(prefix.split(NAMESPACE_SEPARATOR)) if prefix else (),
+            created_at=datetime.fromisoformat(created_at),
+            updated_at=datetime.fromisoformat(updated_at),
+            **extra,
+        )
+
+    def _search(self, op: SearchOp) -> List[SearchItem]:
+        if op.query and not self._warned_query:
+            self._warned_query = True
+            print(
+                "⚠️ SQLiteStore has no semantic search; ignoring the query and "
+                "returning the most recently updated matches"
+            )
+        prefix = NAMESPACE_SEPARATOR.join(op.namespace_prefix)
+        query = "SELECT prefix, key, value, created_at, updated_at FROM store"
+        params: Tuple = ()
+        if prefix:
+            # Exact namespace, or anything below it: [prefix + sep, prefix + sep + max)
+            query += " WHERE prefix = ? OR (prefix >= ? AND prefix < ?)"
+            params = (
+                prefix,
+                prefix + NAMESPACE_SEPARATOR,
+                prefix + chr(ord(NAMESPACE_SEPARATOR) + 1),
+            )
+        query += " ORDER BY updated_at DESC"
+        items = []
+        skipped = 0
+        for row in self.conn.execute(query, params):
+            item = self._row_item(row, SearchItem)
+            if op.filter and not all(
+                _compare_values(item.value.get(key), value)
+                for key, value in op.filter.items()
+            ):
+                continue
+            if skipped < op.offset:
+                skipped += 1
+                continue
+            items.append(item)
+            if len(items) >= op.limit:
+                break
+        return items
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> List[Tuple[str, ...]]:
+        namespaces = [
+            tuple(prefix.split(NAMESPACE_SEPARATOR))
+            for (prefix,) in self.conn.execute("SELECT DISTINCT prefix FROM store")
+        ]
+        if op.match_conditions:
+            namespaces = [
+                ns
+                for ns in namespaces
+                if all(_does_match(condition, ns) for condition in op.match_conditions)
+            ]
+        if op.max_depth is not None:
+            namespaces = sorted({ns[: op.max_depth] for ns in namespaces})
+        else:
+            namespaces = sorted(namespaces)
+        return namespaces[op.offset : op.offset + op.limit]
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        results: List[Result] = []
+        puts: Dict[Tuple[Tuple[str, ...], str], PutOp] = {}
+        with self._lock:
+            for op in ops:
+                if isinstance(op, GetOp):
+                    results.append(self._get(op))
+                elif isinstance(op, SearchOp):
+                    results.append(self._search(op))
+                elif isinstance(op, ListNamespacesOp):
+                    results.append(self._list_namespaces(op))
+                elif isinstance(op, PutOp):
+                    # Later puts to the same key win, as in InMemoryStore
+                    puts[(op.namespace, op.key)] = op
+                    results.append(None)
+                else:
+                    raise ValueError(f"Unknown operation type: {type(op)}")
+
+            now = datetime.now(timezone.utc).isoformat()
+            with self.conn:
+                for (namespace, key), op in puts.items():
+                    prefix = NAMESPACE_SEPARATOR.join(namespace)
+                    if op.value is None:
+                        self.conn.execute(
+                            "DELETE FROM store WHERE prefix = ? AND key = ?",
+                            (prefix, key),
+                        )
+                        continue
+                    self.conn.execute(
+                        "INSERT INTO store VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (prefix, key) DO UPDATE SET "
+                        "value = excluded.value, updated_at = excluded.updated_at",
+                        (prefix, key, self._encode(dict(op.value)), now, now),
+                    )
+        return results
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        return await asyncio.to_thread(self.batch, list(ops))
+
+
+@asynccontextmanager
+async def generate_checkpointer() -> AsyncIterator[SQLiteSaver]:
+    """Checkpointer factory for the LangGraph server (see langgraph.json)."""
+    conn = connect()
+    try:
+        yield SQLiteSaver(conn)
+    finally:
+        conn.close()
+
+
+@asynccontextmanager
+async def generate_store() -> AsyncIterator[SQLiteStore]:
+    """Store factory for the LangGraph server (see langgraph.json)."""
+    conn = connect()
+    try:
+        yield SQLiteStore(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+import numpy as np
+from config import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL_NAME,
+    FAKE_EMBEDDING_LATENCY_MS,
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_SLOW_MS,
+    FAKE_LLM_SLOW_RATE,
+    GEMINI_MODEL_NAME,
+    GOOGLE_API_KEY,
+    LLM_CALL_DEADLINE,
+    LLM_PROVIDER,
+    OPENAI_API_KEY,
+    PROMPT_CACHE_TTL_SECONDS,
+    PROMPT_CONTEXT_CACHE,
+)
+from core.local_embeddings import LOCAL_EMBEDDING_MODEL, LocalEmbeddings
+from core.prompts import SYSTEM_INSTRUCTIONS
+from core.resilience import ResilientEmbeddings, ResilientModel
+from core.scheduler import ScheduledEmbeddings, ScheduledModel, estimate_tokens
+from core.singleflight import CoalescingEmbeddings, CoalescingModel
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+# Gemini generation settings
+generation_config = {
+    "temperature": 0.7,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+safety_settings = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+
+class FakeResponse:
+    """Minimal stand-in for a Gemini response object."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class TransientUpstreamError(ConnectionError):
+    """Injected by the fake provider to simulate a flaky upstream."""
+
+
+class FakeGenerativeModel:
+    """Local, deterministic replacement for `genai.GenerativeModel`.
+
+    Classification prompts that ask for 'true' or 'false' get "true"; all
+    other prompts get a short canned answer derived from the prompt hash.
+    A seeded share of calls can fail transiently (`error_rate`) or take
+    `slow_latency` instead of `latency` (`slow_rate`) to exercise retries
+    and hedging.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        seed: int = 0,
+        system_instruction: Optional[str] = None,
+    ):
+        self.system_instruction = system_instruction or ""
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _fault(self) -> float:
+        """Pick this call's latency, or raise an injected transient error."""
+        with self._rng_lock:
+            failed = self._rng.random() < self.error_rate
+            slow = self._rng.random() < self.slow_rate
+        if failed:
+            raise TransientUpstreamError("injected upstream failure")
+        return self.slow_latency if slow else self.latency
+
+    def _respond(self, prompt: str) -> FakeResponse:
+        if "'true' or 'false'" in f"{self.system_instruction}\n{prompt}":
+            return FakeResponse("true")
+        digest = hashlib.sha256(
+            f"{self.system_instruction}\n{prompt}".encode("utf-8")
+        ).hexdigest()[:12]
+        return FakeResponse(f"[fake-llm:{digest}] {prompt.strip()[:200]}")
+
+    @staticmethod
+    def _timeout(kwargs: Dict) -> Optional[float]:
+        return (kwargs.get("request_options") or {}).get("timeout")
+
+    def generate_content(self, prompt: str, **kwargs) -> FakeResponse:
+        latency = self._fault()
+        timeout = self._timeout(kwargs)
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("fake upstream request timed out")
+        if latency:
+            time.sleep(latency)
+        return self._respond(prompt)
+
+    async def generate_content_async(self, prompt: str, **kwargs) -> FakeResponse:
+        latency = self._fault()
+        timeout = self._timeout(kwargs)
+        if timeout is not None and latency > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError("fake upstream request timed out")
+        if latency:
+            await asyncio.sleep(latency)
+        return self._respond(prompt)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hash-seeded unit vectors, for running without a network."""
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+
+# The fake provider is announced once, not once per prompt kind
+_fake_announced = False
+
+
+def _cached_gemini_model(system_instruction: str):
+    """Gemini model reading its system instruction from a context cache.
+
+    Returns None when the cache cannot be created, e.g. because the
+    instruction is below the model's minimum cacheable size.
+    """
+    try:
+        cached = genai.caching.CachedContent.create(
+            model=GEMINI_MODEL_NAME,
+            system_instruction=system_instruction,
+            ttl=timedelta(seconds=PROMPT_CACHE_TTL_SECONDS),
+        )
+    except Exception as e:
+        print(f"⚠️ Context cache unavailable, sending instructions inline: {str(e)}")
+        return None
+    return genai.GenerativeModel.from_cached_content(
+        cached, generation_config=generation_config, safety_settings=safety_settings
+    )
+
+
+def build_model(system_instruction: Optional[str] = None, context_cache: bool = False):
+    """Create the generative model for the configured LLM_PROVIDER.
+
+    `system_instruction` is bound to the model, so callers send only the
+    per-call payload; with `context_cache` it is read from a Gemini context
+    cache when one can be created. Identical prompts in flight at the same
+    time share one upstream call, failed calls are retried (and slow ones
+    hedged) behind a circuit breaker, and every attempt that goes upstream
+    is admitted by the shared scheduler.
+    """
+    global _fake_announced
+    model = None
+    if LLM_PROVIDER == "fake":
+        if not _fake_announced:
+            print("🧪 Using fake LLM provider")
+            _fake_announced = True
+        model = FakeGenerativeModel(
+            latency=FAKE_LLM_LATENCY_MS / 1000,
+            error_rate=FAKE_LLM_ERROR_RATE,
+            slow_rate=FAKE_LLM_SLOW_RATE,
+            slow_latency=FAKE_LLM_SLOW_MS / 1000,
+            system_instruction=system_instruction,
+        )
+    else:
+        os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+        genai.configure(api_key=GOOGLE_API_KEY)
+        if system_instruction and context_cache:
+            model = _cached_gemini_model(system_instruction)
+        if model is None:
+            model = genai.GenerativeModel(
+                model_name=GEMINI_MODEL_NAME,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                system_instruction=system_instruction,
+            )
+    static_tokens = estimate_tokens(system_instruction) if system_instruction else 0
+    return CoalescingModel(
+        ResilientModel(ScheduledModel(model, static_tokens=static_tokens))
+    )
+
+
+# One model per prompt kind, with the time its context cache (if any) expires
+_prompt_models: Dict[str, Tuple[object, Optional[float]]] = {}
+_prompt_models_lock = threading.Lock()
+
+
+def prompt_model(kind: str):
+    """The model bound to the static instructions of one prompt kind.
+
+    Built on first use and shared afterwards; a model reading a context
+    cache is rebuilt shortly before the cache expires.
+    """
+    entry = _prompt_models.get(kind)
+    if entry and (entry[1] is None or time.time() < entry[1]):
+        return entry[0]
+    with _prompt_models_lock:
+        entry = _prompt_models.get(kind)
+        if entry and (entry[1] is None or time.time() < entry[1]):
+            return entry[0]
+        cached = PROMPT_CONTEXT_CACHE and LLM_PROVIDER != "fake"
+        model = build_model(SYSTEM_INSTRUCTIONS[kind], context_cache=cached)
+        expires = (
+            # Leave a margin so no call reaches an expired cache
+            time.time() + 0.9 * PROMPT_CACHE_TTL_SECONDS
+            if cached and getattr(model, "cached_content", None)
+            else None
+        )
+        _prompt_models[kind] = (model, expires)
+        return model
+
+
+def build_embeddings(model_name: str = EMBEDDING_MODEL_NAME) -> Embeddings:
+    """Create the embedding model for `model_name` and the LLM_PROVIDER.
+
+    "local-lsa" is the in-process model fitted on the corpus at index time
+    and is used as is. For hosted models, identical texts in flight at the
+    same time share one embedding request, failed requests are retried
+    behind a circuit breaker, and every attempt that goes upstream is
+    admitted by the shared scheduler.
+    """
+    if model_name == LOCAL_EMBEDDING_MODEL:
+        return LocalEmbeddings()
+
+    if LLM_PROVIDER == "fake":
+        return CoalescingEmbeddings(
+            ResilientEmbeddings(
+                ScheduledEmbeddings(
+                    FakeEmbeddings(latency=FAKE_EMBEDDING_LATENCY_MS / 1000)
+                )
+            )
+        )
+
+    os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+    # text-embedding-3 models can return shortened vectors natively
+    dimensions = (
+        EMBEDDING_DIMENSIONS if model_name.startswith("text-embedding-3") else None
+    )
+    return CoalescingEmbeddings(
+        ResilientEmbeddings(
+            ScheduledEmbeddings(
+                OpenAIEmbeddings(
+                    model=model_name,
+                    openai_api_key=OPENAI_API_KEY,
+                    dimensions=dimensions,
+                    # Per-call budgets cannot reach this client; bound it here
+                    request_timeout=LLM_CALL_DEADLINE,
+                )
+            )
+        )
+    )
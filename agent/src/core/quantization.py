@@ -0,0 +1,113 @@
+import math
+import os
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+from config import INDEX_PQ_SUBQUANTIZERS, INDEX_RESCORE_FACTOR
+
+EXACT_VECTORS_FILE = "vectors.npy"
+QUANTIZATION_METHODS = ("none", "fp16", "sq8", "pq")
+
+
+def _pq_subquantizers(dimensions: int, requested: int) -> int:
+    """Largest divisor of the dimension count not above the requested m."""
+    for m in range(min(requested, dimensions), 0, -1):
+        if dimensions % m == 0:
+            return m
+    return 1
+
+
+def quantize_vectors(
+    vectors: np.ndarray,
+    method: str,
+    pq_subquantizers: int = INDEX_PQ_SUBQUANTIZERS,
+) -> faiss.Index:
+    """Build an L2 index over the vectors using a compact code representation.
+
+    "fp16" halves memory, "sq8" stores one byte per dimension and "pq" stores
+    one code per sub-vector. "none" keeps the exact float32 flat index.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimensions = vectors.shape
+
+    if method == "none":
+        index = faiss.IndexFlatL2(dimensions)
+    elif method == "fp16":
+        index = faiss.IndexScalarQuantizer(
+            dimensions, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2
+        )
+    elif method == "sq8":
+        index = faiss.IndexScalarQuantizer(
+            dimensions, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2
+        )
+    elif method == "pq":
+        # PQ training needs at least 2^nbits points per sub-quantizer
+        nbits = max(1, min(8, int(math.log2(max(count, 2)))))
+        index = faiss.IndexPQ(
+            dimensions, _pq_subquantizers(dimensions, pq_subquantizers), nbits
+        )
+    else:
+        raise ValueError(
+            f"Unknown quantization '{method}'. Choose from: {', '.join(QUANTIZATION_METHODS)}"
+        )
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def reduce_dimensions(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """Truncate and re-normalise embeddings, as the `dimensions` API parameter does."""
+    reduced = np.ascontiguousarray(vectors[:, :dimensions], dtype=np.float32)
+    norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+    return reduced / np.maximum(norms, 1e-12)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Serialized size of an index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).size)
+
+
+def save_exact_vectors(path: str, vectors: np.ndarray) -> None:
+    """Keep full-precision vectors on disk for optional exact re-scoring."""
+    np.save(os.path.join(path, EXACT_VECTORS_FILE), vectors.astype(np.float32))
+
+
+def load_exact_vectors(path: str) -> Optional[np.ndarray]:
+    """Memory-map the exact vectors of a shard, if they were saved."""
+    vectors_path = os.path.join(path, EXACT_VECTORS_FILE)
+    if not os.path.exists(vectors_path):
+        return None
+    return np.load(vectors_path, mmap_mode="r")
+
+
+def rescore(
+    queries: np.ndarray,
+    indices: np.ndarray,
+    exact_vectors: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Recompute exact squared L2 distances for candidates and re-sort each row.
+
+    Only the candidate rows are read from the memory-mapped vectors, so the
+    full-precision matrix never has to be resident.
+    """
+    distances = np.full(indices.shape, np.inf, dtype=np.float32)
+    for row, (query, candidates) in enumerate(zip(queries, indices)):
+        valid = candidates >= 0
+        if not valid.any():
+            continue
+        candidate_vectors = exact_vectors[candidates[valid]]
+        distances[row, valid] = ((candidate_vectors - query) ** 2).sum(axis=1)
+
+    order = np.argsort(distances, axis=1)
+    sorted_indices = np.take_along_axis(indices, order, axis=1)
+    sorted_distances = np.take_along_axis(distances, order, axis=1)
+    sorted_indices[~np.isfinite(sorted_distances)] = -1
+    return sorted_distances, sorted_indices
+
+
+def rescore_fetch_k(k: int, factor: int = INDEX_RESCORE_FACTOR) -> int:
+    """How many quantized candidates to fetch before exact re-scoring."""
+    return k * max(1, factor)
@@ -0,0 +1,205 @@
+import os
+import re
+from typing import Dict, List
+
+import numpy as np
+from config import QUERY_CONTEXT_CHARS, QUERY_CONTEXT_TURNS, TOPIC_BOOST_WEIGHT
+from langchain_core.messages import HumanMessage
+
+TOPIC_CENTROIDS_FILE = "topic_centroids.npz"
+
+# Keywords used to detect which topics a query touches
+QUERY_TOPICS = {
+    "cloud": ["cloud", "aws", "azure", "gcp", "saas", "hosting"],
+    "storage": ["storage", "database", "backup", "repository"],
+    "encryption": ["encrypt", "cryptography", "cipher", "key"],
+    "access": ["access", "authentication", "authorization", "permission"],
+}
+
+# Short descriptions embedded once at index time to build topic centroids
+TOPIC_DESCRIPTIONS = {
+    "cloud": [
+        "Cloud service provider requirements",
+        "Shared responsibility model",
+        "Data residency requirements",
+        "Cloud-specific security controls",
+    ],
+    "storage": [
+        "Data storage requirements",
+        "Backup and recovery procedures",
+        "Data retention policies",
+        "Storage security controls",
+    ],
+    "encryption": [
+        "Encryption requirements",
+        "Key management procedures",
+        "Cryptographic standards",
+        "Implementation guidance for encryption",
+    ],
+    "access": [
+        "Access control requirements",
+        "Authentication methods",
+        "Authorization procedures",
+        "Audit requirements for access",
+    ],
+}
+
+
+def detect_topics(query: str) -> List[str]:
+    """Return the topics whose keywords appear in the query."""
+    lowered = query.lower()
+    return [
+        topic
+        for topic, keywords in QUERY_TOPICS.items()
+        if any(keyword in lowered for keyword in keywords)
+    ]
+
+
+# Signals that a query is about security standards, for classifying it
+# without the LLM when the upstream is unavailable
+SECURITY_QUERY_PATTERN = re.compile(
+    r"\b(?:pci|dss|iso|nist|soc\s?2|complian\w*|requirements?|req|audit\w*"
+    r"|polic\w+|controls?|security|secure|cardholder|firewall|vulnerab\w+"
+    r"|password|mfa|tokeni[sz]\w+|risk)\b|\b\d{1,2}\.\d{1,2}",
+    re.IGNORECASE,
+)
+
+
+def needs_context_without_llm(query: str) -> bool:
+    """Keyword fallback for the LLM's 'needs standards context?' decision."""
+    return bool(detect_topics(query) or SECURITY_QUERY_PATTERN.search(query))
+
+
+# Short questions that point back at the previous answer instead of naming
+# a new subject, e.g. "what about the testing procedure for that?"
+FOLLOWUP_PATTERN = re.compile(
+    r"^(?:and|also|what about|how about|and what about)\b"
+    r"|\b(?:that|this|it|its|those|these|them|above|same|previous|mentioned)\b",
+    re.IGNORECASE,
+)
+FOLLOWUP_MAX_WORDS = 15
+# A follow-up that brings more than this many words of its own ("how long
+# must those audit logs be retained?") is a new question, not a reference
+FOLLOWUP_MAX_CONTENT_WORDS = 3
+FOLLOWUP_FILLER_WORDS = set(
+    (
+        "a about also an and are as be can could do does for how in is it its "
+        "of on same should that the them these this those to was were what "
+        "when where which who why with"
+    ).split()
+)
+
+# Which related chunk types a follow-up asks for
+FOLLOWUP_TYPE_HINTS = {
+    "testing_procedure": re.compile(
+        r"\b(?:test\w*|procedures?|assess\w*|verif\w+)\b", re.I
+    ),
+    "subrequirement": re.compile(
+        r"\b(?:sub-?requirements?|details?|specifics?)\b", re.I
+    ),
+}
+
+
+def is_followup(question: str) -> bool:
+    """True for short anaphoric follow-ups that name no requirement number."""
+    if len(question.split()) > FOLLOWUP_MAX_WORDS or re.search(r"\d+\.\d+", question):
+        return False
+    words = re.findall(r"[a-z]+", question.lower())
+    content = [word for word in words if word not in FOLLOWUP_FILLER_WORDS]
+    if len(content) > FOLLOWUP_MAX_CONTENT_WORDS:
+        return False
+    return bool(FOLLOWUP_PATTERN.search(question.strip()))
+
+
+def followup_types(question: str) -> List[str]:
+    """Chunk types a follow-up asks for, e.g. testing procedures."""
+    return [
+        chunk_type
+        for chunk_type, pattern in FOLLOWUP_TYPE_HINTS.items()
+        if pattern.search(question)
+    ]
+
+
+def _message_text(message) -> str:
+    content = message.content if hasattr(message, "content") else message
+    return " ".join(str(content).split())
+
+
+def build_retrieval_query(
+    messages: List,
+    turns: int = QUERY_CONTEXT_TURNS,
+    max_chars: int = QUERY_CONTEXT_CHARS,
+) -> str:
+    """Build a compact retrieval query from the latest message and recent turns.
+
+    The current question comes first so requirement-number detection sees it
+    before any earlier turn; previous user turns are truncated to max_chars.
+    """
+    current_query = _message_text(messages[-1])
+    if turns <= 0:
+        return current_query
+
+    previous_turns = [
+        _message_text(msg)[:max_chars]
+        for msg in messages[:-1]
+        if isinstance(msg, HumanMessage)
+    ][-turns:]
+
+    if not previous_turns:
+        return current_query
+    return f"{current_query}\nEarlier: {' | '.join(previous_turns)}"
+
+
+def compute_topic_centroids(embedding_model) -> Dict[str, np.ndarray]:
+    """Embed the topic descriptions in one request and average them per topic."""
+    phrases = [
+        (topic, phrase)
+        for topic, descriptions in TOPIC_DESCRIPTIONS.items()
+        for phrase in descriptions
+    ]
+    vectors = np.asarray(
+        embedding_model.embed_documents([phrase for _, phrase in phrases]),
+        dtype=np.float32,
+    )
+
+    centroids = {}
+    for topic in TOPIC_DESCRIPTIONS:
+        rows = [i for i, (name, _) in enumerate(phrases) if name == topic]
+        centroid = vectors[rows].mean(axis=0)
+        centroids[topic] = centroid / np.linalg.norm(centroid)
+    return centroids
+
+
+def save_topic_centroids(index_path: str, centroids: Dict[str, np.ndarray]) -> None:
+    """Store topic centroids next to the FAISS index files."""
+    np.savez(os.path.join(index_path, TOPIC_CENTROIDS_FILE), **centroids)
+
+
+def load_topic_centroids(index_path: str) -> Dict[str, np.ndarray]:
+    """Load topic centroids stored with the index, or an empty mapping."""
+    centroids_path = os.path.join(index_path, TOPIC_CENTROIDS_FILE)
+    if not os.path.exists(centroids_path):
+        return {}
+    with np.load(centroids_path) as data:
+        return {topic: data[topic] for topic in data.files}
+
+
+def blend_query_vector(
+    query_vector: List[float],
+    topics: List[str],
+    centroids: Dict[str, np.ndarray],
+    weight: float = TOPIC_BOOST_WEIGHT,
+) -> List[float]:
+    """Nudge a query embedding towards the centroids of its detected topics."""
+    boosts = [centroids[topic] for topic in topics if topic in centroids]
+    if not boosts or weight <= 0:
+        return list(query_vector)
+
+    vector = np.asarray(query_vector, dtype=np.float32)
+    vector = vector + weight * np.mean(boosts, axis=0)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def current_question(retrieval_query: str) -> str:
+    """The current question of a `build_retrieval_query` query, without earlier turns."""
+    return retrieval_query.split("\n", 1)[0]
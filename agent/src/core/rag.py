@@ -1,197 +1,424 @@
-import os
+import json
 import re
+from typing import Dict, List, Optional, Tuple
 
-import google.generativeai as genai
+import numpy as np
 from config import (
-    EMBEDDING_MODEL_NAME,
-    FAISS_INDEX_PATH,
-    GEMINI_MODEL_NAME,
-    GOOGLE_API_KEY,
-    OPENAI_API_KEY,
-    RETRIEVER_K,
+    FOLLOWUP_DELTA_K,
+    FOLLOWUP_REUSE,
+    FOLLOWUP_SIMILARITY,
+    INDEX_HOT_RELOAD,
+    RETRIEVER_EXPAND_PARENTS,
+    RETRIEVER_EXPAND_RELATED,
+    RETRIEVER_MAX_K,
+    RETRIEVER_RELATED_K,
 )
-from langchain_community.vectorstores import FAISS
-from langchain_core.tools import tool
-from langchain_openai import OpenAIEmbeddings
-
-# Set environment variables and configure models
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-genai.configure(api_key=GOOGLE_API_KEY)
-
-# Initialize Gemini
-generation_config = {
-    "temperature": 0.7,
-    "top_p": 0.8,
-    "top_k": 40,
-    "max_output_tokens": 2048,
-}
-safety_settings = [
-    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-]
-
-model = genai.GenerativeModel(
-    model_name=GEMINI_MODEL_NAME,
-    generation_config=generation_config,
-    safety_settings=safety_settings,
+from core.answers import answer_key, detect_lookup, format_answer
+from core.dedup import metadata_values
+from core.index_manager import (
+    IndexBundle,
+    IndexHolder,
+    IndexWatcher,
+    current_index_version,
 )
-
-# Initialize embeddings
-embedding_model = OpenAIEmbeddings(
-    model=EMBEDDING_MODEL_NAME, openai_api_key=OPENAI_API_KEY
+from core.namespaces import NamespaceManager, current_namespace
+from core.prompts import query_payload
+from core.providers import build_embeddings, prompt_model
+from core.query_builder import (
+    blend_query_vector,
+    current_question,
+    detect_topics,
+    followup_types,
+    is_followup,
 )
+from core.resilience import UpstreamUnavailable, degraded_answer
+from core.retrieval import adaptive_batch_search
+from core.singleflight import SingleFlight, normalize_text
+from langchain_core.documents import Document
+from langchain_core.tools import tool
+
+# Initialize embeddings for the configured provider; generation uses the
+# per-kind models from providers.prompt_model
+embedding_model = build_embeddings()
 
+# Load the published index version (or the legacy index) into a swappable holder
+index_holder = IndexHolder()
 try:
-    # Try to load existing FAISS index
-    vector_store = FAISS.load_local(
-        FAISS_INDEX_PATH, embedding_model, allow_dangerous_deserialization=True
+    index_version, index_path = current_index_version()
+    index_holder.swap(IndexBundle.load(index_version, index_path, embedding_model))
+    print(
+        f"✅ FAISS index loaded successfully (version {index_version or 'legacy'}, "
+        f"{index_holder.current.index.ntotal} chunks in "
+        f"{len(index_holder.current.index.names)} shard(s))"
     )
-    print("✅ FAISS index loaded successfully")
 except Exception as e:
     print(f"❌ Error loading FAISS index: {str(e)}")
     print("Please run setup_index.py first to create the index.")
-    vector_store = None
 
-retriever = (
-    vector_store.as_retriever(search_kwargs={"k": RETRIEVER_K})
-    if vector_store
-    else None
-)
+# Pick up newly published index versions without restarting the worker
+if INDEX_HOT_RELOAD:
+    index_watcher = IndexWatcher(index_holder, embedding_model)
+    index_watcher.start()
 
+# Per-team indexes, loaded on first use and searched with the shared corpus
+team_namespaces = NamespaceManager()
 
-@tool
-def rag_retrieval(query: str) -> str:
-    """Process a query about security standards using RAG."""
-    try:
-        if not vector_store or not retriever:
-            return "⚠️ Error: Vector store not initialized. Please run setup_index.py first."
 
-        # Enhanced requirement pattern matching with variations
-        req_patterns = [
-            r"(?:requirement|req\.?|r)\s*[-:]?\s*(\d+(?:\.\d+)?(?:\.\d+)?)",
-            r"(?:testing procedure|test|tp)\s*[-:]?\s*(\d+(?:\.\d+)?(?:\.\d+)?)",
-            r"(?:guidance|guide|g)\s*[-:]?\s*(\d+(?:\.\d+)?(?:\.\d+)?)",
-        ]
+def serving_bundle() -> Optional[IndexBundle]:
+    """Snapshot of the serving index, merged with the request's team namespace."""
+    return team_namespaces.bundle_for(
+        index_holder.current, current_namespace(), embedding_model
+    )
 
-        # Identify query type for better context
-        query_topics = {
-            "cloud": ["cloud", "aws", "azure", "gcp", "saas", "hosting"],
-            "storage": ["storage", "database", "backup", "repository"],
-            "encryption": ["encrypt", "cryptography", "cipher", "key"],
-            "access": ["access", "authentication", "authorization", "permission"],
-        }
 
-        # Determine query context
-        query_context = []
-        for topic, keywords in query_topics.items():
-            if any(keyword in query.lower() for keyword in keywords):
-                query_context.append(topic)
-
-        # Enhanced query based on context
-        enhanced_query = query
-        if query_context:
-            context_additions = {
-                "cloud": """
-                Include:
-                - Cloud service provider requirements
-                - Shared responsibility model
-                - Data residency requirements
-                - Cloud-specific security controls
-                """,
-                "storage": """
-                Include:
-                - Data storage requirements
-                - Backup and recovery procedures
-                - Data retention policies
-                - Storage security controls
-                """,
-                "encryption": """
-                Include:
-                - Encryption requirements
-                - Key management procedures
-                - Cryptographic standards
-                - Implementation guidance
-                """,
-                "access": """
-                Include:
-                - Access control requirements
-                - Authentication methods
-                - Authorization procedures
-                - Audit requirements
-                """,
-            }
-            for context in query_context:
-                enhanced_query += context_additions.get(context, "")
-
-        req_number = None
-        req_type = None
-
-        # Try each pattern
-        for pattern in req_patterns:
-            match = re.search(pattern, query.lower())
-            if match:
-                req_number = match.group(1)
-                req_type = (
-                    "requirement"
-                    if "req" in pattern
-                    else "testing"
-                    if "test" in pattern
-                    else "guidance"
-                )
-                print(f"📌 Direct lookup for PCI {req_type.title()}: {req_number}")
-                break
-
-        if req_number:
-            # Hierarchical search strategy with page context
-            docs = []
-
-            # 1. Try exact requirement number match with metadata filtering
-            search_filters = {
-                "number": req_number,
-                "type": req_type if req_type else None,
-            }
-            search_filters = {k: v for k, v in search_filters.items() if v is not None}
-
-            docs = vector_store.similarity_search(
-                query, k=RETRIEVER_K, filter=search_filters, search_type="similarity"
+def query_embeddings(bundle: IndexBundle):
+    """The model to embed queries for `bundle` with, loaded with its version."""
+    return bundle.embeddings or embedding_model
+
+
+# Identical retrievals in flight at the same time share one embed and search
+retrieval_flight = SingleFlight("retrieval")
+
+
+def _search_embeddings(
+    bundle: IndexBundle,
+    embeddings: List[List[float]],
+    topics: List[Optional[List[str]]],
+    filter: Optional[Dict] = None,
+    shards: Optional[List[str]] = None,
+    max_k: int = RETRIEVER_MAX_K,
+) -> List[List[Document]]:
+    """Blend topic centroids into each embedding and run one batched search."""
+    blended = [
+        blend_query_vector(embedding, query_topics, bundle.topic_centroids)
+        if query_topics
+        else embedding
+        for embedding, query_topics in zip(embeddings, topics)
+    ]
+    results = adaptive_batch_search(
+        bundle.index, blended, filter=filter, shards=shards, max_k=max_k
+    )
+    for scored in results:
+        print(
+            f"🎯 Retrieved {len(scored)} chunk(s) "
+            f"(scores: {', '.join(f'{score:.2f}' for _, score in scored)})"
+        )
+    return [[doc for doc, _ in scored] for scored in results]
+
+
+def _retrieval_key(
+    query: str,
+    filter: Optional[Dict],
+    topics: Optional[List[str]],
+    shards: Optional[List[str]],
+    bundle: IndexBundle,
+) -> tuple:
+    return (
+        normalize_text(query),
+        json.dumps(filter, sort_keys=True, default=str),
+        tuple(sorted(topics or ())),
+        tuple(shards or ()),
+        id(bundle),
+    )
+
+
+def _retrieve(
+    query: str,
+    filter: Optional[Dict],
+    topics: Optional[List[str]],
+    shards: Optional[List[str]],
+    bundle: IndexBundle,
+    embedding: Optional[List[float]] = None,
+) -> List[Document]:
+    if embedding is None:
+        embedding = query_embeddings(bundle).embed_query(query)
+    return _search_embeddings(
+        bundle, [embedding], [topics], filter=filter, shards=shards
+    )[0]
+
+
+def retrieve(
+    query: str,
+    filter: Optional[Dict] = None,
+    topics: Optional[List[str]] = None,
+    shards: Optional[List[str]] = None,
+    bundle: Optional[IndexBundle] = None,
+    embedding: Optional[List[float]] = None,
+) -> List[Document]:
+    """Retrieve an adaptively sized list of relevant chunks for a query.
+
+    When topics are given, the query embedding is blended towards their
+    precomputed centroids instead of appending topic text to the query.
+    `shards` restricts the search to named shards (see core.shards.shard_name).
+    Pass the `bundle` snapshot taken at the start of a request to keep every
+    lookup of that request on the same index version. Pass the query
+    `embedding` when it is already known to skip re-embedding. Concurrent
+    identical calls are coalesced into one.
+    """
+    bundle = bundle or serving_bundle()
+    if not bundle:
+        return []
+    key = _retrieval_key(query, filter, topics, shards, bundle)
+    return list(
+        retrieval_flight.do(
+            key, _retrieve, query, filter, topics, shards, bundle, embedding
+        )
+    )
+
+
+def batch_retrieve(
+    queries: List[str],
+    filter: Optional[Dict] = None,
+    boost_topics: bool = True,
+    shards: Optional[List[str]] = None,
+) -> List[List[Document]]:
+    """Retrieve chunks for many queries with one embedding request and one search.
+
+    Results are returned per query, in the same order as `queries`.
+    """
+    bundle = serving_bundle()
+    if not bundle or not queries:
+        return [[] for _ in queries]
+    embeddings = query_embeddings(bundle).embed_documents(queries)
+    topics = [detect_topics(query) if boost_topics else None for query in queries]
+    return _search_embeddings(bundle, embeddings, topics, filter=filter, shards=shards)
+
+
+def lookup_materialized(
+    query: str, bundle: Optional[IndexBundle] = None
+) -> Optional[str]:
+    """Serve a precomputed answer when the query is a pure requirement lookup."""
+    bundle = bundle or serving_bundle()
+    # Only the current question counts, not the earlier turns appended to it
+    number = detect_lookup(current_question(query))
+    if not bundle or not number or number not in bundle.answers_by_number:
+        return None
+    print(f"📚 Serving materialized answer for requirement {number}")
+    return format_answer(bundle.answers_by_number[number])
+
+
+def materialized_doc_ids(query: str, bundle: Optional[IndexBundle] = None) -> List[str]:
+    """Chunk ids behind the materialized answer `lookup_materialized` serves."""
+    bundle = bundle or serving_bundle()
+    number = detect_lookup(current_question(query))
+    if not bundle or number not in bundle.answers_by_number:
+        return []
+    return [
+        answer_key(entry["document"], entry["number"])
+        for entry in bundle.answers_by_number[number]
+    ]
+
+
+def expand_parents(docs: List[Document], bundle: IndexBundle) -> List[Document]:
+    """Put each retrieved item's parent chunk (e.g. 6.4 for 6.4.1) ahead of it."""
+    expanded = []
+    seen = set()
+    for doc in docs:
+        parent_number = doc.metadata.get("parent_requirement")
+        parent = (
+            bundle.index.lookup(doc.metadata.get("document"), parent_number)
+            if parent_number
+            else None
+        )
+        for item in (parent, doc):
+            if item is not None and id(item) not in seen:
+                seen.add(id(item))
+                expanded.append(item)
+    return expanded
+
+
+def expand_related(
+    docs: List[Document], bundle: IndexBundle, limit: int = RETRIEVER_RELATED_K
+) -> List[Document]:
+    """Append up to `limit` requirements linked to the results in the graph.
+
+    Candidates are ranked by their strongest edge from any retrieved chunk
+    (explicit references first, then parents, children and similar
+    requirements) and fetched by lookup, so no extra vector search runs.
+    """
+    present = {chunk_id(doc) for doc in docs}
+    candidates: Dict[str, float] = {}
+    for doc in docs:
+        for target, _, weight in bundle.graph.get(chunk_id(doc), []):
+            if target not in present and weight > candidates.get(target, 0.0):
+                candidates[target] = weight
+    related = []
+    for target in sorted(candidates, key=candidates.get, reverse=True):
+        if len(related) >= limit:
+            break
+        document, _, number = target.rpartition("::")
+        doc = bundle.index.lookup(document, number)
+        # Collapsed duplicates resolve to a chunk that may already be listed
+        if doc is not None and chunk_id(doc) not in present:
+            present.add(chunk_id(doc))
+            related.append(doc)
+    return docs + related
+
+
+def parent_numbers(number: str) -> List[str]:
+    """Ancestors of a requirement number, nearest first: 6.4.5.1 -> 6.4.5, 6.4, 6."""
+    parts = number.split(".")
+    return [".".join(parts[:i]) for i in range(len(parts) - 1, 0, -1)]
+
+
+# Chunk types matched by each kind of direct lookup; guidance has no chunks
+# of its own, so those lookups are not filtered by type.
+LOOKUP_TYPES = {
+    "requirement": ["requirement", "subrequirement"],
+    "testing": ["testing_procedure"],
+    "guidance": None,
+}
+
+
+# Enhanced requirement pattern matching with variations
+REQUIREMENT_PATTERNS = [
+    r"(?:requirement|req\.?|r)\s*[-:]?\s*(\d+(?:\.\d+){0,3}(?:\.[a-z]\b)?)",
+    r"(?:testing procedure|test|tp)\s*[-:]?\s*(\d+(?:\.\d+){0,3}(?:\.[a-z]\b)?)",
+    r"(?:guidance|guide|g)\s*[-:]?\s*(\d+(?:\.\d+){0,3})",
+]
+
+
+def requested_number(query: str) -> Tuple[Optional[str], Optional[str]]:
+    """The requirement number the current question names, and the lookup kind.
+
+    Only the current question counts; a number from an earlier turn must not
+    turn a new question into a lookup of that requirement.
+    """
+    for pattern in REQUIREMENT_PATTERNS:
+        match = re.search(pattern, current_question(query).lower())
+        if match:
+            req_type = (
+                "requirement"
+                if "req" in pattern
+                else "testing"
+                if "test" in pattern
+                else "guidance"
             )
+            return match.group(1), req_type
+    return None, None
+
+
+def _expand(docs: List[Document], bundle: IndexBundle) -> List[Document]:
+    """Add parent and graph-related chunks, as configured."""
+    if docs and RETRIEVER_EXPAND_PARENTS:
+        docs = expand_parents(docs, bundle)
+    if docs and RETRIEVER_EXPAND_RELATED and bundle.graph:
+        docs = expand_related(docs, bundle)
+    return docs
+
+
+def _find_docs(
+    query: str,
+    query_context: List[str],
+    bundle: IndexBundle,
+    embedding: Optional[List[float]] = None,
+) -> List[Document]:
+    """Direct requirement lookups by number, otherwise a semantic search.
+
+    Pass the query `embedding` when it is already known to skip re-embedding.
+    """
+    req_number, req_type = requested_number(query)
+
+    if req_number:
+        print(f"📌 Direct lookup for PCI {req_type.title()}: {req_number}")
+        # Hierarchical search strategy with page context
+        docs = []
+
+        # 1. Try exact number match, filtered to the matching chunk types.
+        # A bare number in a testing lookup means that item's procedures.
+        if req_type == "testing" and not re.search(r"\.[a-z]$", req_number):
+            search_filters = {"parent_requirement": req_number}
+        else:
+            search_filters = {"number": req_number}
+        if LOOKUP_TYPES[req_type]:
+            search_filters["type"] = LOOKUP_TYPES[req_type]
+
+        docs = retrieve(
+            query, filter=search_filters, bundle=bundle, embedding=embedding
+        )
 
-            # 2. If no exact match, try parent requirement
-            if not docs and "." in req_number:
-                parent_req = req_number.split(".")[0]
+        # 2. If no exact match, walk up to the nearest parent that exists
+        if not docs:
+            for parent_req in parent_numbers(req_number):
                 print(f"ℹ️ Checking parent requirement: {parent_req}")
-                docs = vector_store.similarity_search(
+                docs = retrieve(
                     query,
-                    k=RETRIEVER_K,
                     filter={"number": parent_req},
-                    search_type="similarity",
+                    bundle=bundle,
+                    embedding=embedding,
                 )
+                if docs:
+                    break
 
-            # 3. Try related sections (testing procedures, guidance)
-            if not docs:
-                print("ℹ️ Checking related sections")
-                enhanced_query = f"""
-                PCI DSS requirement {req_number}
-                Include:
-                - Main requirement text
-                - Testing procedures
-                - Implementation guidance
-                - Applicability notes
-                Query: {query}
-                """
-                docs = retriever.invoke(enhanced_query)
-        else:
-            print("🔍 Performing semantic search with context enhancement")
-            # Enhanced semantic search with context
-            docs = retriever.invoke(enhanced_query)
-
+        # 3. Try related sections (testing procedures, guidance)
         if not docs:
-            # Enhanced fallback handling
-            fallback_responses = {
-                "cloud": """
+            print("ℹ️ Checking related sections")
+            docs = retrieve(
+                f"PCI DSS requirement {req_number}: {query}",
+                topics=query_context,
+                bundle=bundle,
+            )
+    else:
+        print("🔍 Performing semantic search with context enhancement")
+        # Enhanced semantic search with context
+        docs = retrieve(query, topics=query_context, bundle=bundle, embedding=embedding)
+
+    return _expand(docs, bundle)
+
+
+def format_context(docs: List[Document]) -> str:
+    """Deduplicated chunks with their citation and page context, for the prompt."""
+    # Deduplicate and organize documents with page context
+    seen_content = set()
+    organized_docs = []
+
+    for doc in docs:
+        content = doc.page_content.strip()
+        if content not in seen_content:
+            seen_content.add(content)
+
+            # Extract metadata with page context
+            metadata = doc.metadata
+            doc_type = metadata.get("type", "Section")
+            doc_number = ", ".join(metadata_values(metadata, "number")) or "N/A"
+            doc_standard = metadata.get("standard", "PCI DSS")
+            doc_version = metadata.get("version", "N/A")
+            doc_page = (
+                ", ".join(str(page) for page in metadata_values(metadata, "page"))
+                or "N/A"
+            )
+            doc_section = metadata.get("section", "")
+
+            # Determine content type for better organization
+            content_type = "🔑 Requirement"
+            if "test" in doc_type.lower():
+                content_type = "🔍 Testing Procedure"
+            elif "guide" in doc_type.lower():
+                content_type = "📋 Implementation Guidance"
+            elif "note" in doc_type.lower():
+                content_type = "�� Applicability Note"
+
+            # Format with detailed citation and page context
+            formatted_doc = (
+                f"📄 [{doc_type} {doc_number}] ({doc_standard} v{doc_version}, Page {doc_page})\n"
+                f"{content_type}:\n"
+                f"Section: {doc_section}\n"
+                f"{content}"
+            )
+            organized_docs.append(formatted_doc)
+
+    # Organize documents by type and relevance
+    return "\n\n" + "=" * 50 + "\n\n".join(organized_docs)
+
+
+def _answer_from_docs(
+    query: str, docs: List[Document], query_context: List[str]
+) -> str:
+    """Cite the retrieved chunks in a Gemini answer, or fall back to guidance."""
+    if not docs:
+        # Enhanced fallback handling
+        fallback_responses = {
+            "cloud": """
                 While specific PCI DSS context is not available, here are important cloud security considerations:
                 1. Data Classification and Storage
                    - Identify and classify sensitive data
@@ -213,7 +440,7 @@ def rag_retrieval(query: str) -> str:
                    - Incident response planning
                    - Security monitoring and alerting
                 """,
-                "storage": """
+            "storage": """
                 General best practices for secure data storage:
                 1. Data Protection
                    - Encryption at rest and in transit
@@ -230,15 +457,15 @@ def rag_retrieval(query: str) -> str:
                    - Policy enforcement
                    - Documentation maintenance
                 """,
-                # Add more fallback responses for other contexts
-            }
+            # Add more fallback responses for other contexts
+        }
 
-            # Return relevant fallback response or general guidance
-            for context in query_context:
-                if context in fallback_responses:
-                    return fallback_responses[context]
+        # Return relevant fallback response or general guidance
+        for context in query_context:
+            if context in fallback_responses:
+                return fallback_responses[context]
 
-            return """
+        return """
             While specific PCI DSS guidance is not available, here are general security best practices:
             1. Risk Assessment
                - Identify potential threats
@@ -258,92 +485,196 @@ def rag_retrieval(query: str) -> str:
             Please consult with a qualified security assessor for specific compliance requirements.
             """
 
-        # Deduplicate and organize documents with page context
-        seen_content = set()
-        organized_docs = []
-
-        for doc in docs:
-            content = doc.page_content.strip()
-            if content not in seen_content:
-                seen_content.add(content)
-
-                # Extract metadata with page context
-                metadata = doc.metadata
-                doc_type = metadata.get("type", "Section")
-                doc_number = metadata.get("number", "N/A")
-                doc_version = metadata.get("version", "N/A")
-                doc_page = metadata.get("page", "N/A")
-                doc_section = metadata.get("section", "")
-
-                # Determine content type for better organization
-                content_type = "🔑 Requirement"
-                if "test" in doc_type.lower():
-                    content_type = "🔍 Testing Procedure"
-                elif "guide" in doc_type.lower():
-                    content_type = "📋 Implementation Guidance"
-                elif "note" in doc_type.lower():
-                    content_type = "�� Applicability Note"
-
-                # Format with detailed citation and page context
-                formatted_doc = (
-                    f"📄 [{doc_type} {doc_number}] (PCI DSS v{doc_version}, Page {doc_page})\n"
-                    f"{content_type}:\n"
-                    f"Section: {doc_section}\n"
-                    f"{content}"
-                )
-                organized_docs.append(formatted_doc)
-
-        # Organize documents by type and relevance
-        context = "\n\n" + "=" * 50 + "\n\n".join(organized_docs)
-
-        # Enhanced prompt for more precise responses with page context
-        prompt = f"""You are Dexter.ai, a precise security compliance assistant specializing in PCI DSS standards. Analyze the following information:
-
-QUERY: "{query}"
-
-RETRIEVED INFORMATION:
-{context}
-
-Response Guidelines:
-1. 📌 Exact Citations
-   - Quote requirements verbatim with version, page numbers, and section references
-   - Format citations as: "According to PCI DSS v[version] requirement [X.Y.Z] (Page [N])"
-   - Include relevant testing procedures and guidance
-
-2. 🔍 Hierarchical Information
-   - Present main requirements first
-   - Follow with specific sub-requirements
-   - Include associated testing procedures
-   - Add implementation guidance and notes
-   - Reference page numbers for each section
-
-3. 💡 Practical Application
-   - Explain technical terms in [brackets]
-   - Provide step-by-step implementation guidance
-   - List prerequisites and dependencies
-   - Cross-reference related requirements
-   - Include page references for detailed procedures
-
-4. ⚠️ Scope and Context
-   - Specify the exact scope of each requirement
-   - Note any conditions or exceptions
-   - Highlight related requirements
-   - Reference specific sections for more details
-   - Include page numbers for further reading
-
-Format your response to:
-1. Maintain exact PCI DSS language with proper citations
-2. Include page numbers for all references
-3. Organize information hierarchically
-4. Cross-reference related requirements
-5. Provide clear implementation guidance"""
-
-        response = model.generate_content(prompt)
-        return (
-            response.text.strip()
-            if response.text.strip()
-            else "🤖 I need to think about this differently. Could you rephrase your question?"
+    context = format_context(docs)
+    try:
+        # The earlier turns only steer retrieval; the model answers the question
+        response = prompt_model("rag").generate_content(
+            query_payload(current_question(query), context)
+        )
+    except UpstreamUnavailable as e:
+        print(f"⚠️ Serving retrieved context only: {str(e)}")
+        return degraded_answer(context)
+    return (
+        response.text.strip()
+        if response.text.strip()
+        else "🤖 I need to think about this differently. Could you rephrase your question?"
+    )
+
+
+def chunk_id(doc: Document) -> str:
+    """Stable id of a chunk across turns: its document and number."""
+    return answer_key(doc.metadata.get("document", ""), doc.metadata.get("number", ""))
+
+
+def _reused_docs(doc_ids: List[str], bundle: IndexBundle) -> List[Document]:
+    """Fetch the previous turn's chunks from the serving index, by id."""
+    docs = []
+    for doc_id in doc_ids:
+        document, _, number = doc_id.rpartition("::")
+        doc = bundle.index.lookup(document, number)
+        if doc is not None:
+            docs.append(doc)
+    return docs
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    if len(a) != len(b):
+        # Embedded by the model of an index version since replaced
+        return 0.0
+    a, b = np.asarray(a, dtype="float32"), np.asarray(b, dtype="float32")
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norm if norm else 0.0
+
+
+def _with_delta(previous: List[Document], delta: List[Document]) -> List[Document]:
+    """Previous chunks plus new ones, keeping the list within RETRIEVER_MAX_K."""
+    seen = {chunk_id(doc) for doc in previous}
+    delta = [doc for doc in delta if chunk_id(doc) not in seen][:RETRIEVER_MAX_K]
+    return previous[: max(0, RETRIEVER_MAX_K - len(delta))] + delta
+
+
+def retrieve_for_turn(
+    query: str,
+    query_context: List[str],
+    bundle: IndexBundle,
+    last_doc_ids: Optional[List[str]] = None,
+    last_query_vector: Optional[List[float]] = None,
+):
+    """Retrieve for one turn of a thread, reusing the previous turn's chunks.
+
+    Returns (docs, query embedding or None, how the chunks were found).
+    An anaphoric follow-up ("what about its testing procedures?") keeps the
+    previous chunks and adds their children of the asked-for types without
+    embedding at all. A query whose embedding is within FOLLOWUP_SIMILARITY
+    of the previous one keeps the previous chunks and runs a small delta
+    search for FOLLOWUP_DELTA_K chunks it did not have, expanded like a
+    fresh retrieval's. A question naming a requirement number the previous
+    chunks do not cover, and anything else, is a fresh retrieval.
+    """
+    question = current_question(query)
+    previous = _reused_docs(last_doc_ids or [], bundle) if FOLLOWUP_REUSE else []
+    number, _ = requested_number(question)
+    covered = {
+        alias for doc in previous for alias in metadata_values(doc.metadata, "number")
+    }
+    if number and number not in covered:
+        # A newly named requirement is looked up, however similar the wording
+        previous = []
+
+    if previous and is_followup(question):
+        types = followup_types(question)
+        delta = []
+        if types:
+            for doc in previous:
+                for number in metadata_values(doc.metadata, "number"):
+                    delta.extend(
+                        child
+                        for child in bundle.index.children(
+                            doc.metadata.get("document"), number
+                        )
+                        if child.metadata.get("type") in types
+                    )
+        print(f"♻️ Reusing {len(previous)} chunk(s) from the previous turn")
+        return _with_delta(previous, delta), None, "followup"
+
+    embedding = query_embeddings(bundle).embed_query(query)
+    if (
+        previous
+        and last_query_vector
+        and _cosine(embedding, last_query_vector) >= FOLLOWUP_SIMILARITY
+    ):
+        known = {chunk_id(doc) for doc in previous}
+        candidates = _search_embeddings(
+            bundle,
+            [embedding],
+            [query_context],
+            max_k=FOLLOWUP_DELTA_K + len(known),
+        )[0]
+        delta = [doc for doc in candidates if chunk_id(doc) not in known]
+        # Expanded as in _find_docs, so the chunks do not depend on the path
+        delta = [
+            doc
+            for doc in _expand(delta[:FOLLOWUP_DELTA_K], bundle)
+            if chunk_id(doc) not in known
+        ]
+        print(
+            f"♻️ Reusing {len(previous)} chunk(s) from the previous turn "
+            f"with {len(delta)} new"
+        )
+        return _with_delta(previous, delta), embedding, "delta"
+
+    return _find_docs(query, query_context, bundle, embedding), embedding, "fresh"
+
+
+def contextual_retrieval(
+    query: str,
+    last_doc_ids: Optional[List[str]] = None,
+    last_query_vector: Optional[List[float]] = None,
+) -> Dict:
+    """`rag_retrieval` for a conversation turn, with what the next turn reuses.
+
+    Returns the answer context plus the chunk ids and query vector to keep
+    in thread state, and which path served the turn ("materialized",
+    "followup", "delta" or "fresh").
+    """
+    result = {
+        "context": None,
+        "doc_ids": list(last_doc_ids or []),
+        "query_vector": last_query_vector,
+        "reuse": "fresh",
+    }
+    try:
+        bundle = serving_bundle()
+        if not bundle:
+            result["context"] = (
+                "⚠️ Error: Vector store not initialized. Please run setup_index.py first."
+            )
+            return result
+
+        materialized = lookup_materialized(query, bundle)
+        if materialized:
+            result["context"] = materialized
+            result["doc_ids"] = materialized_doc_ids(query, bundle)
+            result["reuse"] = "materialized"
+            return result
+
+        query_context = detect_topics(query)
+        docs, embedding, reuse = retrieve_for_turn(
+            query, query_context, bundle, last_doc_ids, last_query_vector
+        )
+        result["context"] = _answer_from_docs(query, docs, query_context)
+        result["doc_ids"] = [chunk_id(doc) for doc in docs]
+        if embedding is not None:
+            result["query_vector"] = [float(value) for value in embedding]
+        result["reuse"] = reuse
+        return result
+
+    except Exception as e:
+        print(f"🚨 Error details: {str(e)}")  # Debug logging
+        result["context"] = (
+            "⚠️ I encountered an error processing your query. "
+            "Please try again or rephrase your question."
         )
+        return result
+
+
+@tool
+def rag_retrieval(query: str) -> str:
+    """Process a query about security standards using RAG."""
+    try:
+        # Snapshot the serving index so a hot swap cannot change it mid-request
+        bundle = serving_bundle()
+        if not bundle:
+            return "⚠️ Error: Vector store not initialized. Please run setup_index.py first."
+
+        materialized = lookup_materialized(query, bundle)
+        if materialized:
+            return materialized
+
+        # Determine query context; topics boost the query vector, not its text
+        query_context = detect_topics(query)
+        docs = _find_docs(query, query_context, bundle)
+        return _answer_from_docs(query, docs, query_context)
 
     except Exception as e:
         print(f"🚨 Error details: {str(e)}")  # Debug logging
@@ -0,0 +1,201 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from config import REQUIREMENT_GRAPH_MIN_SIMILARITY, REQUIREMENT_GRAPH_NEIGHBORS
+from core.answers import answer_key
+from core.dedup import metadata_values
+from core.shards import ShardedIndex, shard_entries
+
+GRAPH_FILE = "requirement_graph.json"
+
+# Edge weights by kind; embedding-neighbour edges use their cosine similarity
+REFERENCE_WEIGHT = 1.0
+PARENT_WEIGHT = 0.95
+CHILD_WEIGHT = 0.9
+
+REQUIREMENT_NUMBER = r"\d{1,2}(?:\.\d{1,2}){0,3}"
+# "see Requirement 3.5.1", "Requirements 10.2 and 10.3", "(refer to req. 8.4)";
+# section headings such as "Requirement 6: Develop and Maintain..." are not
+# references, and the numbering already links chunks to their section.
+REFERENCE_PATTERN = re.compile(
+    rf"\b(?:requirements?|req\.?)\s+({REQUIREMENT_NUMBER}"
+    rf"(?:\s*(?:,|and|or|through|to|-)\s*{REQUIREMENT_NUMBER})*)\b(?![.\d]*\s*:)",
+    re.IGNORECASE,
+)
+
+# key -> [(related key, kind, weight)], strongest first
+RequirementGraph = Dict[str, List[Tuple[str, str, float]]]
+
+
+RANGE_TOKENS = re.compile(rf"({REQUIREMENT_NUMBER})|through|to|-", re.IGNORECASE)
+
+
+def _number_range(start: str, end: str) -> List[str]:
+    """Siblings from start to end: 6.5.1 through 6.5.4 -> 6.5.1 ... 6.5.4."""
+    head, _, first = start.rpartition(".")
+    end_head, _, last = end.rpartition(".")
+    if head != end_head or not 0 < int(last) - int(first) <= 20:
+        return [start, end]
+    prefix = f"{head}." if head else ""
+    return [f"{prefix}{i}" for i in range(int(first), int(last) + 1)]
+
+
+def referenced_numbers(text: str) -> List[str]:
+    """Requirement numbers a chunk refers to explicitly, in order of mention."""
+    numbers = []
+    for match in REFERENCE_PATTERN.finditer(text):
+        found: List[str] = []
+        in_range = False
+        for token in RANGE_TOKENS.finditer(match.group(1)):
+            if not token.group(1):
+                in_range = bool(found)
+            elif in_range:
+                found[-1:] = _number_range(found[-1], token.group(1))
+                in_range = False
+            else:
+                found.append(token.group(1))
+        numbers += [number for number in found if number not in numbers]
+    return numbers
+
+
+def _nearest_ancestor(number: str, known: set) -> Optional[str]:
+    parts = number.split(".")
+    for i in range(len(parts) - 1, 0, -1):
+        candidate = ".".join(parts[:i])
+        if candidate in known:
+            return candidate
+    return None
+
+
+def build_requirement_graph(
+    texts: List[str],
+    vectors,
+    metadatas: List[Dict],
+    neighbors: int = REQUIREMENT_GRAPH_NEIGHBORS,
+    min_similarity: float = REQUIREMENT_GRAPH_MIN_SIMILARITY,
+) -> RequirementGraph:
+    """Link requirements by explicit references, numbering and embeddings.
+
+    Nodes are (document, number) pairs, as used by chunk ids and
+    ShardedIndex.lookup. An explicit "see requirement X" links to X in the
+    same document; each number links to its nearest existing ancestor and
+    back; and each node links to up to `neighbors` other requirements whose
+    chunk embeddings have at least `min_similarity` cosine similarity.
+    """
+    # The first chunk of each (document, number) represents the node; numbers
+    # collapsed into another chunk as near-duplicates resolve to its node
+    first: Dict[str, int] = {}
+    canonical: Dict[str, str] = {}
+    for position, metadata in enumerate(metadatas):
+        number = metadata.get("number")
+        if number and number != "unknown":
+            document = metadata.get("document", "")
+            key = answer_key(document, number)
+            first.setdefault(key, position)
+            for alias in metadata_values(metadata, "number"):
+                canonical.setdefault(answer_key(document, alias), key)
+    keys = list(first)
+    canonical.update({key: key for key in keys})
+    numbers_by_document: Dict[str, set] = {}
+    for key in canonical:
+        document, number = key.rsplit("::", 1)
+        numbers_by_document.setdefault(document, set()).add(number)
+
+    edges: Dict[str, Dict[str, Tuple[str, float]]] = {key: {} for key in keys}
+
+    def link(source: str, target: str, kind: str, weight: float) -> None:
+        if source != target and weight > edges[source].get(target, ("", -1.0))[1]:
+            edges[source][target] = (kind, weight)
+
+    for position, metadata in enumerate(metadatas):
+        number = metadata.get("number")
+        document = metadata.get("document", "")
+        key = answer_key(document, number or "")
+        if key not in edges:
+            continue
+        known = numbers_by_document[document]
+        for referenced in referenced_numbers(texts[position]):
+            if referenced in known:
+                target = canonical[answer_key(document, referenced)]
+                link(key, target, "reference", REFERENCE_WEIGHT)
+
+    for key in keys:
+        document, number = key.rsplit("::", 1)
+        parent = _nearest_ancestor(number, numbers_by_document[document])
+        if parent:
+            parent = canonical[answer_key(document, parent)]
+            link(key, parent, "parent", PARENT_WEIGHT)
+            link(parent, key, "child", CHILD_WEIGHT)
+
+    if neighbors > 0 and len(keys) > 1:
+        matrix = np.ascontiguousarray(
+            np.asarray(vectors, dtype=np.float32)[[first[key] for key in keys]]
+        )
+        faiss.normalize_L2(matrix)
+        index = faiss.IndexFlatIP(matrix.shape[1])
+        index.add(matrix)
+        similarities, found = index.search(matrix, min(neighbors + 1, len(keys)))
+        for row, (scores, positions) in enumerate(zip(similarities, found)):
+            for score, position in zip(scores, positions):
+                if position >= 0 and position != row and score >= min_similarity:
+                    link(keys[row], keys[position], "neighbor", round(float(score), 4))
+
+    return {
+        key: sorted(
+            ((target, kind, weight) for target, (kind, weight) in related.items()),
+            key=lambda edge: edge[2],
+            reverse=True,
+        )
+        for key, related in edges.items()
+        if related
+    }
+
+
+def build_graph_for_index(index_path: str, embedding_model) -> RequirementGraph:
+    """Build the graph from the chunks and stored vectors of a saved index."""
+    index = ShardedIndex.load(index_path, embedding_model, rescore=True)
+    texts: List[str] = []
+    vectors = []
+    metadatas: List[Dict] = []
+    for name, store in index.shards.items():
+        shard_texts, shard_vectors, shard_metadatas = shard_entries(
+            store, index.exact_vectors.get(name)
+        )
+        texts += shard_texts
+        vectors.append(shard_vectors)
+        metadatas += shard_metadatas
+    if not texts:
+        return {}
+    return build_requirement_graph(texts, np.concatenate(vectors), metadatas)
+
+
+def save_requirement_graph(index_path: str, graph: RequirementGraph) -> None:
+    with open(os.path.join(index_path, GRAPH_FILE), "w", encoding="utf-8") as f:
+        json.dump(graph, f, ensure_ascii=False)
+
+
+def load_requirement_graph(index_path: Optional[str]) -> RequirementGraph:
+    """Load the graph saved with an index version, if any."""
+    if not index_path:
+        return {}
+    graph_path = os.path.join(index_path, GRAPH_FILE)
+    if not os.path.exists(graph_path):
+        return {}
+    with open(graph_path, encoding="utf-8") as f:
+        return {
+            key: [tuple(edge) for edge in related]
+            for key, related in json.load(f).items()
+        }
+
+
+def graph_stats(graph: RequirementGraph) -> Dict[str, int]:
+    """Node count and edge count per kind, for build logs."""
+    stats = {"nodes": len(graph)}
+    for related in graph.values():
+        for _, kind, _ in related:
+            stats[kind] = stats.get(kind, 0) + 1
+    return stats
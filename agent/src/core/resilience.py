@@ -0,0 +1,520 @@
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    EMBEDDING_MAX_CONCURRENCY,
+    LLM_CALL_DEADLINE,
+    LLM_HEDGE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_MAX_CONCURRENCY,
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+)
+from langchain_core.embeddings import Embeddings
+
+# HTTP statuses and exception names that indicate a transient upstream problem
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "RateLimitError",
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "TooManyRequests",
+}
+
+# Only hedged calls run here: a primary and at most one duplicate for each
+# call the schedulers admit. A losing call cannot be cancelled mid-request,
+# but its admission and client timeout end it by its deadline.
+_hedge_pool = ThreadPoolExecutor(
+    max_workers=2 * (LLM_MAX_CONCURRENCY + EMBEDDING_MAX_CONCURRENCY),
+    thread_name_prefix="hedge",
+)
+
+# Monotonic time by which the current request's upstream calls must finish;
+# set with `deadline(...)`
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "upstream_deadline", default=None
+)
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised when retries are exhausted or the circuit breaker is open.
+
+    Callers catch this to fall back to a degraded, no-LLM answer.
+    """
+
+
+DEGRADED_NOTICE = (
+    "⚠️ The language model is temporarily unavailable, so here are the most "
+    "relevant PCI DSS excerpts without a written explanation."
+)
+
+
+class BudgetExceeded(UpstreamUnavailable):
+    """Raised instead of calling upstream once the request's budget is spent."""
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Bound every upstream call inside the block to `seconds` from now.
+
+    Nested blocks can only shorten an enclosing deadline. Retries stop when
+    it passes, and calls started after it raise BudgetExceeded.
+    """
+    until = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(until if current is None else min(current, until))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    until = _deadline.get()
+    return None if until is None else until - time.monotonic()
+
+
+def degraded_answer(context: str) -> str:
+    """Answer built from retrieved context alone, for when the LLM is down."""
+    if not context.strip():
+        return (
+            "⚠️ The language model is temporarily unavailable. "
+            "Please try again in a moment."
+        )
+    return f"{DEGRADED_NOTICE}\n{context}"
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = LLM_RETRY_BASE_DELAY,
+    cap: float = LLM_RETRY_MAX_DELAY,
+) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^n)]."""
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, used to time hedges."""
+
+    def __init__(self, window: int = 200, min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[math.ceil(fraction * len(ordered)) - 1]
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, then probe for recovery.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected for `reset_seconds`; then one trial call is let through and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = "half_open"
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != "closed":
+                print(f"✅ Circuit '{self.name}' closed")
+            self.state = "closed"
+
+    def release_trial(self) -> None:
+        """End a call that says nothing about upstream, e.g. out of budget.
+
+        Neither outcome is recorded; a half-open circuit lets the next call
+        probe instead of waiting for a trial that will never report.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(
+                        f"⚠️ Circuit '{self.name}' opened after {self._failures} failures"
+                    )
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Retries, hedging and circuit breaking around one upstream API.
+
+    Each call gets `deadline` seconds in total, or less when the request's
+    budget (see `deadline()`) ends sooner. Transient errors are retried
+    with jittered exponential backoff while time remains. Once the tracker
+    has enough samples, a duplicate request is fired if the first has not
+    answered within the observed p95 latency, and the first result wins.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        attempts: int = LLM_RETRY_ATTEMPTS,
+        deadline: float = LLM_CALL_DEADLINE,
+        hedge: bool = LLM_HEDGE,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.attempts = max(1, attempts)
+        self.deadline = deadline
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self.stats: Dict[str, int] = {
+            "calls": 0,
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "rejected": 0,
+            "failures": 0,
+            "out_of_budget": 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    def _count(self, counter: str) -> None:
+        # Calls run on many threads at once; `+=` on a dict item is not atomic
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _call_deadline(self) -> float:
+        """This call's deadline, shortened to the request's remaining budget."""
+        budget = remaining_budget()
+        if budget is None:
+            return self.deadline
+        if budget <= 0:
+            self._count("out_of_budget")
+            raise BudgetExceeded(f"{self.name} call skipped: request budget spent")
+        return min(self.deadline, budget)
+
+    def _check_budget(self, error: BaseException) -> None:
+        """Blame a timeout on the request budget, not upstream, once it is spent."""
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            self._count("out_of_budget")
+            self.breaker.release_trial()
+            raise BudgetExceeded(
+                f"{self.name} call ran past the request budget"
+            ) from error
+
+    def _hedge_delay(self, remaining: float) -> Optional[float]:
+        if not self.hedge:
+            return None
+        p95 = self.latency.percentile(0.95)
+        # Only hedge when a duplicate could still finish before the deadline
+        if p95 is None or remaining < 2 * p95:
+            return None
+        return p95
+
+    def _timed(self, fn: Callable, *args, **kwargs) -> Any:
+        started = time.monotonic()
+        result = fn(*args, **kwargs)
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    def _attempt(self, fn: Callable, args, kwargs, remaining: float) -> Any:
+        # The scheduler admission and the client request both time out by
+        # this attempt's deadline, so an unhedged call can run inline
+        with deadline(remaining):
+            delay = self._hedge_delay(remaining)
+            if delay is None:
+                return self._timed(fn, *args, **kwargs)
+            return self._hedged(fn, args, kwargs, remaining, delay)
+
+    def _hedged(
+        self, fn: Callable, args, kwargs, remaining: float, delay: float
+    ) -> Any:
+        # Copy the context so hedged calls keep their priority and deadline
+        primary = _hedge_pool.submit(
+            contextvars.copy_context().run, self._timed, fn, *args, **kwargs
+        )
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedge = _hedge_pool.submit(
+            contextvars.copy_context().run, self._timed, fn, *args, **kwargs
+        )
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=max(0.0, remaining - delay),
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                raise TimeoutError(f"{self.name} call exceeded its deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        self._count("calls")
+        call_deadline = self._call_deadline()
+        started = time.monotonic()
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.attempts):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise UpstreamUnavailable(f"{self.name} circuit is open")
+            remaining = call_deadline - (time.monotonic() - started)
+            try:
+                result = self._attempt(fn, args, kwargs, remaining)
+            except BudgetExceeded:
+                # The request ran out of time; that says nothing about upstream
+                self._count("out_of_budget")
+                self.breaker.release_trial()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered, just not usefully for this input
+                    self.breaker.record_success()
+                    raise
+                self._check_budget(e)
+                self.breaker.record_failure()
+                last_error = e
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+            pause = backoff_delay(attempt)
+            if attempt + 1 >= self.attempts or (
+                time.monotonic() - started + pause >= call_deadline
+            ):
+                break
+            self._count("retries")
+            time.sleep(pause)
+
+        self._count("failures")
+        raise UpstreamUnavailable(
+            f"{self.name} failed after retries: {last_error}"
+        ) from last_error
+
+    async def acall(self, fn: Callable, *args, **kwargs) -> Any:
+        """Async variant of `call`; hedges race as tasks on the running loop."""
+        self._count("calls")
+        call_deadline = self._call_deadline()
+        started = time.monotonic()
+        last_error: Optional[BaseException] = None
+
+        async def timed() -> Any:
+            call_started = time.monotonic()
+            result = await fn(*args, **kwargs)
+            self.latency.record(time.monotonic() - call_started)
+            return result
+
+        for attempt in range(self.attempts):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise UpstreamUnavailable(f"{self.name} circuit is open")
+            remaining = call_deadline - (time.monotonic() - started)
+            delay = self._hedge_delay(remaining)
+            # Tasks copy the context, so admission and the client time out
+            # by this attempt's deadline
+            with deadline(remaining):
+                tasks: List[asyncio.Task] = [asyncio.ensure_future(timed())]
+            budgeted = delay is None and remaining_budget() is not None
+            try:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(0.0, remaining) if budgeted else delay
+                )
+                if not done and budgeted:
+                    raise BudgetExceeded(
+                        f"{self.name} call ran past the request budget"
+                    )
+                if not done:
+                    self._count("hedges")
+                    with deadline(remaining - delay):
+                        tasks.append(asyncio.ensure_future(timed()))
+                    done, _ = await asyncio.wait(
+                        tasks,
+                        timeout=max(0.0, remaining - (delay or 0)),
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    if not done:
+                        raise TimeoutError(f"{self.name} call exceeded its deadline")
+                winner = next(iter(done))
+                result = winner.result()
+                if winner is not tasks[0]:
+                    self._count("hedge_wins")
+            except BudgetExceeded:
+                self._count("out_of_budget")
+                self.breaker.release_trial()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered, just not usefully for this input
+                    self.breaker.record_success()
+                    raise
+                self._check_budget(e)
+                self.breaker.record_failure()
+                last_error = e
+            except BaseException:
+                # Cancelled, e.g. by a caller's timeout
+                self.breaker.release_trial()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # Losing hedges and budget overruns may still be waiting for
+                # a scheduler slot; cancelling them there gives the slot back
+                for task in tasks:
+                    task.cancel()
+
+            pause = backoff_delay(attempt)
+            if attempt + 1 >= self.attempts or (
+                time.monotonic() - started + pause >= call_deadline
+            ):
+                break
+            self._count("retries")
+            await asyncio.sleep(pause)
+
+        self._count("failures")
+        raise UpstreamUnavailable(
+            f"{self.name} failed after retries: {last_error}"
+        ) from last_error
+
+
+# Shared per upstream API so every model built in the process trips together.
+# Document batches vary too much in size to hedge on a shared p95, so they
+# get their own caller that shares the embedding circuit breaker.
+llm_caller = ResilientCaller("generation")
+embedding_caller = ResilientCaller("embedding")
+embedding_batch_caller = ResilientCaller(
+    "embedding-batch", hedge=False, breaker=embedding_caller.breaker
+)
+
+
+def resilience_stats() -> Dict[str, Dict]:
+    return {
+        caller.name: {**caller.snapshot(), "circuit": caller.breaker.state}
+        for caller in (llm_caller, embedding_caller, embedding_batch_caller)
+    }
+
+
+class ResilientModel:
+    """Generative model wrapper adding retries, hedging and circuit breaking."""
+
+    def __init__(self, model, caller: ResilientCaller = llm_caller):
+        self.model = model
+        self.caller = caller
+
+    def __getattr__(self, name: str):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def generate_content(self, prompt, **kwargs):
+        return self.caller.call(self.model.generate_content, prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        return await self.caller.acall(
+            self.model.generate_content_async, prompt, **kwargs
+        )
+
+
+class ResilientEmbeddings(Embeddings):
+    """Embeddings wrapper adding retries, hedging and circuit breaking."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        caller: ResilientCaller = embedding_caller,
+        batch_caller: ResilientCaller = embedding_batch_caller,
+    ):
+        self.embeddings = embeddings
+        self.caller = caller
+        self.batch_caller = batch_caller
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.caller.call(self.embeddings.embed_query, text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.batch_caller.call(self.embeddings.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.caller.acall(self.embeddings.aembed_query, text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.batch_caller.acall(self.embeddings.aembed_documents, texts)
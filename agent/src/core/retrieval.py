@@ -0,0 +1,203 @@
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from config import (
+    RETRIEVER_MAX_K,
+    RETRIEVER_MIN_K,
+    RETRIEVER_RELATIVE_GAP,
+    RETRIEVER_SCORE_THRESHOLD,
+)
+from core.dedup import MERGED_FIELDS
+from core.quantization import rescore, rescore_fetch_k
+from core.shared_index import stored_metadata
+from langchain_core.documents import Document
+
+
+def distance_to_similarity(distance: float) -> float:
+    """Convert a squared L2 distance between unit vectors into cosine similarity."""
+    return 1.0 - float(distance) / 2.0
+
+
+def select_adaptive(
+    scored: List[Tuple[Document, float]],
+    min_k: int = RETRIEVER_MIN_K,
+    max_k: int = RETRIEVER_MAX_K,
+    threshold: float = RETRIEVER_SCORE_THRESHOLD,
+    relative_gap: float = RETRIEVER_RELATIVE_GAP,
+) -> List[Tuple[Document, float]]:
+    """Cut a scored candidate list by absolute threshold and gap from the top hit.
+
+    Candidates are kept while their similarity is at least `threshold` and no
+    more than `relative_gap` below the best match, bounded by min_k/max_k.
+    """
+    ranked = sorted(scored, key=lambda pair: pair[1], reverse=True)[:max_k]
+    if not ranked:
+        return []
+
+    top_score = ranked[0][1]
+    selected = []
+    for doc, score in ranked:
+        if score < threshold or top_score - score > relative_gap:
+            break
+        selected.append((doc, score))
+
+    if len(selected) < min_k:
+        selected = ranked[:min_k]
+    return selected
+
+
+def matches_filter(metadata: Dict, filter: Optional[Dict]) -> bool:
+    """Check document metadata against an equality filter (lists mean "any of")."""
+    if not filter:
+        return True
+    for key, value in filter.items():
+        # A collapsed chunk also answers for its duplicates' numbers and pages
+        if MERGED_FIELDS.get(key) in metadata:
+            found = metadata[MERGED_FIELDS[key]]
+        else:
+            found = [metadata.get(key)]
+        if isinstance(value, (list, tuple, set)):
+            if not any(item in value for item in found):
+                return False
+        elif value not in found:
+            return False
+    return True
+
+
+def filtered_positions(vector_store, filter: Dict) -> np.ndarray:
+    """Index positions of every stored document whose metadata matches the filter."""
+    return np.asarray(
+        [
+            position
+            for position, doc_id in vector_store.index_to_docstore_id.items()
+            if matches_filter(stored_metadata(vector_store.docstore, doc_id), filter)
+        ],
+        dtype=np.int64,
+    )
+
+
+def _search_index(
+    index,
+    matrix: np.ndarray,
+    k: int,
+    exact_vectors: Optional[np.ndarray],
+    limit: int,
+    params=None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Run one FAISS search, over-fetching and re-scoring for quantized indexes."""
+    fetch_k = k if exact_vectors is None else rescore_fetch_k(k)
+    distances, indices = index.search(matrix, min(fetch_k, limit), params=params)
+    if exact_vectors is not None:
+        distances, indices = rescore(matrix, indices, exact_vectors)
+    return distances, indices
+
+
+def _search_subset(
+    index,
+    matrix: np.ndarray,
+    positions: np.ndarray,
+    k: int,
+    exact_vectors: Optional[np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force the given positions, for indexes without ID selector support."""
+    vectors = (
+        np.asarray(exact_vectors[positions], dtype=np.float32)
+        if exact_vectors is not None
+        else index.reconstruct_batch(positions)
+    )
+    distances = ((matrix[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    order = np.argsort(distances, axis=1)[:, :k]
+    return np.take_along_axis(distances, order, axis=1), positions[order]
+
+
+def search_by_vectors(
+    vector_store,
+    embeddings: List[List[float]],
+    k: int = RETRIEVER_MAX_K,
+    filter: Optional[Dict] = None,
+    exact_vectors: Optional[np.ndarray] = None,
+) -> List[List[Tuple[Document, float]]]:
+    """Search many query embeddings with a single matrix `index.search` call.
+
+    Returns one list of (document, cosine similarity) pairs per embedding, in
+    the same order. Filtered searches restrict FAISS to the matching positions
+    with an ID selector, so exact lookups such as {"number": "6.4.1"} are found
+    however far they rank overall. When `exact_vectors` is given (quantized
+    indexes), extra candidates are fetched and re-scored with full-precision
+    distances.
+    """
+    index = vector_store.index
+    if not embeddings or index.ntotal == 0:
+        return [[] for _ in embeddings]
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if not filter:
+        distances, indices = _search_index(
+            index, matrix, k, exact_vectors, index.ntotal
+        )
+    else:
+        positions = filtered_positions(vector_store, filter)
+        if not len(positions):
+            return [[] for _ in embeddings]
+        if isinstance(index, faiss.IndexPQ):
+            # IndexPQ rejects search parameters; matching subsets are small
+            distances, indices = _search_subset(
+                index, matrix, positions, k, exact_vectors
+            )
+        else:
+            distances, indices = _search_index(
+                index,
+                matrix,
+                k,
+                exact_vectors,
+                len(positions),
+                params=faiss.SearchParameters(sel=faiss.IDSelectorBatch(positions)),
+            )
+
+    results = []
+    for row_distances, row_indices in zip(distances, indices):
+        row = []
+        for distance, position in zip(row_distances, row_indices):
+            if position == -1:
+                continue
+            doc_id = vector_store.index_to_docstore_id[position]
+            doc = vector_store.docstore.search(doc_id)
+            if not isinstance(doc, Document) or not matches_filter(
+                doc.metadata, filter
+            ):
+                continue
+            row.append((doc, distance_to_similarity(distance)))
+            if len(row) >= k:
+                break
+        results.append(row)
+    return results
+
+
+def adaptive_batch_search(
+    index,
+    embeddings: List[List[float]],
+    filter: Optional[Dict] = None,
+    shards: Optional[List[str]] = None,
+    min_k: int = RETRIEVER_MIN_K,
+    max_k: int = RETRIEVER_MAX_K,
+) -> List[List[Tuple[Document, float]]]:
+    """Batch search a sharded index and cut each result list adaptively."""
+    return [
+        select_adaptive(scored, min_k=min_k, max_k=max_k)
+        for scored in index.search(embeddings, k=max_k, filter=filter, shards=shards)
+    ]
+
+
+def adaptive_search_by_vector(
+    index,
+    embedding: List[float],
+    filter: Optional[Dict] = None,
+    shards: Optional[List[str]] = None,
+    min_k: int = RETRIEVER_MIN_K,
+    max_k: int = RETRIEVER_MAX_K,
+) -> List[Tuple[Document, float]]:
+    """Fetch max_k scored candidates for an embedding and cut them adaptively."""
+    return adaptive_batch_search(
+        index, [embedding], filter=filter, shards=shards, min_k=min_k, max_k=max_k
+    )[0]
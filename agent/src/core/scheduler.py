@@ -0,0 +1,339 @@
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from itertools import count
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from config import (
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    LLM_MAX_CONCURRENCY,
+    LLM_OUTPUT_TOKEN_ESTIMATE,
+    LLM_TOKENS_PER_MINUTE,
+)
+from core.resilience import BudgetExceeded, remaining_budget
+from langchain_core.embeddings import Embeddings
+
+# Lower value is served first: chat turns go ahead of batch tool generations
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Who the current upstream call is for; set with `scheduling(...)`
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "scheduler_priority", default="interactive"
+)
+_tenant: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "scheduler_tenant", default="default"
+)
+
+
+@contextmanager
+def scheduling(
+    priority: Optional[str] = None, tenant: Optional[str] = None
+) -> Iterator[None]:
+    """Tag upstream calls made inside the block with a priority and tenant.
+
+    The tenant is a thread or team id; waiting calls from different tenants
+    of the same priority are admitted in turn so one busy team cannot starve
+    the others. Thread pools do not inherit context, so enter this inside
+    the worker (or submit with `contextvars.copy_context().run`).
+    """
+    tokens = []
+    if priority is not None:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        tokens.append((_priority, _priority.set(priority)))
+    if tenant is not None:
+        tokens.append((_tenant, _tenant.set(tenant)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def _wait_summary(samples: deque) -> Dict[str, float]:
+    if not samples:
+        return {"mean_wait_ms": 0.0, "p95_wait_ms": 0.0}
+    ordered = sorted(samples)
+    return {
+        "mean_wait_ms": round(1000 * sum(ordered) / len(ordered), 1),
+        "p95_wait_ms": round(1000 * ordered[math.ceil(0.95 * len(ordered)) - 1], 1),
+    }
+
+
+class _Ticket:
+    def __init__(self, priority: str, tenant: str, cost: int, seq: int):
+        self.priority = priority
+        self.tenant = tenant
+        self.cost = cost
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        # Set when an async caller is cancelled while the ticket still waits
+        self.abandoned = False
+
+
+class UpstreamScheduler:
+    """Admission control for one upstream API: concurrency plus a token budget.
+
+    Calls wait until a slot is free and the token bucket (refilled at
+    tokens_per_minute / 60 per second) covers their estimated cost. Among
+    waiters, the highest priority is admitted first, then the tenant served
+    least recently, then arrival order.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, tokens_per_minute: int = 0):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = tokens_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._condition = threading.Condition()
+        self._waiting: List[_Ticket] = []
+        self._in_flight = 0
+        self._seq = count()
+        self._served = count()
+        self._last_served: Dict[str, int] = {}
+
+        # Metrics
+        self._admitted: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._waits: Dict[str, deque] = {
+            priority: deque(maxlen=1000) for priority in PRIORITIES
+        }
+        self._max_queue_depth = 0
+        self._tokens_admitted = 0
+
+    def _refill(self, now: float) -> None:
+        if self.tokens_per_minute > 0:
+            rate = self.tokens_per_minute / 60.0
+            self._tokens = min(
+                float(self.tokens_per_minute),
+                self._tokens + (now - self._refilled_at) * rate,
+            )
+        self._refilled_at = now
+
+    def _next_ticket(self) -> _Ticket:
+        return min(
+            self._waiting,
+            key=lambda ticket: (
+                PRIORITIES[ticket.priority],
+                self._last_served.get(ticket.tenant, -1),
+                ticket.seq,
+            ),
+        )
+
+    def _enqueue(self, cost: int) -> _Ticket:
+        ticket = _Ticket(_priority.get(), _tenant.get(), cost, next(self._seq))
+        if self.tokens_per_minute > 0:
+            # A call larger than the whole budget would otherwise never start
+            ticket.cost = min(cost, self.tokens_per_minute)
+        with self._condition:
+            self._waiting.append(ticket)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._waiting))
+        return ticket
+
+    def _admit(self, ticket: _Ticket) -> Optional[_Ticket]:
+        """Block until the ticket is admitted; None if it was abandoned first.
+
+        Raises BudgetExceeded if the caller's deadline passes while waiting.
+        """
+        with self._condition:
+            while True:
+                left = remaining_budget()
+                if ticket.abandoned or (left is not None and left <= 0):
+                    self._waiting.remove(ticket)
+                    self._condition.notify_all()
+                    if ticket.abandoned:
+                        return None
+                    raise BudgetExceeded(
+                        f"{self.name} admission timed out: request budget spent"
+                    )
+                now = time.monotonic()
+                self._refill(now)
+                timeout = left
+                if (
+                    self._next_ticket() is ticket
+                    and self._in_flight < self.max_concurrency
+                ):
+                    if self.tokens_per_minute <= 0 or self._tokens >= ticket.cost:
+                        break
+                    deficit = ticket.cost - self._tokens
+                    refill = deficit / (self.tokens_per_minute / 60.0)
+                    timeout = refill if left is None else min(left, refill)
+                self._condition.wait(timeout)
+
+            self._waiting.remove(ticket)
+            self._in_flight += 1
+            if self.tokens_per_minute > 0:
+                self._tokens -= ticket.cost
+            self._last_served[ticket.tenant] = next(self._served)
+            self._admitted[ticket.priority] += 1
+            self._waits[ticket.priority].append(now - ticket.enqueued_at)
+            self._tokens_admitted += ticket.cost
+            # The next waiter may be admissible as well
+            self._condition.notify_all()
+        return ticket
+
+    def acquire(self, cost: int = 1) -> _Ticket:
+        """Block until this call may go upstream; pair with `release`."""
+        return self._admit(self._enqueue(cost))
+
+    async def acquire_async(self, cost: int = 1) -> _Ticket:
+        """`acquire` for coroutines, safe to cancel while waiting.
+
+        The wait runs in a worker thread that a cancellation cannot stop, so
+        a cancelled caller abandons its ticket instead: it leaves the queue,
+        or, if it was admitted in the meantime, its slot is released.
+        """
+        ticket = self._enqueue(cost)
+        admission = asyncio.ensure_future(asyncio.to_thread(self._admit, ticket))
+        try:
+            return await asyncio.shield(admission)
+        except asyncio.CancelledError:
+            with self._condition:
+                ticket.abandoned = True
+                self._condition.notify_all()
+            admission.add_done_callback(self._release_if_admitted)
+            raise
+
+    def _release_if_admitted(self, admission: asyncio.Future) -> None:
+        if admission.cancelled() or admission.exception() is not None:
+            return
+        if admission.result() is not None:
+            self.release(admission.result())
+
+    def release(self, ticket: _Ticket) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, cost: int = 1) -> Iterator[None]:
+        ticket = self.acquire(cost)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, cost: int = 1) -> AsyncIterator[None]:
+        ticket = await self.acquire_async(cost)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def metrics(self) -> Dict:
+        """Queue depth, in-flight calls, admissions and wait times per priority."""
+        with self._condition:
+            waits = {
+                priority: {
+                    "admitted": self._admitted[priority],
+                    **_wait_summary(samples),
+                }
+                for priority, samples in self._waits.items()
+            }
+            return {
+                "queue_depth": len(self._waiting),
+                "max_queue_depth": self._max_queue_depth,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "tokens_per_minute": self.tokens_per_minute,
+                "tokens_admitted": self._tokens_admitted,
+                "priorities": waits,
+            }
+
+
+# One scheduler per upstream API, shared by every model built in the process
+llm_scheduler = UpstreamScheduler(
+    "generation", LLM_MAX_CONCURRENCY, LLM_TOKENS_PER_MINUTE
+)
+embedding_scheduler = UpstreamScheduler(
+    "embedding", EMBEDDING_MAX_CONCURRENCY, EMBEDDING_TOKENS_PER_MINUTE
+)
+
+
+def scheduler_metrics() -> Dict[str, Dict]:
+    return {
+        scheduler.name: scheduler.metrics()
+        for scheduler in (llm_scheduler, embedding_scheduler)
+    }
+
+
+class ScheduledModel:
+    """Generative model wrapper that admits every call through a scheduler."""
+
+    def __init__(
+        self,
+        model,
+        scheduler: UpstreamScheduler = llm_scheduler,
+        static_tokens: int = 0,
+    ):
+        self.model = model
+        self.scheduler = scheduler
+        # Tokens the model adds to every call, e.g. its system instruction
+        self.static_tokens = static_tokens
+
+    def __getattr__(self, name: str):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _cost(self, prompt) -> int:
+        return (
+            estimate_tokens(str(prompt))
+            + self.static_tokens
+            + LLM_OUTPUT_TOKEN_ESTIMATE
+        )
+
+    @staticmethod
+    def _bounded(kwargs: Dict) -> Dict:
+        """Give the client whatever is left of the caller's deadline."""
+        left = remaining_budget()
+        if left is None or "request_options" in kwargs:
+            return kwargs
+        return {**kwargs, "request_options": {"timeout": max(0.01, left)}}
+
+    def generate_content(self, prompt, **kwargs):
+        with self.scheduler.slot(self._cost(prompt)):
+            return self.model.generate_content(prompt, **self._bounded(kwargs))
+
+    async def generate_content_async(self, prompt, **kwargs):
+        async with self.scheduler.aslot(self._cost(prompt)):
+            return await self.model.generate_content_async(
+                prompt, **self._bounded(kwargs)
+            )
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Embeddings wrapper that admits every request through a scheduler."""
+
+    def __init__(
+        self, embeddings: Embeddings, scheduler: UpstreamScheduler = embedding_scheduler
+    ):
+        self.embeddings = embeddings
+        self.scheduler = scheduler
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.scheduler.slot(estimate_tokens(text)):
+            return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.scheduler.slot(sum(estimate_tokens(text) for text in texts)):
+            return self.embeddings.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async with self.scheduler.aslot(estimate_tokens(text)):
+            return await self.embeddings.aembed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        async with self.scheduler.aslot(sum(estimate_tokens(text) for text in texts)):
+            return await self.embeddings.aembed_documents(texts)
@@ -0,0 +1,429 @@
+import heapq
+import os
+import re
+import shutil
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from config import (
+    INDEX_HASH_SHARDS,
+    INDEX_QUANTIZATION,
+    INDEX_RESCORE,
+    INDEX_SHARD_STRATEGY,
+    INDEX_SHARED_MEMORY,
+    SHARD_SEARCH_WORKERS,
+)
+from core.dedup import metadata_values
+from core.quantization import (
+    index_bytes,
+    load_exact_vectors,
+    quantize_vectors,
+    save_exact_vectors,
+)
+from core.retrieval import search_by_vectors
+from core.shared_index import (
+    MappedDocstore,
+    export_shared_shard,
+    has_shared_files,
+    load_shared_shard,
+    stored_metadata,
+)
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+SHARDS_DIR = "shards"
+DEFAULT_SHARD = "default"
+
+# Shared by every loaded index so hot-reloaded versions do not leak threads
+_search_pool = ThreadPoolExecutor(
+    max_workers=SHARD_SEARCH_WORKERS, thread_name_prefix="shard-search"
+)
+
+
+def shard_name(standard: str, version: str) -> str:
+    """Slug used as the shard name for one standard version, e.g. pci-dss-v4.0."""
+    slug = re.sub(r"[^a-z0-9.]+", "-", f"{standard} v{version}".lower())
+    return slug.strip("-")
+
+
+def shard_key(
+    metadata: Dict,
+    strategy: str = INDEX_SHARD_STRATEGY,
+    hash_shards: int = INDEX_HASH_SHARDS,
+) -> str:
+    """Pick the shard a chunk belongs to under the given strategy."""
+    if strategy == "standard":
+        return shard_name(
+            metadata.get("standard", "unknown"), metadata.get("version", "Unknown")
+        )
+    if strategy == "hash":
+        key = f"{metadata.get('document', '')}:{metadata.get('number', '')}"
+        return f"hash-{zlib.crc32(key.encode('utf-8')) % hash_shards:02d}"
+    return DEFAULT_SHARD
+
+
+def _write_shard(
+    path: str,
+    texts: List[str],
+    vectors: List[List[float]],
+    metadatas: List[Dict],
+    embedding_model,
+    quantization: str,
+) -> None:
+    """Save one FAISS shard, optionally with a quantized index.
+
+    Quantized shards also keep their exact vectors on disk for re-scoring.
+    The shared sidecar files are exported too, so serving workers only map
+    the shard.
+    """
+    store = FAISS.from_embeddings(
+        list(zip(texts, vectors)), embedding_model, metadatas=metadatas
+    )
+    if quantization != "none":
+        matrix = np.asarray(vectors, dtype=np.float32)
+        store.index = quantize_vectors(matrix, quantization)
+    store.save_local(path)
+    if quantization != "none":
+        save_exact_vectors(path, matrix)
+    export_shared_shard(path)
+
+
+def save_index(
+    index_path: str,
+    texts: List[str],
+    vectors: List[List[float]],
+    metadatas: List[Dict],
+    embedding_model,
+    strategy: str = INDEX_SHARD_STRATEGY,
+    quantization: str = INDEX_QUANTIZATION,
+) -> Dict[str, int]:
+    """Write precomputed embeddings as one FAISS index per shard.
+
+    With strategy "none" the legacy single index is written at index_path.
+    Returns the number of chunks stored in each shard.
+    """
+    if strategy == "none":
+        _write_shard(
+            index_path, texts, vectors, metadatas, embedding_model, quantization
+        )
+        return {DEFAULT_SHARD: len(texts)}
+
+    groups: Dict[str, List[int]] = {}
+    for position, metadata in enumerate(metadatas):
+        groups.setdefault(shard_key(metadata, strategy), []).append(position)
+
+    for name, positions in groups.items():
+        _write_shard(
+            os.path.join(index_path, SHARDS_DIR, name),
+            [texts[i] for i in positions],
+            [vectors[i] for i in positions],
+            [metadatas[i] for i in positions],
+            embedding_model,
+            quantization,
+        )
+    return {name: len(positions) for name, positions in groups.items()}
+
+
+def shard_entries(
+    store: FAISS, exact_vectors: Optional[np.ndarray] = None
+) -> Tuple[List[str], np.ndarray, List[Dict]]:
+    """Texts, vectors and metadata stored in a shard, in index order.
+
+    Vectors come from the saved exact copy when there is one, otherwise
+    they are reconstructed from the (unquantized) FAISS index.
+    """
+    docs = [
+        store.docstore.search(store.index_to_docstore_id[position])
+        for position in range(store.index.ntotal)
+    ]
+    if exact_vectors is not None:
+        vectors = np.asarray(exact_vectors, dtype=np.float32)
+    else:
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+    return (
+        [doc.page_content for doc in docs],
+        vectors,
+        [dict(doc.metadata) for doc in docs],
+    )
+
+
+def append_documents(
+    source_path: Optional[str],
+    target_path: str,
+    texts: List[str],
+    vectors: List[List[float]],
+    metadatas: List[Dict],
+    embedding_model,
+    strategy: str = INDEX_SHARD_STRATEGY,
+    quantization: str = INDEX_QUANTIZATION,
+) -> Dict[str, int]:
+    """Write a copy of the index at source_path with new chunks added.
+
+    Chunks already indexed for the same documents are replaced. Only the
+    shards that gain or lose chunks are rebuilt, from their stored vectors,
+    so nothing is re-embedded; untouched shards are copied as they are.
+    Returns the number of chunks stored in each shard.
+    """
+    documents = {metadata.get("document") for metadata in metadatas}
+    existing = (
+        ShardedIndex.load(source_path, embedding_model, rescore=True)
+        if source_path and os.path.exists(source_path)
+        else ShardedIndex({})
+    )
+    legacy = strategy == "none" or (
+        existing.shards and not os.path.isdir(os.path.join(source_path, SHARDS_DIR))
+    )
+
+    groups: Dict[str, List[int]] = {}
+    for position, metadata in enumerate(metadatas):
+        key = DEFAULT_SHARD if legacy else shard_key(metadata, strategy)
+        groups.setdefault(key, []).append(position)
+
+    sizes = {}
+    for name in sorted(set(existing.shards) | set(groups)):
+        shard_path = (
+            target_path if legacy else os.path.join(target_path, SHARDS_DIR, name)
+        )
+        new_positions = groups.get(name, [])
+        shard_texts: List[str] = []
+        shard_vectors: List[List[float]] = []
+        shard_metadatas: List[Dict] = []
+        if name in existing.shards:
+            store = existing.shards[name]
+            old_texts, old_vectors, old_metadatas = shard_entries(
+                store, existing.exact_vectors.get(name)
+            )
+            kept = [
+                i
+                for i, metadata in enumerate(old_metadatas)
+                if metadata.get("document") not in documents
+            ]
+            if not new_positions and len(kept) == len(old_texts):
+                shutil.copytree(os.path.join(source_path, SHARDS_DIR, name), shard_path)
+                if not has_shared_files(shard_path):
+                    export_shared_shard(shard_path)
+                sizes[name] = len(old_texts)
+                continue
+            shard_texts = [old_texts[i] for i in kept]
+            shard_vectors = [old_vectors[i].tolist() for i in kept]
+            shard_metadatas = [old_metadatas[i] for i in kept]
+
+        shard_texts += [texts[i] for i in new_positions]
+        shard_vectors += [vectors[i] for i in new_positions]
+        shard_metadatas += [metadatas[i] for i in new_positions]
+        if not shard_texts:
+            continue
+        _write_shard(
+            shard_path,
+            shard_texts,
+            shard_vectors,
+            shard_metadatas,
+            embedding_model,
+            quantization,
+        )
+        sizes[name] = len(shard_texts)
+    return sizes
+
+
+class ShardedIndex:
+    """A set of FAISS shards searched in parallel and merged by score.
+
+    FAISS releases the GIL during search, so shards are queried concurrently
+    on a shared thread pool and per-shard top-k lists are merged with a heap.
+    Pinned shards are searched even when a caller selects specific shards.
+    """
+
+    def __init__(
+        self,
+        shards: Dict[str, FAISS],
+        exact_vectors: Optional[Dict[str, np.ndarray]] = None,
+        pinned: Optional[List[str]] = None,
+    ):
+        self.shards = shards
+        self.exact_vectors = exact_vectors or {}
+        self.pinned = pinned or []
+        # Lookup tables hold (shard, chunk id) so mapped text is not copied
+        self._by_number: Optional[Dict[Tuple[str, str], Tuple[str, str]]] = None
+        self._by_parent: Optional[Dict[Tuple[str, str], List[Tuple[str, str]]]] = None
+
+    @classmethod
+    def load(
+        cls,
+        index_path: str,
+        embedding_model,
+        rescore: bool = INDEX_RESCORE,
+        shared: bool = INDEX_SHARED_MEMORY,
+    ) -> "ShardedIndex":
+        """Load every shard under index_path, or the legacy single index.
+
+        With `rescore`, exact vectors saved next to quantized shards are
+        memory-mapped and used to re-rank their candidates. With `shared`,
+        shards are attached read-only through memory maps, so processes
+        serving the same version share one copy of the vectors and text.
+        """
+        shards_path = os.path.join(index_path, SHARDS_DIR)
+        if os.path.isdir(shards_path):
+            paths = {
+                name: os.path.join(shards_path, name)
+                for name in sorted(os.listdir(shards_path))
+                if os.path.exists(os.path.join(shards_path, name, "index.faiss"))
+            }
+        else:
+            paths = {DEFAULT_SHARD: index_path}
+
+        if shared:
+            shards = {
+                name: load_shared_shard(path, embedding_model)
+                for name, path in paths.items()
+            }
+        else:
+            shards = {
+                name: FAISS.load_local(
+                    path, embedding_model, allow_dangerous_deserialization=True
+                )
+                for name, path in paths.items()
+            }
+        exact_vectors = {}
+        if rescore:
+            for name, path in paths.items():
+                vectors = load_exact_vectors(path)
+                if vectors is not None:
+                    exact_vectors[name] = vectors
+        return cls(shards, exact_vectors)
+
+    def warm_up(self) -> None:
+        """Run one throwaway search per shard so first queries hit warm memory."""
+        for store in self.shards.values():
+            if store.index.ntotal:
+                store.index.search(np.zeros((1, store.index.d), dtype=np.float32), 1)
+
+    def with_namespace(self, namespace: str, other: "ShardedIndex") -> "ShardedIndex":
+        """View over these shards plus `other`'s, pinned as `namespace/<shard>`.
+
+        Stores are shared rather than copied, so the view is cheap to build.
+        """
+        shards = dict(self.shards)
+        exact_vectors = dict(self.exact_vectors)
+        pinned = list(self.pinned)
+        for name, store in other.shards.items():
+            key = f"{namespace}/{name}"
+            shards[key] = store
+            pinned.append(key)
+            if name in other.exact_vectors:
+                exact_vectors[key] = other.exact_vectors[name]
+        return ShardedIndex(shards, exact_vectors, pinned)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: FAISS index data plus chunk text.
+
+        Exact re-scoring vectors and shared shards are memory-mapped and
+        not counted.
+        """
+        total = 0
+        for store in self.shards.values():
+            if isinstance(store.docstore, MappedDocstore):
+                continue
+            total += index_bytes(store.index)
+            total += sum(
+                len(doc.page_content.encode("utf-8"))
+                for doc in store.docstore._dict.values()
+            )
+        return total
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.shards)
+
+    @property
+    def ntotal(self) -> int:
+        return sum(store.index.ntotal for store in self.shards.values())
+
+    def lookup(self, document: str, number: str) -> Optional[Document]:
+        """Fetch a chunk by document and requirement number, without searching."""
+        if self._by_number is None:
+            by_number = {}
+            for name, store in self.shards.items():
+                for doc_id in store.docstore._dict:
+                    metadata = stored_metadata(store.docstore, doc_id)
+                    # Collapsed duplicates resolve to the chunk that kept them
+                    for alias in metadata_values(metadata, "number"):
+                        key = (metadata.get("document"), alias)
+                        by_number.setdefault(key, (name, doc_id))
+            self._by_number = by_number
+        location = self._by_number.get((document, number))
+        return self._fetch(location) if location else None
+
+    def children(self, document: str, number: str) -> List[Document]:
+        """Chunks whose parent_requirement is the given number, in index order."""
+        if self._by_parent is None:
+            by_parent: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+            for name, store in self.shards.items():
+                for doc_id in store.docstore._dict:
+                    metadata = stored_metadata(store.docstore, doc_id)
+                    for parent in metadata_values(metadata, "parent_requirement"):
+                        key = (metadata.get("document"), parent)
+                        by_parent.setdefault(key, []).append((name, doc_id))
+            self._by_parent = by_parent
+        return [
+            self._fetch(location)
+            for location in self._by_parent.get((document, number), [])
+        ]
+
+    def _fetch(self, location: Tuple[str, str]) -> Document:
+        name, doc_id = location
+        return self.shards[name].docstore.search(doc_id)
+
+    def _targets(self, shards: Optional[Iterable[str]]) -> List[str]:
+        if not shards:
+            return self.names
+        unknown = [name for name in shards if name not in self.shards]
+        if unknown:
+            print(f"⚠️ Ignoring unknown shard(s): {', '.join(unknown)}")
+        selected = [name for name in shards if name in self.shards]
+        return selected + [name for name in self.pinned if name not in selected]
+
+    def _search_shard(
+        self,
+        name: str,
+        embeddings: List[List[float]],
+        k: int,
+        filter: Optional[Dict],
+    ) -> List[List[Tuple[Document, float]]]:
+        return search_by_vectors(
+            self.shards[name],
+            embeddings,
+            k=k,
+            filter=filter,
+            exact_vectors=self.exact_vectors.get(name),
+        )
+
+    def search(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        filter: Optional[Dict] = None,
+        shards: Optional[Iterable[str]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Search the selected shards (all by default) and merge per query."""
+        targets = self._targets(shards)
+        if not targets:
+            return [[] for _ in embeddings]
+        if len(targets) == 1:
+            per_shard = [self._search_shard(targets[0], embeddings, k, filter)]
+        else:
+            per_shard = list(
+                _search_pool.map(
+                    lambda name: self._search_shard(name, embeddings, k, filter),
+                    targets,
+                )
+            )
+
+        if len(per_shard) == 1:
+            return per_shard[0]
+        return [
+            heapq.nlargest(k, chain.from_iterable(rows), key=lambda pair: pair[1])
+            for rows in zip(*per_shard)
+        ]
@@ -0,0 +1,166 @@
+import json
+import mmap
+import os
+import pickle
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+# Read-only sidecar files written next to a shard's index.faiss / index.pkl
+SHARED_TEXT_FILE = "shared_texts.bin"
+SHARED_OFFSETS_FILE = "shared_offsets.npy"
+SHARED_META_FILE = "shared_meta.json"
+
+# The FAISS codes are mapped from the shard file instead of read into memory
+SHARED_IO_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def _replace(path: str, write) -> None:
+    # Write next to the target and rename so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def export_shared_shard(path: str) -> None:
+    """Write a shard's chunk texts as flat files every worker can map.
+
+    Texts are concatenated UTF-8 with an offsets array; metadata and chunk
+    ids go to a JSON file in index order. Workers exporting the same shard
+    at once write identical files, so the last rename simply wins.
+    """
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    ids = [index_to_docstore_id[position] for position in sorted(index_to_docstore_id)]
+    docs = [docstore.search(doc_id) for doc_id in ids]
+
+    encoded = [doc.page_content.encode("utf-8") for doc in docs]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+
+    _replace(
+        os.path.join(path, SHARED_TEXT_FILE),
+        lambda f: f.write(b"".join(encoded)),
+    )
+    _replace(
+        os.path.join(path, SHARED_OFFSETS_FILE),
+        lambda f: np.save(f, offsets),
+    )
+    # Written last: its presence marks the export as complete
+    _replace(
+        os.path.join(path, SHARED_META_FILE),
+        lambda f: f.write(
+            json.dumps(
+                {"ids": ids, "metadatas": [doc.metadata for doc in docs]},
+                ensure_ascii=False,
+            ).encode("utf-8")
+        ),
+    )
+
+
+class _MappedDocuments(Mapping):
+    """Chunk id -> Document view whose page text lives in a mapped file."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, SHARED_TEXT_FILE), "rb") as f:
+            # An empty file cannot be mapped
+            size = os.fstat(f.fileno()).st_size
+            self._texts = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            )
+        # Offsets are tiny next to the text, and plain ints index fastest
+        self._offsets: List[int] = np.load(
+            os.path.join(path, SHARED_OFFSETS_FILE)
+        ).tolist()
+        with open(os.path.join(path, SHARED_META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids: List[str] = meta["ids"]
+        self._metadatas: List[Dict] = meta["metadatas"]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def metadata(self, doc_id: str) -> Dict:
+        """A chunk's metadata without decoding its text; do not modify it."""
+        return self._metadatas[self._positions[doc_id]]
+
+    def __getitem__(self, doc_id: str) -> Document:
+        i = self._positions[doc_id]
+        start, end = self._offsets[i], self._offsets[i + 1]
+        # Fields were validated when the shard was built; skip doing it again
+        return Document.model_construct(
+            id=doc_id,
+            page_content=self._texts[start:end].decode("utf-8"),
+            metadata=dict(self._metadatas[i]),
+            type="Document",
+        )
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class MappedDocstore(Docstore):
+    """Read-only docstore over a shard's shared sidecar files.
+
+    Exposes `_dict` like InMemoryDocstore so existing callers work, but a
+    Document is only built when it is read; the text stays in page cache
+    shared by every process that maps the same shard.
+    """
+
+    def __init__(self, path: str):
+        self._dict = _MappedDocuments(path)
+
+    def metadata(self, doc_id: str) -> Dict:
+        return self._dict.metadata(doc_id)
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search not in self._dict:
+            return f"ID {search} not found."
+        return self._dict[search]
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("Shared shards are read-only")
+
+
+def stored_metadata(docstore: Docstore, doc_id: str) -> Dict:
+    """A stored chunk's metadata; mapped chunks skip decoding their text."""
+    if isinstance(docstore, MappedDocstore):
+        return docstore.metadata(doc_id)
+    return docstore._dict[doc_id].metadata
+
+
+def has_shared_files(path: str) -> bool:
+    # The metadata file is written last, so it marks a complete export
+    return os.path.exists(os.path.join(path, SHARED_META_FILE))
+
+
+def load_shared_shard(path: str, embedding_model) -> FAISS:
+    """Attach to a shard read-only: mapped FAISS codes plus a mapped docstore.
+
+    The sidecar files are exported when a shard is built; serving never
+    writes into a published version. A shard built before they existed is
+    loaded privately instead.
+    """
+    if not has_shared_files(path):
+        print(f"⚠️ No shared files for {path}; rebuild the index to share it")
+        return FAISS.load_local(
+            path, embedding_model, allow_dangerous_deserialization=True
+        )
+    index = faiss.read_index(os.path.join(path, "index.faiss"), SHARED_IO_FLAGS)
+    docstore = MappedDocstore(path)
+    return FAISS(
+        embedding_model,
+        index,
+        docstore,
+        dict(enumerate(docstore._dict.ids)),
+    )
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from config import COALESCE_REQUESTS
+from langchain_core.embeddings import Embeddings
+
+# Every group registers here so counters can be reported in one place
+_groups: List["SingleFlight"] = []
+
+
+def normalize_text(text: str) -> str:
+    """Coalescing key for free text: case and whitespace differences collapse."""
+    return " ".join(str(text).split()).casefold()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one upstream call.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result (or exception). Nothing is
+    cached once the call completes. Sync callers coalesce across threads and
+    async callers coalesce within their event loop.
+    """
+
+    def __init__(self, name: str, enabled: bool = COALESCE_REQUESTS):
+        self.name = name
+        self.enabled = enabled
+        self.executed = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        _groups.append(self)
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        if not self.enabled:
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(
+        self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs
+    ) -> Any:
+        if not self.enabled:
+            return await fn(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            future = self._async_calls.get(loop_key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[loop_key] = loop.create_future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Shield so one cancelled follower does not cancel the shared call
+            return await asyncio.shield(future)
+
+        try:
+            result = await fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop(loop_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"executed": self.executed, "coalesced": self.coalesced}
+
+
+def coalescing_stats() -> Dict[str, Dict[str, int]]:
+    """Executed and coalesced call counts, summed per singleflight group name."""
+    stats: Dict[str, Dict[str, int]] = {}
+    for group in _groups:
+        totals = stats.setdefault(group.name, {"executed": 0, "coalesced": 0})
+        for counter, value in group.stats().items():
+            totals[counter] += value
+    return stats
+
+
+class CoalescingEmbeddings(Embeddings):
+    """Embeddings wrapper that shares identical in-flight embedding requests."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.flight = SingleFlight("embedding")
+
+    def embed_query(self, text: str) -> List[float]:
+        return list(
+            self.flight.do(
+                ("query", normalize_text(text)), self.embeddings.embed_query, text
+            )
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        key = ("documents", tuple(normalize_text(text) for text in texts))
+        vectors = self.flight.do(key, self.embeddings.embed_documents, texts)
+        return [list(vector) for vector in vectors]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = ("query", normalize_text(text))
+        return list(await self.flight.do_async(key, self.embeddings.aembed_query, text))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        key = ("documents", tuple(normalize_text(text) for text in texts))
+        vectors = await self.flight.do_async(
+            key, self.embeddings.aembed_documents, texts
+        )
+        return [list(vector) for vector in vectors]
+
+
+class CoalescingModel:
+    """Generative model wrapper that shares identical in-flight prompts.
+
+    Only plain string prompts without extra arguments are coalesced; other
+    calls pass straight through. Unknown attributes go to the wrapped model.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.flight = SingleFlight("generation")
+
+    def __getattr__(self, name: str):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def generate_content(self, prompt, **kwargs):
+        if kwargs or not isinstance(prompt, str):
+            return self.model.generate_content(prompt, **kwargs)
+        key = " ".join(prompt.split())
+        return self.flight.do(key, self.model.generate_content, prompt)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        if kwargs or not isinstance(prompt, str):
+            return await self.model.generate_content_async(prompt, **kwargs)
+        key = " ".join(prompt.split())
+        return await self.flight.do_async(
+            key, self.model.generate_content_async, prompt
+        )
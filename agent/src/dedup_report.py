@@ -0,0 +1,91 @@
+"""Report what near-duplicate collapsing saves on the input corpus.
+
+The PDFs in INPUT_DIR are chunked exactly as setup_index.py does. For each
+similarity threshold, the report gives the chunks kept and the embedding
+tokens and spend saved. It also gives the float32 vector memory the index
+avoids at EMBEDDING_DIMENSIONS. Nothing is embedded or written to the
+index.
+
+    python dedup_report.py --thresholds 0.7 0.8 0.9 --examples 5
+    python dedup_report.py --output dedup.json
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+from config import EMBEDDING_DIMENSIONS, INDEX_DEDUP_THRESHOLD, INPUT_DIR
+from core.dedup import collapse_near_duplicates, near_duplicate_groups
+from setup_index import build_chunks, discover_documents, process_corpus
+
+
+def corpus_chunks():
+    texts, metadatas = [], []
+    for result in process_corpus(discover_documents(INPUT_DIR)):
+        doc_texts, doc_metadatas = build_chunks(result["json"])
+        texts += doc_texts
+        metadatas += doc_metadatas
+    return texts, metadatas
+
+
+def run_report(thresholds: List[float], examples: int = 0) -> List[Dict]:
+    texts, metadatas = corpus_chunks()
+    print(f"\n📚 {len(texts)} chunks from {INPUT_DIR}\n")
+    print(
+        f"{'threshold':>9} {'chunks':>7} {'groups':>7} {'shrink':>7} "
+        f"{'tokens saved':>13} {'USD saved':>10} {'vector MB':>10} {'seconds':>8}"
+    )
+    rows = []
+    for threshold in thresholds:
+        started = time.perf_counter()
+        _, _, report = collapse_near_duplicates(texts, metadatas, threshold)
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        removed = report["chunks_before"] - report["chunks_after"]
+        report["vector_bytes_saved"] = removed * EMBEDDING_DIMENSIONS * 4
+        rows.append(report)
+        print(
+            f"{threshold:>9} {report['chunks_after']:>7} "
+            f"{report['collapsed_groups']:>7} "
+            f"{100 * report['chunk_reduction']:>6.1f}% "
+            f"{report['embedding_tokens_saved']:>13} "
+            f"{report['embedding_usd_saved']:>10.6f} "
+            f"{report['vector_bytes_saved'] / 2**20:>10.2f} "
+            f"{report['seconds']:>8}"
+        )
+
+    if examples:
+        # Show what the configured threshold would merge, to sanity-check it
+        groups = near_duplicate_groups(texts, metadatas, INDEX_DEDUP_THRESHOLD)
+        merged = [group for group in groups if len(group) > 1][:examples]
+        print(f"\n🔎 Example groups at threshold {INDEX_DEDUP_THRESHOLD}:")
+        for group in merged:
+            print(f"\n   {metadatas[group[0]]['document']}")
+            for position in group:
+                metadata = metadatas[position]
+                preview = " ".join(texts[position].split())[:90]
+                print(
+                    f"   {metadata.get('number')} (p. {metadata.get('page')}): {preview}"
+                )
+        if not merged:
+            print("   none")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate collapsing report")
+    parser.add_argument(
+        "--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9, 1.0]
+    )
+    parser.add_argument(
+        "--examples", type=int, default=3, help="Merged groups to print"
+    )
+    parser.add_argument("--output", help="Optional JSON file for the report rows")
+    args = parser.parse_args()
+
+    print("\n=== Near-duplicate Collapsing Report ===")
+    report = run_report(args.thresholds, args.examples)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
@@ -0,0 +1,212 @@
+"""Compare embedding backends on retrieval quality and query latency.
+
+Every backend embeds the chunks of the published shared index into an
+exact in-memory index, then embeds each query on its own and searches it.
+The report gives query embedding latency (p50/p95), hit@k and MRR against
+the expected requirement numbers, and top-k agreement with the first
+backend, which is normally the hosted model.
+
+    python embedding_report.py --queries golden_queries.jsonl --k 5
+    python embedding_report.py --backends text-embedding-3-small local-lsa
+
+The golden query file is JSONL with a "query" field and an optional
+"expected" requirement number (or list of numbers) per line. Without it,
+the opening words of a sample of requirement chunks are used as the query
+and the chunk's own number as the expected answer. If the local model has
+not been fitted yet, it is fitted on the corpus into a temporary file.
+"""
+
+import argparse
+import json
+import math
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from config import EMBEDDING_MODEL_NAME
+from core.index_manager import current_index_version
+from core.local_embeddings import (
+    LOCAL_EMBEDDING_MODEL,
+    LocalEmbeddings,
+    embeddings_for_index,
+    fit_local_embeddings,
+)
+from core.providers import build_embeddings
+from core.shards import ShardedIndex
+
+HOSTED_DEFAULT = "text-embedding-3-small"
+
+
+def load_corpus() -> List:
+    """Chunks of the published shared index, in a stable order."""
+    version, index_path = current_index_version()
+    index = ShardedIndex.load(index_path, LocalEmbeddings(), rescore=False)
+    docs = [
+        doc
+        for name in sorted(index.shards)
+        for doc in index.shards[name].docstore._dict.values()
+    ]
+    print(f"📚 Index {version or 'legacy'}: {len(docs)} chunks")
+    return docs
+
+
+def load_queries(queries_path: Optional[str], docs: List, sample: int) -> List[Dict]:
+    """Golden queries, or synthetic ones taken from requirement chunks."""
+    if queries_path:
+        queries = []
+        with open(queries_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                expected = item.get("expected") or []
+                if isinstance(expected, str):
+                    expected = [expected]
+                queries.append({"query": item["query"], "expected": expected})
+        return queries
+
+    candidates = [
+        doc
+        for doc in docs
+        if doc.metadata.get("number") and len(doc.page_content.split()) >= 8
+    ]
+    rng = np.random.default_rng(0)
+    picks = rng.choice(
+        len(candidates), size=min(sample, len(candidates)), replace=False
+    )
+    queries = []
+    for i in sorted(picks):
+        doc = candidates[i]
+        # Drop the leading number so the query has to match on content
+        words = doc.page_content.split()[1:25]
+        queries.append({"query": " ".join(words), "expected": [doc.metadata["number"]]})
+    return queries
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[math.ceil(fraction * len(ordered)) - 1] if ordered else 0.0
+
+
+def evaluate_backend(name: str, docs: List, queries: List[Dict], k: int) -> Dict:
+    """Embed corpus and queries with one backend and score its top-k results."""
+    _, index_path = current_index_version()
+    embeddings = embeddings_for_index(index_path, build_embeddings(name))
+    if name == LOCAL_EMBEDDING_MODEL and not embeddings.fitted:
+        path = f"{tempfile.mkdtemp()}/local_embeddings.npz"
+        embeddings = fit_local_embeddings([doc.page_content for doc in docs], path)
+
+    started = time.perf_counter()
+    corpus = np.asarray(
+        embeddings.embed_documents([doc.page_content for doc in docs]), np.float32
+    )
+    corpus_seconds = time.perf_counter() - started
+    faiss.normalize_L2(corpus)
+    index = faiss.IndexFlatIP(corpus.shape[1])
+    index.add(corpus)
+
+    latencies = []
+    vectors = []
+    for item in queries:
+        started = time.perf_counter()
+        vectors.append(embeddings.embed_query(item["query"]))
+        latencies.append(time.perf_counter() - started)
+    vectors = np.asarray(vectors, np.float32)
+    faiss.normalize_L2(vectors)
+    _, found = index.search(vectors, k)
+
+    hits, reciprocal_ranks, labelled = 0, 0.0, 0
+    for item, row in zip(queries, found):
+        if not item["expected"]:
+            continue
+        labelled += 1
+        numbers = [docs[i].metadata.get("number") for i in row if i >= 0]
+        ranks = [
+            rank for rank, number in enumerate(numbers, 1) if number in item["expected"]
+        ]
+        if ranks:
+            hits += 1
+            reciprocal_ranks += 1 / ranks[0]
+
+    ordered = sorted(latencies)
+    return {
+        "backend": name,
+        "dimensions": int(corpus.shape[1]),
+        "corpus_embed_s": round(corpus_seconds, 2),
+        "query_p50_ms": round(1000 * _percentile(ordered, 0.50), 3),
+        "query_p95_ms": round(1000 * _percentile(ordered, 0.95), 3),
+        "hit_at_k": round(hits / labelled, 3) if labelled else None,
+        "mrr": round(reciprocal_ranks / labelled, 3) if labelled else None,
+        "found": found,
+    }
+
+
+def agreement_at_k(found: np.ndarray, reference: np.ndarray) -> float:
+    """Share of the reference backend's top-k that this backend also returned."""
+    shared = sum(
+        len(set(row) & set(expected)) for row, expected in zip(found, reference)
+    )
+    return shared / reference.size
+
+
+def run_report(
+    queries_path: Optional[str], backends: List[str], k: int, sample: int
+) -> List[Dict]:
+    docs = load_corpus()
+    queries = load_queries(queries_path, docs, sample)
+    k = min(k, len(docs))
+    print(
+        f"🔎 {len(queries)} {'golden' if queries_path else 'synthetic'} queries, k={k}"
+    )
+
+    rows = []
+    for name in backends:
+        print(f"\n🔤 Evaluating {name}...")
+        rows.append(evaluate_backend(name, docs, queries, k))
+
+    reference = rows[0]["found"]
+    for row in rows:
+        row["agreement"] = round(agreement_at_k(row.pop("found"), reference), 3)
+
+    print(
+        f"\n{'backend':<24} {'dims':>5} {'corpus s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'hit@k':>6} {'MRR':>6} {'agree':>6}"
+    )
+    for row in rows:
+        print(
+            f"{row['backend']:<24} {row['dimensions']:>5} {row['corpus_embed_s']:>9} "
+            f"{row['query_p50_ms']:>9} {row['query_p95_ms']:>9} "
+            f"{row['hit_at_k'] if row['hit_at_k'] is not None else '-':>6} "
+            f"{row['mrr'] if row['mrr'] is not None else '-':>6} "
+            f"{row['agreement']:>6}"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    hosted = (
+        EMBEDDING_MODEL_NAME
+        if EMBEDDING_MODEL_NAME != LOCAL_EMBEDDING_MODEL
+        else HOSTED_DEFAULT
+    )
+    parser = argparse.ArgumentParser(description="Embedding backend comparison")
+    parser.add_argument("--queries", help="Golden query JSONL with a 'query' field")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=[hosted, LOCAL_EMBEDDING_MODEL],
+        help="EMBEDDING_MODEL_NAME values to compare; the first is the reference",
+    )
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument(
+        "--sample", type=int, default=100, help="Synthetic queries without --queries"
+    )
+    parser.add_argument("--output", help="Optional JSON file for the report rows")
+    args = parser.parse_args()
+
+    print("\n=== Embedding Backend Report ===")
+    report = run_report(args.queries, args.backends, args.k, args.sample)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,151 @@
+"""Measure retrieval reuse across the turns of a conversation thread.
+
+Each session is a short thread: an opening question followed by follow-ups
+that refer back to it ("what about its testing procedures?") or rephrase it.
+Every turn is retrieved twice: fresh, as if the thread had no state, and
+with the previous turn's chunk ids and query vector. The report compares
+retrieval latency, embedding calls and how many of the fresh chunks the
+reused context still contains.
+
+    LLM_PROVIDER=fake python followup_benchmark.py --embedding-latency-ms 80
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+SESSIONS = [
+    [
+        "What does PCI DSS require for multi-factor authentication?",
+        "What about the testing procedures for that?",
+        "Which multi-factor authentication requirements apply to remote access?",
+        "And the details of those?",
+    ],
+    [
+        "How must stored cardholder data be protected?",
+        "How should stored cardholder data be protected at rest?",
+        "What are the testing procedures for it?",
+    ],
+    [
+        "What logging is required for system components?",
+        "How long must those audit logs be retained?",
+        "What about reviewing them?",
+    ],
+    [
+        "What are the requirements for firewall and network security controls?",
+        "What are the network security control requirements for firewalls?",
+        "Also, how is this tested?",
+    ],
+]
+
+
+def run_session(turns: List[str]) -> List[Dict]:
+    from core.query_builder import build_retrieval_query, detect_topics
+    from core.rag import (
+        _find_docs,
+        chunk_id,
+        query_embeddings,
+        retrieve_for_turn,
+        serving_bundle,
+    )
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    bundle = serving_bundle()
+    messages = []
+    last_doc_ids, last_query_vector = None, None
+    rows = []
+    for turn in turns:
+        messages.append(HumanMessage(content=turn))
+        query = build_retrieval_query(messages)
+        topics = detect_topics(query)
+
+        started = time.perf_counter()
+        fresh = _find_docs(
+            query, topics, bundle, query_embeddings(bundle).embed_query(query)
+        )
+        fresh_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        docs, embedding, reuse = retrieve_for_turn(
+            query, topics, bundle, last_doc_ids, last_query_vector
+        )
+        reused_seconds = time.perf_counter() - started
+
+        fresh_ids = {chunk_id(doc) for doc in fresh}
+        reused_ids = [chunk_id(doc) for doc in docs]
+        rows.append(
+            {
+                "turn": turn,
+                "reuse": reuse,
+                "fresh_ms": round(1000 * fresh_seconds, 1),
+                "reused_ms": round(1000 * reused_seconds, 1),
+                "embedded": embedding is not None,
+                "overlap": round(
+                    len(fresh_ids.intersection(reused_ids)) / len(fresh_ids), 2
+                )
+                if fresh_ids
+                else 1.0,
+            }
+        )
+        last_doc_ids = reused_ids
+        if embedding is not None:
+            last_query_vector = embedding
+        messages.append(AIMessage(content=f"(answer citing {len(docs)} chunks)"))
+    return rows
+
+
+def run_benchmark(output: str = "") -> Dict:
+    rows = []
+    for turns in SESSIONS:
+        session = run_session(turns)
+        rows.extend(session)
+        for row in session:
+            print(
+                f"   {row['reuse']:<9} fresh {row['fresh_ms']:>7} ms  "
+                f"reused {row['reused_ms']:>7} ms  overlap {row['overlap']:.2f}  "
+                f"{row['turn'][:50]}"
+            )
+        print()
+
+    followups = [row for row in rows if row["reuse"] != "fresh"]
+    summary = {
+        "turns": len(rows),
+        "reused_turns": len(followups),
+        "embeddings_fresh": len(rows),
+        "embeddings_reused": sum(1 for row in rows if row["embedded"]),
+        "fresh_ms": round(sum(row["fresh_ms"] for row in rows), 1),
+        "reused_ms": round(sum(row["reused_ms"] for row in rows), 1),
+        "followup_overlap": round(
+            sum(row["overlap"] for row in followups) / len(followups), 2
+        )
+        if followups
+        else None,
+        "rows": rows,
+    }
+    print(
+        f"📊 {summary['reused_turns']}/{summary['turns']} turns reused the previous "
+        f"retrieval; {summary['embeddings_reused']}/{summary['embeddings_fresh']} "
+        f"embedding calls; {summary['reused_ms']} ms vs {summary['fresh_ms']} ms "
+        f"total retrieval; follow-up overlap with fresh results "
+        f"{summary['followup_overlap']}"
+    )
+    if output:
+        with open(output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Report written to {output}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow-up retrieval reuse benchmark")
+    parser.add_argument("--embedding-latency-ms", type=float, default=80)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    # Simulate a remote embedding API when running against the fake provider
+    os.environ.setdefault("FAKE_EMBEDDING_LATENCY_MS", str(args.embedding_latency_ms))
+
+    print("\n=== Follow-up Retrieval Benchmark ===\n")
+    run_benchmark(args.output)
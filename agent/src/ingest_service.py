@@ -0,0 +1,477 @@
+"""Background ingestion of uploaded documents into the live index.
+
+PDFs dropped into INGEST_WATCH_DIR (the stand-in for the upload pipeline)
+are queued as jobs and flow through four stages, each with its own worker
+pool and a bounded queue in front of it:
+
+    extract (PDF pages, in worker processes) -> section (requirements and
+    chunks) -> embed -> index (append and publish a new index version)
+
+When a stage falls behind, its queue fills up and the stage before it
+blocks, so memory stays bounded under bursts of uploads. The index stage
+folds every job waiting for it into one new version per namespace,
+rebuilding only the shards that change. Serving processes pick the new
+version up on their next reload check, without a restart or full rebuild.
+
+Files at the top level of the watch directory go to the shared corpus and
+files in <team_id>/ subdirectories go to that team's namespace. Ingested
+files are moved into INPUT_DIR (or TEAM_INPUT_DIR/<team_id>) so a later
+full `setup_index.py` run includes them; failed files go to a
+failed/ directory next to them.
+
+    python ingest_service.py                        # watch until interrupted
+    python ingest_service.py --once                 # ingest what is there, then exit
+    LLM_PROVIDER=fake python ingest_service.py      # no network
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    DATA_DIR,
+    EMBEDDING_MODEL_NAME,
+    FAISS_INDEX_DIR,
+    FAISS_INDEX_PATH,
+    INDEX_DEDUP,
+    INDEX_QUANTIZATION,
+    INDEX_SHARD_STRATEGY,
+    INGEST_EMBED_WORKERS,
+    INGEST_EXTRACT_WORKERS,
+    INGEST_POLL_INTERVAL,
+    INGEST_QUEUE_SIZE,
+    INGEST_WATCH_DIR,
+    INPUT_DIR,
+    TEAM_INPUT_DIR,
+)
+
+FAILED_DIR = "failed"
+STATUS_FILE = os.path.join(DATA_DIR, "ingest_jobs.json")
+STAGES = ("extract", "section", "embed", "index")
+# Status a job reports once it clears each stage before indexing
+STAGE_DONE = {"extract": "extracted", "section": "sectioned", "embed": "embedded"}
+
+
+class IngestionJob:
+    """One uploaded document and its progress through the stages."""
+
+    def __init__(self, job_id: int, path: str, team_id: Optional[str]):
+        self.id = job_id
+        self.path = path
+        self.team_id = team_id
+        self.status = "queued"
+        self.submitted_at = time.monotonic()
+        self.timings: Dict[str, float] = {}
+        self.pages: Optional[List[str]] = None
+        self.chunks: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.vectors: List[List[float]] = []
+        self.embeddings = None
+        self.version: Optional[str] = None
+        self.error: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        name = os.path.basename(self.path)
+        return f"{self.team_id}/{name}" if self.team_id else name
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "file": self.label,
+            "team": self.team_id,
+            "status": self.status,
+            "chunks": len(self.chunks),
+            "version": self.version,
+            "seconds": {stage: round(t, 3) for stage, t in self.timings.items()},
+            "error": self.error,
+        }
+
+
+def extract_pages(path: str) -> List[str]:
+    """Read cleaned page text; runs in a worker process and fills the page cache."""
+    from core.document_processor import DocumentProcessor
+
+    return DocumentProcessor(path, verbose=False).extract_pages()
+
+
+class IngestionPipeline:
+    """Bounded, multi-stage pipeline from uploaded PDF to published index version."""
+
+    def __init__(
+        self,
+        extract_workers: int = INGEST_EXTRACT_WORKERS,
+        embed_workers: int = INGEST_EMBED_WORKERS,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        status_path: str = STATUS_FILE,
+    ):
+        from core.providers import build_embeddings
+
+        self.embeddings = build_embeddings()
+        self._version_embeddings = self.embeddings
+        self.status_path = status_path
+        self.jobs: Dict[int, IngestionJob] = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Spawned, not forked: this process already runs the stage threads
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=max(1, extract_workers),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self.queues = {stage: queue.Queue(maxsize=queue_size) for stage in STAGES}
+
+        workers = {
+            "extract": (self._extract, extract_workers),
+            "section": (self._section, 1),
+            "embed": (self._embed, embed_workers),
+        }
+        self._threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(stage, handler, STAGES[STAGES.index(stage) + 1]),
+                name=f"ingest-{stage}-{i}",
+                daemon=True,
+            )
+            for stage, (handler, worker_count) in workers.items()
+            for i in range(max(1, worker_count))
+        ]
+        # A single writer keeps index versions linear
+        self._threads.append(
+            threading.Thread(target=self._run_index, name="ingest-index", daemon=True)
+        )
+        for thread in self._threads:
+            thread.start()
+
+    # Job bookkeeping
+
+    def submit(self, path: str, team_id: Optional[str] = None) -> IngestionJob:
+        """Queue a document; blocks while the extract queue is full."""
+        with self._lock:
+            job = IngestionJob(next(self._ids), path, team_id)
+            self.jobs[job.id] = job
+        self._report(job, "queued")
+        self.queues["extract"].put(job)
+        return job
+
+    def pending(self) -> List[IngestionJob]:
+        with self._lock:
+            return [
+                job
+                for job in self.jobs.values()
+                if job.status not in ("done", "failed")
+            ]
+
+    def wait_idle(self) -> None:
+        """Block until every submitted job has finished or failed."""
+        with self._idle:
+            self._idle.wait_for(
+                lambda: all(
+                    job.status in ("done", "failed") for job in self.jobs.values()
+                )
+            )
+
+    def _report(self, job: IngestionJob, status: str, detail: str = "") -> None:
+        """Record a job's progress in the log and the JSON status file."""
+        icon = {"done": "✅", "failed": "❌"}.get(status, "📥")
+        print(f"{icon} [job {job.id}] {job.label}: {status}{detail}")
+        with self._lock:
+            job.status = status
+            snapshot = [item.to_dict() for item in self.jobs.values()][-200:]
+            tmp_path = f"{self.status_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.status_path)
+            if status in ("done", "failed"):
+                self._idle.notify_all()
+
+    def _fail(self, job: IngestionJob, error: Exception) -> None:
+        job.error = str(error)
+        failed_dir = os.path.join(os.path.dirname(job.path), FAILED_DIR)
+        os.makedirs(failed_dir, exist_ok=True)
+        if os.path.exists(job.path):
+            shutil.move(job.path, os.path.join(failed_dir, os.path.basename(job.path)))
+        self._report(job, "failed", f" ({job.error})")
+
+    # Stages
+
+    def _run_stage(self, stage: str, handler, next_stage: str) -> None:
+        inbox, outbox = self.queues[stage], self.queues[next_stage]
+        while True:
+            job = inbox.get()
+            started = time.perf_counter()
+            try:
+                detail = handler(job)
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            job.timings[stage] = time.perf_counter() - started
+            self._report(job, STAGE_DONE[stage], detail or "")
+            # Blocks while the next stage is saturated (backpressure)
+            outbox.put(job)
+
+    def _extract(self, job: IngestionJob) -> str:
+        job.pages = self._process_pool.submit(extract_pages, job.path).result()
+        return f" ({len(job.pages)} pages)"
+
+    def _section(self, job: IngestionJob) -> str:
+        from core.dedup import collapse_near_duplicates
+        from core.document_processor import DocumentProcessor
+        from setup_index import build_chunks
+
+        processor = DocumentProcessor(job.path, verbose=False)
+        json_data = processor.convert_to_json(pages=job.pages)
+        job.pages = None
+        job.chunks, job.metadatas = build_chunks(json_data)
+        if not job.chunks:
+            raise ValueError("no chunks were created")
+        if not INDEX_DEDUP:
+            return f" ({len(job.chunks)} chunks)"
+        job.chunks, job.metadatas, report = collapse_near_duplicates(
+            job.chunks, job.metadatas
+        )
+        return (
+            f" ({len(job.chunks)} chunks, {report['chunks_before'] - len(job.chunks)}"
+            " near-duplicates collapsed)"
+        )
+
+    def _serving_embeddings(self):
+        """The shared version's model; team vectors are searched alongside it."""
+        from core.index_manager import current_index_version
+        from core.local_embeddings import embeddings_for_index
+
+        _, path = current_index_version(FAISS_INDEX_DIR, legacy_path=FAISS_INDEX_PATH)
+        embeddings = embeddings_for_index(path, self.embeddings)
+        with self._lock:
+            # Load each model file once, and compare jobs' models by identity
+            if getattr(embeddings, "path", None) != getattr(
+                self._version_embeddings, "path", None
+            ):
+                self._version_embeddings = embeddings
+            return self._version_embeddings
+
+    def _embed(self, job: IngestionJob) -> str:
+        from core.scheduler import scheduling
+
+        job.embeddings = self._serving_embeddings()
+        with scheduling(priority="batch", tenant=job.team_id or "ingest"):
+            job.vectors = job.embeddings.embed_documents(job.chunks)
+        return ""
+
+    def _run_index(self) -> None:
+        inbox = self.queues["index"]
+        while True:
+            # Fold everything already waiting into one version per namespace
+            batch = [inbox.get()]
+            while True:
+                try:
+                    batch.append(inbox.get_nowait())
+                except queue.Empty:
+                    break
+
+            by_team: Dict[Optional[str], List[IngestionJob]] = {}
+            for job in batch:
+                by_team.setdefault(job.team_id, []).append(job)
+            for team_id, jobs in by_team.items():
+                started = time.perf_counter()
+                try:
+                    version = self._append(team_id, jobs)
+                except Exception as e:
+                    for job in jobs:
+                        self._fail(job, e)
+                    continue
+                for job in jobs:
+                    job.timings["index"] = time.perf_counter() - started
+                    job.version = version
+                    self._archive(job)
+                    total = time.monotonic() - job.submitted_at
+                    self._report(
+                        job,
+                        "done",
+                        f" (searchable in version {version} after {total:.1f}s)",
+                    )
+
+    def _append(self, team_id: Optional[str], jobs: List[IngestionJob]) -> str:
+        """Publish a new version of the namespace with the jobs' chunks added."""
+        from core.answers import ANSWERS_FILE, load_answers, save_answers
+        from core.index_manager import (
+            current_index_version,
+            new_index_version,
+            publish_index_version,
+        )
+        from core.local_embeddings import store_with_index
+        from core.namespaces import team_index_dir
+        from core.query_builder import compute_topic_centroids, save_topic_centroids
+        from core.requirement_graph import (
+            GRAPH_FILE,
+            build_graph_for_index,
+            graph_stats,
+            save_requirement_graph,
+        )
+        from core.shards import append_documents
+        from setup_index import MANIFEST_FILE, write_manifest
+
+        index_dir = team_index_dir(team_id) if team_id else FAISS_INDEX_DIR
+        legacy_path = None if team_id else FAISS_INDEX_PATH
+        _, source_path = current_index_version(index_dir, legacy_path=legacy_path)
+        if source_path and not os.path.exists(source_path):
+            source_path = None
+
+        embeddings = self._serving_embeddings()
+        for job in jobs:
+            if job.embeddings is not embeddings:
+                # A refit model went live after this job was embedded
+                job.embeddings = embeddings
+                job.vectors = embeddings.embed_documents(job.chunks)
+
+        texts = [chunk for job in jobs for chunk in job.chunks]
+        metadatas = [metadata for job in jobs for metadata in job.metadatas]
+        vectors = [vector for job in jobs for vector in job.vectors]
+        documents = {metadata["document"] for metadata in metadatas}
+
+        # New and rebuilt shards follow the base version's layout, not the
+        # current environment, so the manifest describes every shard
+        manifest: Dict = {}
+        if source_path and os.path.exists(os.path.join(source_path, MANIFEST_FILE)):
+            with open(os.path.join(source_path, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+        manifest.setdefault("shard_strategy", INDEX_SHARD_STRATEGY)
+        manifest.setdefault("quantization", INDEX_QUANTIZATION)
+
+        version, index_path = new_index_version(index_dir)
+        shard_sizes = append_documents(
+            source_path,
+            index_path,
+            texts,
+            vectors,
+            metadatas,
+            embeddings,
+            strategy=manifest["shard_strategy"],
+            quantization=manifest["quantization"],
+        )
+
+        # References and neighbours can cross into the new documents
+        graph = build_graph_for_index(index_path, embeddings)
+        save_requirement_graph(index_path, graph)
+        store_with_index(embeddings, index_path)
+
+        # Carry over everything else stored with the version
+        if source_path:
+            for name in os.listdir(source_path):
+                source_file = os.path.join(source_path, name)
+                if name == MANIFEST_FILE:
+                    continue
+                if name == ANSWERS_FILE:
+                    # Answers for replaced documents are stale
+                    save_answers(
+                        index_path,
+                        {
+                            key: answer
+                            for key, answer in load_answers(source_path).items()
+                            if answer.get("document") not in documents
+                        },
+                    )
+                elif (
+                    name != GRAPH_FILE
+                    and os.path.isfile(source_file)
+                    and not os.path.exists(os.path.join(index_path, name))
+                ):
+                    shutil.copy2(source_file, index_path)
+        if not team_id and not source_path:
+            save_topic_centroids(index_path, compute_topic_centroids(embeddings))
+
+        manifest.update(
+            {
+                "version": version,
+                "team": team_id,
+                "embedding_model": EMBEDDING_MODEL_NAME,
+                "dimensions": len(vectors[0]),
+                "shards": shard_sizes,
+                "documents": sorted(set(manifest.get("documents", [])) | documents),
+                "graph": graph_stats(graph),
+                "appended_from": os.path.basename(source_path) if source_path else None,
+            }
+        )
+        write_manifest(index_path, manifest)
+        publish_index_version(version, index_dir=index_dir)
+        return version
+
+    def _archive(self, job: IngestionJob) -> None:
+        """Move an ingested upload to where full rebuilds read documents from."""
+        target_dir = (
+            os.path.join(TEAM_INPUT_DIR, job.team_id) if job.team_id else INPUT_DIR
+        )
+        os.makedirs(target_dir, exist_ok=True)
+        if os.path.exists(job.path):
+            shutil.move(job.path, os.path.join(target_dir, os.path.basename(job.path)))
+
+
+def scan_uploads(watch_dir: str) -> Dict[str, Tuple[Optional[str], Tuple[int, float]]]:
+    """Map every uploaded PDF to its team (None for shared) and size/mtime."""
+    found = {}
+    for entry in os.scandir(watch_dir):
+        if entry.is_file() and entry.name.lower().endswith(".pdf"):
+            stat = entry.stat()
+            found[entry.path] = (None, (stat.st_size, stat.st_mtime))
+        elif entry.is_dir() and entry.name != FAILED_DIR:
+            for upload in os.scandir(entry.path):
+                if upload.is_file() and upload.name.lower().endswith(".pdf"):
+                    stat = upload.stat()
+                    found[upload.path] = (entry.name, (stat.st_size, stat.st_mtime))
+    return found
+
+
+def watch(
+    pipeline: IngestionPipeline,
+    watch_dir: str = INGEST_WATCH_DIR,
+    interval: float = INGEST_POLL_INTERVAL,
+    once: bool = False,
+) -> None:
+    """Poll the watch directory and submit uploads once they stop changing."""
+    os.makedirs(watch_dir, exist_ok=True)
+    print(f"👀 Watching {watch_dir} for uploads (every {interval:.1f}s)")
+    previous: Dict[str, Tuple[Optional[str], Tuple[int, float]]] = {}
+    submitted: Dict[str, Tuple[int, float]] = {}
+    while True:
+        current = scan_uploads(watch_dir)
+        for path, (team_id, signature) in current.items():
+            # Only pick up files whose size and mtime held for one interval,
+            # so half-written uploads are not ingested
+            stable = previous.get(path, (None, None))[1] == signature
+            if stable and submitted.get(path) != signature:
+                submitted[path] = signature
+                pipeline.submit(path, team_id)
+        previous = current
+
+        if once and previous and all(path in submitted for path in previous):
+            pipeline.wait_idle()
+            return
+        if once and not previous and not pipeline.pending():
+            return
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background document ingestion")
+    parser.add_argument("--watch-dir", default=INGEST_WATCH_DIR)
+    parser.add_argument("--interval", type=float, default=INGEST_POLL_INTERVAL)
+    parser.add_argument(
+        "--once", action="store_true", help="Ingest current uploads, then exit"
+    )
+    args = parser.parse_args()
+
+    print(f"\n=== Document Ingestion Service ({datetime.now().isoformat()}) ===")
+    service = IngestionPipeline()
+    try:
+        watch(service, args.watch_dir, args.interval, once=args.once)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Stopping with {len(service.pending())} job(s) in flight")
@@ -1,7 +1,20 @@
 from typing import Dict, List, Optional, TypedDict
 
-from core.rag import model, rag_retrieval
+from config import REQUEST_BUDGET_SECONDS
+from core.budget import run_budgeted, start_budget
+from core.namespaces import namespace
+from core.prompts import query_payload, understand_payload
+from core.providers import prompt_model
+from core.query_builder import build_retrieval_query, needs_context_without_llm
+from core.rag import (
+    contextual_retrieval,
+    lookup_materialized,
+    materialized_doc_ids,
+)
+from core.resilience import UpstreamUnavailable, degraded_answer
+from core.scheduler import scheduling
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 
 
@@ -12,65 +25,57 @@ class ConversationState(TypedDict):
     messages: List[HumanMessage | AIMessage | SystemMessage]
     needs_pci_context: bool
     pci_context: Optional[str]
+    answered: bool
+    # What the previous retrieval found, reused by follow-up turns
+    last_doc_ids: List[str]
+    last_query_vector: Optional[List[float]]
+    # Latency budget of the current request and what each node spent of it
+    deadline: Optional[float]
+    budget_seconds: float
+    budget_log: List[Dict]
+
+
+def asked_question(messages: List) -> bool:
+    """True if the assistant's last message before the query asked something."""
+    for msg in reversed(messages[:-1]):
+        if isinstance(msg, AIMessage):
+            return str(msg.content).rstrip().endswith("?")
+    return False
+
+
+def serve_materialized(state: Dict) -> Dict:
+    """Answer pure requirement lookups from answers precomputed at index time"""
+    query = str(state["messages"][-1].content)
+    try:
+        # A number replying to the assistant's question is not a lookup
+        answer = (
+            None if asked_question(state["messages"]) else lookup_materialized(query)
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        answer = None
+
+    state["answered"] = bool(answer)
+    if answer:
+        state["messages"].append(AIMessage(content=answer))
+        # Follow-ups about this requirement reuse its chunks
+        state["last_doc_ids"] = materialized_doc_ids(query)
+        state["last_query_vector"] = None
+    return state
 
 
 def understand_query(state: Dict) -> Dict:
     """LLM determines if query needs security standards context"""
     try:
         query = state["messages"][-1]
-        previous_messages = state["messages"][:-1]
-
-        conversation_context = "\n".join(
-            [
-                f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg}"
-                for msg in previous_messages[-3:]
-                if isinstance(msg, (HumanMessage, AIMessage))
-            ]
-        )
-
-        prompt = f"""You are Dexter.ai, a friendly and knowledgeable security and compliance consultant. Your task is to determine if the query needs specific security standard information to provide an accurate response.
-
-CONVERSATION HISTORY:
-{conversation_context}
-
-CURRENT QUERY: "{query}"
-
-ANALYSIS FRAMEWORK:
-1. Security Standard References
-   - Mentions of specific standards (PCI DSS, ISO, NIST, etc.)
-   - Questions about compliance requirements
-   - Implementation or audit queries
-
-2. Security Context Indicators
-   - Questions about security controls
-   - Infrastructure or architecture queries
-   - Risk management considerations
-
-3. Follow-up Analysis
-   - Requests for more details
-   - Questions building on previous topics
-   - Indications of incomplete information
+        payload = understand_payload(state["messages"])
 
-4. Technical Requirements
-   - Implementation questions
-   - Configuration queries
-   - Best practices inquiries
-
-DECISION CRITERIA:
-- Output 'true' if:
-  * Query relates to security standards
-  * Technical implementation details needed
-  * Compliance guidance required
-  * Security best practices requested
-- Output 'false' for:
-  * General greetings
-  * Personal questions
-  * Non-security topics
-
-OUTPUT: Respond with only 'true' or 'false'"""
-
-        response = model.generate_content(prompt)
-        needs_context = response.text.strip().lower() == "true"
+        try:
+            response = prompt_model("understand").generate_content(payload)
+            needs_context = response.text.strip().lower() == "true"
+        except UpstreamUnavailable as e:
+            print(f"⚠️ Classifying query without the LLM: {e}")
+            needs_context = needs_context_without_llm(str(query.content))
 
         state["needs_pci_context"] = needs_context
         return state
@@ -84,50 +89,17 @@ def get_pci_context(state: Dict) -> Dict:
     """RAG tool to retrieve relevant security standards context"""
     try:
         if state["needs_pci_context"]:
-            current_query = state["messages"][-1]
-            previous_messages = state["messages"][:-1]
-
-            recent_conversation = "\n".join(
-                [
-                    f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg}"
-                    for msg in previous_messages[-3:]
-                    if isinstance(msg, (HumanMessage, AIMessage))
-                ]
-            )
-
-            enhanced_query = f"""CONTEXT RETRIEVAL QUERY
-
-CONVERSATION HISTORY:
-{recent_conversation}
-
-CURRENT QUERY: "{current_query}"
+            # Embed only the question plus compact recent-turn context
+            retrieval_query = build_retrieval_query(state["messages"])
 
-SEARCH OBJECTIVES:
-1. Exact Requirements
-   - Find exact requirement numbers and text
-   - Locate specific testing procedures
-   - Identify precise guidance sections
-
-2. Supporting Information
-   - Related requirements
-   - Implementation guidance
-   - Testing procedures
-   - Applicability notes
-
-3. Version Information
-   - Standard version
-   - Requirement updates
-   - Implementation dates
-
-4. Technical Details
-   - Specific parameters
-   - Configuration details
-   - Technical specifications
-
-FOCUS: Find exact matches from the standards, including requirement text, testing procedures, and guidance."""
-
-            context = rag_retrieval(enhanced_query)
-            state["pci_context"] = context
+            retrieval = contextual_retrieval(
+                retrieval_query,
+                state.get("last_doc_ids"),
+                state.get("last_query_vector"),
+            )
+            state["pci_context"] = retrieval["context"]
+            state["last_doc_ids"] = retrieval["doc_ids"]
+            state["last_query_vector"] = retrieval["query_vector"]
         return state
     except Exception as e:
         state["pci_context"] = f"Error: {e}"
@@ -140,74 +112,21 @@ def generate_response(state: Dict) -> Dict:
         query = state["messages"][-1]
 
         if state["needs_pci_context"] and state["pci_context"]:
-            prompt = f"""You are Dexter.ai, a helpful and friendly consultant. You provide accurate information from security standards while maintaining a natural conversation style.
-
-QUERY: "{query}"
-
-RETRIEVED INFORMATION:
-{state["pci_context"]}
-
-Response Guidelines:
-1. Source Transparency
-   - Always mention when you're quoting directly from standards
-   - Specify which version/section you're referencing
-   - Acknowledge if information is from supplementary guidance
-
-2. Information Accuracy
-   - Quote exact requirement numbers and text
-   - Don't fill in gaps with assumptions
-   - If information is incomplete, say so
-   - Offer to look up additional details if needed
-
-3. Clarity
-   - Explain technical terms
-   - Use examples when helpful
-   - Break down complex requirements
-   - Keep the tone conversational
-
-4. Knowledge Boundaries
-   - If you're not sure, say so
-   - Don't make up information
-   - Offer to find more specific details
-   - Be clear about what's official vs. guidance
-
-Keep your tone:
-- Natural and friendly
-- Clear about sources
-- Honest about limitations
-- Helpful without overstepping"""
+            kind = "answer_context"
+            payload = query_payload(str(query.content), state["pci_context"])
         else:
-            prompt = f"""You are Dexter.ai, a helpful and friendly consultant. You're knowledgeable about security and compliance but maintain a natural conversation style.
-
-QUERY: "{query}"
-
-Guidelines:
-1. Natural Conversation
-   - Keep responses casual and friendly
-   - Don't introduce yourself repeatedly
-   - Respond naturally to greetings
-   - Stay conversational
-
-2. Knowledge Boundaries
-   - Be clear about what you know
-   - Don't make assumptions
-   - Offer to look up specific details
-   - Be honest about limitations
-
-3. Helpful Guidance
-   - Suggest relevant topics
-   - Offer to explore specific areas
-   - Guide without being pushy
-   - Keep it simple and clear
-
-Remember:
-- Stay natural and friendly
-- Be honest about what you know
-- Don't repeat generic phrases
-- Keep the conversation flowing naturally"""
-
-        response = model.generate_content(prompt)
-        state["messages"].append(AIMessage(content=response.text.strip()))
+            kind = "answer_general"
+            payload = query_payload(str(query.content))
+
+        try:
+            text = prompt_model(kind).generate_content(payload).text.strip()
+        except UpstreamUnavailable as e:
+            print(f"⚠️ Responding without the LLM: {e}")
+            # The retrieval answer (itself degraded if the LLM was already
+            # down) is the best reply available
+            context = state["pci_context"] if state["needs_pci_context"] else None
+            text = context or degraded_answer("")
+        state["messages"].append(AIMessage(content=text))
         return state
 
     except Exception as e:
@@ -220,16 +139,95 @@ Remember:
         return state
 
 
+def fair_node(node):
+    """Attribute a node's upstream calls to the conversation's team or thread.
+
+    The scheduler admits waiting calls from different tenants in turn, so a
+    busy team cannot starve other conversations. A team_id also lets the
+    node search that team's own document index next to the shared corpus.
+    """
+
+    def run(state: Dict, config: RunnableConfig) -> Dict:
+        configurable = (config or {}).get("configurable", {})
+        team_id = configurable.get("team_id")
+        tenant = team_id or configurable.get("thread_id")
+        with scheduling(tenant=str(tenant) if tenant else None):
+            if not team_id:
+                return node(state)
+            with namespace(team_id):
+                return node(state)
+
+    return run
+
+
+def begin_request(node):
+    """Start the request's latency budget before running its first node.
+
+    The budget is REQUEST_BUDGET_SECONDS unless the run config sets
+    `budget_seconds` (0 disables it).
+    """
+
+    def run(state: Dict, config: RunnableConfig) -> Dict:
+        configurable = (config or {}).get("configurable", {})
+        start_budget(
+            state, float(configurable.get("budget_seconds", REQUEST_BUDGET_SECONDS))
+        )
+        return node(state, config)
+
+    return run
+
+
+def budgeted(name: str, node, on_overrun):
+    """Run a node within its slice of the request budget (see core.budget)."""
+
+    def run(state: Dict, config: RunnableConfig) -> Dict:
+        return run_budgeted(name, lambda s: node(s, config), state, on_overrun)
+
+    return run
+
+
+def classify_overrun(state: Dict) -> Dict:
+    """Classification ran out of time: take the retrieval path."""
+    state["needs_pci_context"] = True
+    return state
+
+
+def retrieval_overrun(state: Dict) -> Dict:
+    """Retrieval ran out of time: generate without context."""
+    state["pci_context"] = None
+    return state
+
+
+def generation_overrun(state: Dict) -> Dict:
+    """Generation ran out of time: reply with the retrieved context, if any."""
+    context = state["pci_context"] if state["needs_pci_context"] else None
+    state["messages"].append(AIMessage(content=context or degraded_answer("")))
+    return state
+
+
 # Initialize the graph
 workflow = StateGraph(ConversationState)
 
 # Add nodes
-workflow.add_node("understand", understand_query)
-workflow.add_node("get_context", get_pci_context)
-workflow.add_node("generate_response", generate_response)
+workflow.add_node("materialized", begin_request(fair_node(serve_materialized)))
+workflow.add_node(
+    "understand", budgeted("understand", fair_node(understand_query), classify_overrun)
+)
+workflow.add_node(
+    "get_context",
+    budgeted("get_context", fair_node(get_pci_context), retrieval_overrun),
+)
+workflow.add_node(
+    "generate_response",
+    budgeted("generate_response", fair_node(generate_response), generation_overrun),
+)
 
 # Define conditional edges
-workflow.add_edge(START, "understand")
+workflow.add_edge(START, "materialized")
+workflow.add_conditional_edges(
+    "materialized",
+    lambda state: END if state["answered"] else "understand",
+)
 workflow.add_conditional_edges(
     "understand",
     lambda state: "get_context" if state["needs_pci_context"] else "generate_response",
@@ -0,0 +1,173 @@
+"""Count input tokens per LLM call before and after the prompt split.
+
+"Before" is one prompt per call carrying the whole static instruction
+block. It also carried the untrimmed history and the repr of the message
+objects, as the old f-strings did. "After" is the static system
+instruction plus the minimal dynamic payload. With a context cache, only
+the payload is uncached input. A short conversation runs through the
+understand and answer prompts, and each analysis tool runs once. Chunks come from the published index.
+
+    LLM_PROVIDER=fake python prompt_token_report.py
+    python prompt_token_report.py --encoding o200k_base --output tokens.json
+
+Gemini tokenizes differently, so the counts are a local proxy; the
+relative reduction is what matters.
+"""
+
+import argparse
+import json
+from typing import Callable, Dict, List, Tuple
+
+import tiktoken
+from core.prompts import (
+    SYSTEM_INSTRUCTIONS,
+    query_payload,
+    tool_kind,
+    tool_payload,
+    understand_payload,
+)
+from core.scheduler import estimate_tokens
+from langchain_core.messages import AIMessage, HumanMessage
+
+CONVERSATION = [
+    "What does PCI DSS require for multi-factor authentication?",
+    "What about the testing procedures for that?",
+    "How long must audit logs be retained?",
+]
+TOOL_INPUTS = {
+    "compliance": "MFA for all remote network access originating outside the CDE",
+    "policy": "access control",
+    "risk": "Payment page served from a third-party CDN",
+    "implementation": "Requirement 8.4.2",
+}
+# Calls made by a chat turn that needs the standards
+CHAT_KINDS = ("understand", "rag", "answer_context")
+# Stand-in for an answer, long enough to show the history trimming
+ANSWER = (
+    "According to PCI DSS v4.0 requirement 8.4.2 (Page 187), MFA is required "
+    "for all non-console access into the CDE. "
+) * 12
+
+
+def token_counter(encoding_name: str) -> Tuple[Callable[[str], int], str]:
+    """A local tokenizer, or the character estimate if its data cannot load."""
+    try:
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        print(f"⚠️ tiktoken {encoding_name} unavailable ({str(e)[:80]})")
+        print("   Falling back to the four-characters-per-token estimate")
+        return estimate_tokens, "chars/4 estimate"
+    return lambda text: len(encoding.encode(text)), f"tiktoken {encoding_name}"
+
+
+def _legacy_understand(messages: List) -> str:
+    history = "\n".join(
+        f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg}"
+        for msg in messages[:-1][-3:]
+    )
+    return f'CONVERSATION HISTORY:\n{history}\n\nCURRENT QUERY: "{messages[-1]}"'
+
+
+def collect_calls() -> List[Dict]:
+    """Kind, legacy payload and payload of every LLM call in the scenario."""
+    from core.query_builder import build_retrieval_query
+    from core.rag import format_context, retrieve
+
+    calls = []
+    messages: List = []
+    for turn in CONVERSATION:
+        messages.append(HumanMessage(content=turn))
+        calls.append(
+            {
+                "kind": "understand",
+                "before": _legacy_understand(messages),
+                "after": understand_payload(messages),
+            }
+        )
+        # Retrieval answers the embedded query from the formatted chunks
+        query = build_retrieval_query(messages)
+        payload = query_payload(query, format_context(retrieve(query)))
+        calls.append({"kind": "rag", "before": payload, "after": payload})
+        # The final answer sees the retrieval answer as its context
+        calls.append(
+            {
+                "kind": "answer_context",
+                "before": query_payload(str(messages[-1]), ANSWER),
+                "after": query_payload(turn, ANSWER),
+            }
+        )
+        messages.append(AIMessage(content=ANSWER))
+
+    for analysis, value in TOOL_INPUTS.items():
+        docs = retrieve(value)
+        context = "\n\n".join(doc.page_content for doc in docs)
+        payload = tool_payload(analysis, value, context)
+        calls.append(
+            {"kind": tool_kind(analysis, context), "before": payload, "after": payload}
+        )
+    return calls
+
+
+def run_report(encoding_name: str, output: str = "") -> Dict:
+    count, tokenizer = token_counter(encoding_name)
+    static = {kind: count(text) for kind, text in SYSTEM_INSTRUCTIONS.items()}
+    rows = []
+    for call in collect_calls():
+        kind = call["kind"]
+        rows.append(
+            {
+                "kind": kind,
+                "static": static[kind],
+                "before": static[kind] + count(call["before"]),
+                "after_inline": static[kind] + count(call["after"]),
+                "after_cached": count(call["after"]),
+            }
+        )
+
+    print(f"\n🔤 Tokenizer: {tokenizer}")
+    print(f"\n{'call':<26} {'static':>7} {'before':>8} {'after':>8} {'uncached':>9}")
+    for row in rows:
+        print(
+            f"{row['kind']:<26} {row['static']:>7} {row['before']:>8} "
+            f"{row['after_inline']:>8} {row['after_cached']:>9}"
+        )
+
+    turns = [row for row in rows if row["kind"] in CHAT_KINDS]
+    per_turn = {
+        key: round(sum(row[key] for row in turns) / len(CONVERSATION))
+        for key in ("before", "after_inline", "after_cached")
+    }
+    summary = {
+        "tokenizer": tokenizer,
+        "static_tokens": static,
+        "per_turn": per_turn,
+        "per_turn_reduction": round(
+            1 - per_turn["after_inline"] / per_turn["before"], 3
+        ),
+        "per_turn_reduction_cached": round(
+            1 - per_turn["after_cached"] / per_turn["before"], 3
+        ),
+        "calls": rows,
+    }
+    print(
+        f"\n📊 Chat turn input: {per_turn['before']} tokens before, "
+        f"{per_turn['after_inline']} with instructions inline "
+        f"(-{100 * summary['per_turn_reduction']:.0f}%), "
+        f"{per_turn['after_cached']} uncached with a context cache "
+        f"(-{100 * summary['per_turn_reduction_cached']:.0f}%)"
+    )
+    if output:
+        with open(output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Report written to {output}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt token report")
+    parser.add_argument("--encoding", default="cl100k_base")
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    print("\n=== Prompt Token Report ===")
+    run_report(args.encoding, args.output)
@@ -0,0 +1,162 @@
+"""Compare compact vector representations on the published index.
+
+For every combination of embedding dimensions and quantization method this
+reports index memory against the float32 baseline and recall@k against exact
+full-dimension search, with and without exact re-scoring of the candidates.
+
+    python quantization_report.py --queries golden_queries.jsonl --k 5
+    python quantization_report.py --dimensions 1536 512 256 --methods fp16 sq8 pq
+
+The golden query file is JSONL with a "query" field per line. Without it, a
+sample of stored chunk vectors with added noise is used as synthetic queries.
+Reduced dimensions are simulated by truncating and re-normalising the stored
+vectors, which is what the `dimensions` parameter of text-embedding-3 does.
+"""
+
+import argparse
+import json
+import os
+from typing import List
+
+import faiss
+import numpy as np
+from config import INDEX_RESCORE_FACTOR
+from core.index_manager import current_index_version
+from core.providers import build_embeddings
+from core.quantization import (
+    QUANTIZATION_METHODS,
+    index_bytes,
+    load_exact_vectors,
+    quantize_vectors,
+    reduce_dimensions,
+    rescore,
+)
+from core.shards import SHARDS_DIR
+
+
+def load_corpus_vectors(index_path: str) -> np.ndarray:
+    """Collect full-precision vectors from every shard of an index version."""
+    shards_path = os.path.join(index_path, SHARDS_DIR)
+    paths = (
+        [os.path.join(shards_path, name) for name in sorted(os.listdir(shards_path))]
+        if os.path.isdir(shards_path)
+        else [index_path]
+    )
+
+    matrices = []
+    for path in paths:
+        exact = load_exact_vectors(path)
+        if exact is not None:
+            matrices.append(np.asarray(exact))
+            continue
+        index = faiss.read_index(os.path.join(path, "index.faiss"))
+        if not isinstance(index, faiss.IndexFlat):
+            raise ValueError(f"{path} is quantized and has no exact vectors saved")
+        matrices.append(index.reconstruct_n(0, index.ntotal))
+    return np.vstack(matrices).astype(np.float32)
+
+
+def load_queries(queries_path: str, vectors: np.ndarray, sample: int) -> np.ndarray:
+    """Embed the golden queries, or derive noisy synthetic ones from the corpus."""
+    if queries_path:
+        with open(queries_path, encoding="utf-8") as f:
+            texts = [json.loads(line)["query"] for line in f if line.strip()]
+        embedded = np.asarray(build_embeddings().embed_documents(texts), np.float32)
+        return embedded[:, : vectors.shape[1]]
+
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)
+    noisy = vectors[picks] + rng.normal(scale=0.02, size=vectors[picks].shape)
+    return reduce_dimensions(noisy.astype(np.float32), vectors.shape[1])
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Share of the exact top-k that the approximate search also returned."""
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def run_report(
+    queries_path: str,
+    k: int,
+    dimensions: List[int],
+    methods: List[str],
+    sample: int,
+) -> List[dict]:
+    version, index_path = current_index_version()
+    vectors = load_corpus_vectors(index_path)
+    queries = load_queries(queries_path, vectors, sample)
+    k = min(k, len(vectors))
+    print(
+        f"📊 Index {version or 'legacy'}: {len(vectors)} vectors x {vectors.shape[1]} dims, "
+        f"{len(queries)} {'golden' if queries_path else 'synthetic'} queries, k={k}"
+    )
+
+    baseline = quantize_vectors(vectors, "none")
+    baseline_bytes = index_bytes(baseline)
+    _, truth = baseline.search(queries, k)
+
+    rows = []
+    for dims in sorted({min(d, vectors.shape[1]) for d in dimensions}, reverse=True):
+        base = reduce_dimensions(vectors, dims)
+        reduced_queries = reduce_dimensions(queries, dims)
+        for method in methods:
+            index = quantize_vectors(base, method)
+            size = index_bytes(index)
+            _, found = index.search(reduced_queries, k)
+
+            fetch_k = min(k * INDEX_RESCORE_FACTOR, len(vectors))
+            _, candidates = index.search(reduced_queries, fetch_k)
+            _, rescored = rescore(reduced_queries, candidates, base)
+
+            rows.append(
+                {
+                    "dimensions": dims,
+                    "method": method,
+                    "bytes": size,
+                    "bytes_per_vector": round(size / len(vectors), 1),
+                    "memory_saved": round(1 - size / baseline_bytes, 3),
+                    "recall": round(recall_at_k(found, truth), 3),
+                    "recall_rescored": round(recall_at_k(rescored[:, :k], truth), 3),
+                }
+            )
+
+    print(
+        f"\n{'dims':>6} {'method':>6} {'bytes/vec':>10} {'saved':>7} "
+        f"{'recall@k':>9} {'rescored':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['dimensions']:>6} {row['method']:>6} {row['bytes_per_vector']:>10} "
+            f"{row['memory_saved']:>7.1%} {row['recall']:>9.3f} "
+            f"{row['recall_rescored']:>9.3f}"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantization memory/recall report")
+    parser.add_argument("--queries", help="Golden query JSONL with a 'query' field")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument(
+        "--dimensions", type=int, nargs="+", default=[1536, 1024, 512, 256]
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        choices=QUANTIZATION_METHODS,
+        default=list(QUANTIZATION_METHODS),
+    )
+    parser.add_argument(
+        "--sample", type=int, default=100, help="Synthetic queries without --queries"
+    )
+    parser.add_argument("--output", help="Optional JSON file for the report rows")
+    args = parser.parse_args()
+
+    print("\n=== Vector Quantization Report ===")
+    report = run_report(
+        args.queries, args.k, args.dimensions, args.methods, args.sample
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
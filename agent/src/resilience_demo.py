@@ -0,0 +1,156 @@
+"""Compare upstream resilience settings against a faulty fake provider.
+
+The fake model fails a share of calls with a transient error and answers
+another share slowly. Each configuration makes the same number of calls and
+reports p50/p95/p99 latency and error rate: raw calls, retries with jittered
+backoff, and retries plus hedged requests. A final run with a dead upstream
+shows the circuit breaker opening and the degraded answer users get instead.
+
+    python resilience_demo.py --calls 200 --error-rate 0.05 --slow-rate 0.05
+"""
+
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[math.ceil(fraction * len(ordered)) - 1] if ordered else 0.0
+
+
+def run_config(label: str, caller, model, calls: int, workers: int) -> Dict:
+    from core.resilience import UpstreamUnavailable
+
+    def one(i: int):
+        started = time.perf_counter()
+        try:
+            caller.call(model.generate_content, f"question {i}")
+            ok = True
+        except (UpstreamUnavailable, ConnectionError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    # Warm the latency tracker so hedging has a p95 to work from
+    for i in range(caller.latency.min_samples):
+        try:
+            caller.call(model.generate_content, f"warmup {i}")
+        except Exception:
+            pass
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(one, range(calls)))
+    ordered = sorted(seconds for seconds, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    row = {
+        "config": label,
+        "p50_ms": round(1000 * _percentile(ordered, 0.50), 1),
+        "p95_ms": round(1000 * _percentile(ordered, 0.95), 1),
+        "p99_ms": round(1000 * _percentile(ordered, 0.99), 1),
+        "error_rate": round(errors / calls, 4),
+        "retries": caller.stats["retries"],
+        "hedges": caller.stats["hedges"],
+        "hedge_wins": caller.stats["hedge_wins"],
+    }
+    print(
+        f"   {label:<18} p50 {row['p50_ms']:>7} ms  p95 {row['p95_ms']:>7} ms  "
+        f"p99 {row['p99_ms']:>7} ms  errors {100 * row['error_rate']:5.1f}%  "
+        f"retries {row['retries']}  hedges {row['hedges']} "
+        f"(won {row['hedge_wins']})"
+    )
+    return row
+
+
+def run_demo(
+    calls: int,
+    workers: int,
+    latency_ms: float,
+    error_rate: float,
+    slow_rate: float,
+    slow_ms: float,
+) -> List[Dict]:
+    # Imported lazily so the fake provider is selected before config loads
+    from core.providers import FakeGenerativeModel
+    from core.resilience import (
+        CircuitBreaker,
+        ResilientCaller,
+        UpstreamUnavailable,
+        degraded_answer,
+    )
+
+    def faulty() -> FakeGenerativeModel:
+        # Same seed for every configuration so they face the same faults
+        return FakeGenerativeModel(
+            latency=latency_ms / 1000,
+            error_rate=error_rate,
+            slow_rate=slow_rate,
+            slow_latency=slow_ms / 1000,
+            seed=7,
+        )
+
+    def breaker() -> CircuitBreaker:
+        # Keep the breaker out of the way while measuring tail latency
+        return CircuitBreaker("demo", failure_threshold=calls + 1)
+
+    configs = [
+        ("raw", ResilientCaller("raw", attempts=1, hedge=False, breaker=breaker())),
+        ("retries", ResilientCaller("retries", hedge=False, breaker=breaker())),
+        ("retries+hedging", ResilientCaller("hedged", hedge=True, breaker=breaker())),
+    ]
+    print(f"\n{calls} calls, {workers} workers, {latency_ms:.0f} ms typical latency")
+    print(
+        f"{100 * error_rate:.0f}% transient errors, "
+        f"{100 * slow_rate:.0f}% slow calls at {slow_ms:.0f} ms\n"
+    )
+    rows = [
+        run_config(label, caller, faulty(), calls, workers) for label, caller in configs
+    ]
+
+    print("\nCircuit breaker against a dead upstream:")
+    dead = FakeGenerativeModel(latency=latency_ms / 1000, error_rate=1.0)
+    caller = ResilientCaller(
+        "dead",
+        attempts=2,
+        hedge=False,
+        breaker=CircuitBreaker("dead", failure_threshold=4, reset_seconds=60),
+    )
+    for i in range(5):
+        started = time.perf_counter()
+        try:
+            caller.call(dead.generate_content, f"question {i}")
+        except UpstreamUnavailable as e:
+            print(
+                f"   call {i}: {e} "
+                f"({1000 * (time.perf_counter() - started):.0f} ms, "
+                f"circuit {caller.breaker.state})"
+            )
+    print("\nDegraded answer:")
+    print(degraded_answer("📄 [requirement 8.3.1] (PCI DSS v4.0, Page 180) ..."))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upstream resilience demo")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    # Short backoff so the demo runs in seconds
+    os.environ.setdefault("LLM_RETRY_BASE_DELAY", "0.02")
+
+    print("\n=== Upstream Resilience Demo ===")
+    run_demo(
+        args.calls,
+        args.workers,
+        args.latency_ms,
+        args.error_rate,
+        args.slow_rate,
+        args.slow_ms,
+    )
@@ -1,16 +1,51 @@
+import argparse
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 import PyPDF2
 from config.config import (
     DATA_DIR,
     EMBEDDING_MODEL_NAME,
-    FAISS_INDEX_PATH,
-    OPENAI_API_KEY,
-    PDF_PATH,
+    FAISS_INDEX_DIR,
+    INDEX_DEDUP,
+    INDEX_QUANTIZATION,
+    INDEX_SHARD_STRATEGY,
+    INDEX_WORKERS,
+    INPUT_DIR,
+    MATERIALIZE_ANSWERS,
+    TEAM_INPUT_DIR,
 )
+from core.answers import load_answers, materialize_answers, save_answers
+from core.dedup import collapse_near_duplicates
 from core.document_processor import DocumentProcessor
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+from core.index_manager import (
+    current_index_version,
+    new_index_version,
+    publish_index_version,
+)
+from core.local_embeddings import (
+    LOCAL_EMBEDDING_FILE,
+    LOCAL_EMBEDDING_MODEL,
+    embeddings_for_index,
+    fit_local_embeddings,
+    store_with_index,
+)
+from core.namespaces import team_index_dir
+from core.providers import build_embeddings, build_model
+from core.quantization import QUANTIZATION_METHODS
+from core.requirement_graph import (
+    build_requirement_graph,
+    graph_stats,
+    save_requirement_graph,
+)
+from core.query_builder import compute_topic_centroids, save_topic_centroids
+from core.shards import save_index
+
+MANIFEST_FILE = "manifest.json"
 
 
 def process_pdf(pdf_path: str) -> str:
@@ -34,72 +69,293 @@ def process_pdf(pdf_path: str) -> str:
     return text
 
 
-def create_faiss_index():
-    """Create FAISS index from PDF content."""
+def discover_documents(input_dir: str = INPUT_DIR) -> List[str]:
+    """List every PDF directly inside the input directory."""
+    return sorted(
+        str(path)
+        for path in Path(input_dir).iterdir()
+        if path.is_file() and path.suffix.lower() == ".pdf"
+    )
+
+
+def process_document(pdf_path: str) -> Dict:
+    """Extract and section one PDF; runs in a worker process."""
+    started = time.perf_counter()
+    processor = DocumentProcessor(pdf_path, verbose=False)
+    json_data = processor.convert_to_json()
+    return {
+        "path": pdf_path,
+        "json": json_data,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def build_chunks(json_data: Dict) -> Tuple[List[str], List[Dict]]:
+    """Turn one processed document into chunk texts with tagged metadata."""
+    chunks = []
+    metadata_list = []
+    document_metadata = {
+        "document": json_data["document_name"],
+        "standard": json_data["metadata"]["standard"],
+        "version": json_data["metadata"]["version"],
+    }
+
+    # Process each requirement; its content is the header plus an outline
+    for req in json_data.get("requirements", []):
+        chunks.append(req.get("content", ""))
+        metadata_list.append(
+            {
+                "type": req.get("type", "requirement"),
+                "number": req.get("number", "unknown"),
+                "title": req.get("title", "unknown"),
+                "page": req.get("page", "N/A"),
+                "section": req.get("section", ""),
+                **document_metadata,
+            }
+        )
+
+        # Sub-requirements and testing procedures become small standalone
+        # chunks, prefixed with their section so short items still embed well
+        for subreq in req.get("subrequirements", []):
+            subreq_text = f"{subreq.get('section', '')}\n\n{subreq.get('number', 'unknown')} {subreq.get('content', '')}"
+            chunks.append(subreq_text)
+            metadata = {
+                "type": subreq.get("type", "subrequirement"),
+                "number": subreq.get("number", "unknown"),
+                "parent_requirement": subreq.get(
+                    "parent_requirement", req.get("number", "unknown")
+                ),
+                "requirement": req.get("number", "unknown"),
+                "title": subreq.get("title", "unknown"),
+                "page": subreq.get("page", "N/A"),
+                "section": subreq.get("section", ""),
+                **document_metadata,
+            }
+            if subreq.get("milestone"):
+                metadata["milestone"] = subreq["milestone"]
+            metadata_list.append(metadata)
+
+    return chunks, metadata_list
+
+
+def process_corpus(pdf_paths: List[str], workers: int = INDEX_WORKERS) -> List[Dict]:
+    """Process PDFs in parallel worker processes, reporting per-file progress."""
+    results = []
+    failures = []
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(pdf_paths)))) as pool:
+        futures = {pool.submit(process_document, path): path for path in pdf_paths}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = os.path.basename(futures[future])
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append(name)
+                print(f"   ✗ [{done}/{len(pdf_paths)}] {name}: {str(e)}")
+                continue
+            metadata = result["json"]["metadata"]
+            print(
+                f"   ✓ [{done}/{len(pdf_paths)}] {name}: "
+                f"{metadata['standard']} v{metadata['version']}, "
+                f"{len(result['json']['requirements'])} sections "
+                f"in {result['seconds']:.1f}s"
+            )
+            results.append(result)
+
+    if failures:
+        print(f"⚠️ {len(failures)} document(s) failed: {', '.join(failures)}")
+
+    # Keep a stable chunk order regardless of completion order
+    return sorted(results, key=lambda result: result["path"])
+
+
+def write_manifest(index_path: str, manifest: Dict) -> None:
+    """Record how an index version was built alongside its files."""
+    with open(os.path.join(index_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def create_faiss_index(
+    quantization: str = INDEX_QUANTIZATION,
+    answers: bool = MATERIALIZE_ANSWERS,
+    team_id: Optional[str] = None,
+    refit_embeddings: bool = False,
+    dedup: bool = INDEX_DEDUP,
+):
+    """Create one FAISS index from every PDF in INPUT_DIR.
+
+    With a team_id, index that team's uploads from TEAM_INPUT_DIR/<team_id>
+    into its own namespace instead. Team indexes reuse the shared topic
+    centroids and answers, so neither is computed for them.
+
+    With the local embedding model, the shared corpus is also what the model
+    is fitted on: the first build fits it, later builds reuse it unless
+    `refit_embeddings` is set.
+
+    With `dedup`, near-duplicate chunks are collapsed before embedding;
+    answers are still materialized from every chunk.
+    """
     try:
         # Ensure data directory exists
         os.makedirs(DATA_DIR, exist_ok=True)
 
-        # Process PDF into structured JSON
-        processor = DocumentProcessor(PDF_PATH)
-        json_data = processor.convert_to_json()
-        print(
-            f"✅ PDF processed into structured JSON: {len(json_data['requirements'])} requirements found"
-        )
+        input_dir, index_dir = INPUT_DIR, FAISS_INDEX_DIR
+        if team_id:
+            input_dir = os.path.join(TEAM_INPUT_DIR, team_id)
+            index_dir = team_index_dir(team_id)
+            answers = False
+            if not os.path.isdir(input_dir):
+                print(f"❌ No uploads directory for team {team_id}: {input_dir}")
+                return
+
+        pdf_paths = discover_documents(input_dir)
+        if not pdf_paths:
+            print(f"❌ No PDF documents found in {input_dir}")
+            return
+        print(f"📚 Found {len(pdf_paths)} document(s) in {input_dir}")
+
+        # Process PDFs into structured JSON in parallel
+        results = process_corpus(pdf_paths)
 
         # Prepare chunks with metadata
         chunks = []
         metadata_list = []
-
-        # Process each requirement
-        for req in json_data.get("requirements", []):
-            print(f"Processing requirement {req.get('number', 'unknown')}")
-            # Main requirement chunk
-            req_text = f"Requirement {req.get('number', 'unknown')}: {req.get('title', 'unknown')}\n\n{req.get('content', '')}"
-            chunks.append(req_text)
-            metadata_list.append(
-                {
-                    "type": "requirement",
-                    "number": req.get("number", "unknown"),
-                    "title": req.get("title", "unknown"),
-                    "version": json_data["metadata"]["version"],
-                }
+        timings = []
+        for result in results:
+            doc_chunks, doc_metadata = build_chunks(result["json"])
+            chunks.extend(doc_chunks)
+            metadata_list.extend(doc_metadata)
+            timings.append(
+                (os.path.basename(result["path"]), result["seconds"], len(doc_chunks))
             )
 
-            # Process subrequirements
-            for subreq in req.get("subrequirements", []):
-                print(f"  Processing subrequirement {subreq.get('number', 'unknown')}")
-                subreq_text = f"{subreq.get('number', 'unknown')} {subreq.get('title', 'unknown')}\n\n{subreq.get('content', '')}"
-                chunks.append(subreq_text)
-                metadata_list.append(
-                    {
-                        "type": "subrequirement",
-                        "number": subreq.get("number", "unknown"),
-                        "parent_requirement": req.get("number", "unknown"),
-                        "title": subreq.get("title", "unknown"),
-                        "version": json_data["metadata"]["version"],
-                    }
-                )
-
         print(f"✅ Created {len(chunks)} structured chunks with metadata")
 
         if not chunks:
             print("❌ No chunks were created. Check the document processing.")
             return
 
+        index_chunks, index_metadata = chunks, metadata_list
+        dedup_report = None
+        if dedup:
+            print("\n🧹 Collapsing near-duplicate chunks...")
+            index_chunks, index_metadata, dedup_report = collapse_near_duplicates(
+                chunks, metadata_list
+            )
+            print(
+                f"✅ {dedup_report['chunks_before']} -> {dedup_report['chunks_after']} "
+                f"chunks ({dedup_report['collapsed_groups']} groups collapsed, "
+                f"-{100 * dedup_report['chunk_reduction']:.1f}%), "
+                f"{dedup_report['embedding_tokens_saved']} of "
+                f"{dedup_report['embedding_tokens_before']} embedding tokens saved "
+                f"(~${dedup_report['embedding_usd_saved']:.4f})"
+            )
+
         # Create embeddings
         print("\n🔤 Creating embeddings...")
-        embeddings = OpenAIEmbeddings(
-            model=EMBEDDING_MODEL_NAME, openai_api_key=OPENAI_API_KEY
+        # Start from the model of the serving shared version; team indexes
+        # are searched together with it, so they must share it
+        _, shared_path = current_index_version()
+        embeddings = embeddings_for_index(shared_path, build_embeddings())
+        local = EMBEDDING_MODEL_NAME == LOCAL_EMBEDDING_MODEL
+        if local and team_id and not embeddings.fitted:
+            print("❌ Build the shared index first to fit the local embeddings")
+            return
+
+        # Create and save FAISS index into a new version directory
+        version, index_path = new_index_version(index_dir)
+        if local and not team_id and (refit_embeddings or not embeddings.fitted):
+            # Vectors from an earlier fit no longer match; team indexes
+            # and ingested uploads must be rebuilt as well
+            embeddings = fit_local_embeddings(
+                index_chunks, os.path.join(index_path, LOCAL_EMBEDDING_FILE)
+            )
+        # The version carries its model, so serving loads the two together
+        store_with_index(embeddings, index_path)
+        print(f"\n💾 Creating FAISS index version {version} at: {index_path}")
+        embed_started = time.perf_counter()
+        vectors = embeddings.embed_documents(index_chunks)
+        shard_sizes = save_index(
+            index_path,
+            index_chunks,
+            vectors,
+            index_metadata,
+            embeddings,
+            quantization=quantization,
         )
+        embed_seconds = time.perf_counter() - embed_started
+        print(
+            f"✅ FAISS index created successfully with metadata "
+            f"({INDEX_SHARD_STRATEGY} sharding, {quantization} quantization)"
+        )
+        for name, size in sorted(shard_sizes.items()):
+            print(f"   {name}: {size} chunks")
+        if dedup_report:
+            # Float32 vectors not stored, before any quantization
+            removed = dedup_report["chunks_before"] - dedup_report["chunks_after"]
+            dedup_report["vector_bytes_saved"] = removed * len(vectors[0]) * 4
+            print(
+                f"   Collapsing duplicates kept {removed} vectors "
+                f"({dedup_report['vector_bytes_saved'] / 2**20:.2f} MB) out of the index"
+            )
+
+        # Link requirements by references, numbering and similar embeddings,
+        # so retrieval can add related requirements without more searches
+        print("\n🕸️ Building the requirement graph...")
+        graph = build_requirement_graph(index_chunks, vectors, index_metadata)
+        save_requirement_graph(index_path, graph)
+        stats = graph_stats(graph)
+        print(
+            "✅ Requirement graph saved: "
+            + ", ".join(f"{count} {kind}" for kind, count in stats.items())
+        )
+
+        if not team_id:
+            # Precompute topic centroids used to boost query vectors at search time
+            print("\n🧭 Computing topic centroids...")
+            save_topic_centroids(index_path, compute_topic_centroids(embeddings))
+            print("✅ Topic centroids saved with the index")
 
-        # Create and save FAISS index
-        print(f"\n💾 Creating FAISS index at: {FAISS_INDEX_PATH}")
-        vector_store = FAISS.from_texts(
-            texts=chunks, embedding=embeddings, metadatas=metadata_list
+        answer_count = 0
+        if answers:
+            # Reuse answers from the serving version whose chunk hash is unchanged
+            print("\n📝 Materializing per-requirement answers...")
+            answers_started = time.perf_counter()
+            _, previous_path = current_index_version()
+            materialized = materialize_answers(
+                chunks, metadata_list, build_model(), load_answers(previous_path)
+            )
+            save_answers(index_path, materialized)
+            answer_count = len(materialized)
+            print(
+                f"✅ Saved {answer_count} answers in "
+                f"{time.perf_counter() - answers_started:.1f}s"
+            )
+
+        write_manifest(
+            index_path,
+            {
+                "version": version,
+                "team": team_id,
+                "embedding_model": EMBEDDING_MODEL_NAME,
+                "dimensions": len(vectors[0]),
+                "shard_strategy": INDEX_SHARD_STRATEGY,
+                "quantization": quantization,
+                "shards": shard_sizes,
+                "documents": [os.path.basename(path) for path in pdf_paths],
+                "answers": answer_count,
+                "graph": stats,
+                "dedup": dedup_report,
+            },
         )
-        vector_store.save_local(FAISS_INDEX_PATH)
-        print("✅ FAISS index created successfully with metadata")
+
+        # Publish last so serving processes only ever see complete versions
+        publish_index_version(version, index_dir=index_dir)
+        print(f"🚀 Published index version {version}")
+
+        print("\n⏱️ Timing breakdown:")
+        for name, seconds, chunk_count in timings:
+            print(f"   {name}: {seconds:.1f}s extraction, {chunk_count} chunks")
+        print(f"   Embedding and indexing: {embed_seconds:.1f}s")
 
     except Exception as e:
         print(f"\n❌ Error creating FAISS index: {str(e)}")
@@ -107,6 +363,43 @@ def create_faiss_index():
 
 
 if __name__ == "__main__":
-    print("\n=== PCI DSS Document Indexing ===")
-    create_faiss_index()
+    parser = argparse.ArgumentParser(description="Build the security standards index")
+    parser.add_argument(
+        "--quantization",
+        choices=QUANTIZATION_METHODS,
+        default=INDEX_QUANTIZATION,
+        help="Compact vector representation for the FAISS shards",
+    )
+    parser.add_argument(
+        "--materialize-answers",
+        action=argparse.BooleanOptionalAction,
+        default=MATERIALIZE_ANSWERS,
+        help="Precompute a cited explanation for every requirement",
+    )
+    parser.add_argument(
+        "--dedup",
+        action=argparse.BooleanOptionalAction,
+        default=INDEX_DEDUP,
+        help="Collapse near-duplicate chunks before embedding",
+    )
+    parser.add_argument(
+        "--team",
+        help="Index this team's uploaded policies into its own namespace",
+    )
+    parser.add_argument(
+        "--refit-embeddings",
+        action="store_true",
+        help=f"Refit the {LOCAL_EMBEDDING_MODEL} model on the shared corpus "
+        "(team indexes must then be rebuilt)",
+    )
+    args = parser.parse_args()
+
+    print("\n=== Security Standards Document Indexing ===")
+    create_faiss_index(
+        quantization=args.quantization,
+        answers=args.materialize_answers,
+        team_id=args.team,
+        refit_embeddings=args.refit_embeddings,
+        dedup=args.dedup,
+    )
     print("\n✨ Setup complete! You can now run main.py to start the chatbot.")
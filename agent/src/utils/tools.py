@@ -1,11 +1,67 @@
+import contextvars
+import functools
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-
-from core.rag import model, retriever  # Import RAG components
+from typing import List, Optional
+
+from config import ASSESSMENT_MAX_WORKERS, TOOL_BUDGET_SECONDS
+from core.prompts import TOOL_INPUT_LABELS, tool_kind, tool_payload
+from core.providers import prompt_model
+from core.rag import batch_retrieve, retrieve  # Import RAG components
+from core.resilience import UpstreamUnavailable, deadline
+from core.scheduler import scheduling
 from langchain_core.tools import tool
 
 
+# Retrieval query of each analysis, filled in with the tool's input
+ANALYSIS_QUERIES = {
+    "compliance": "PCI DSS requirements and controls related to: {}",
+    "policy": "PCI DSS requirements and controls for {} policy",
+    "risk": "PCI DSS requirements and controls related to: {}",
+    "implementation": "PCI DSS implementation details for: {}",
+}
+
+
+def _batch_priority(func):
+    """Schedule a tool's upstream calls as batch work so chat turns go first.
+
+    All of the tool's upstream calls share one TOOL_BUDGET_SECONDS deadline;
+    calls past it fail fast into the tool's degraded response.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with scheduling(priority="batch"), deadline(TOOL_BUDGET_SECONDS):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _analyze(analysis: str, value: str, pci_dss_context: str):
+    """Run one analysis on the model bound to its static instructions."""
+    return prompt_model(tool_kind(analysis, pci_dss_context)).generate_content(
+        tool_payload(analysis, value, pci_dss_context)
+    )
+
+
+def _degraded_response(analysis: str, pci_dss_context: str) -> str:
+    """JSON answer carrying the retrieved context when the LLM is unavailable."""
+    return json.dumps(
+        {
+            "error": f"The language model is temporarily unavailable; {analysis} "
+            "could not be generated. The relevant PCI DSS excerpts are included.",
+            "degraded": True,
+            "pci_dss_context": pci_dss_context,
+            "timestamp": datetime.now().isoformat(),
+        },
+        indent=2,
+    )
+
+
 @tool
+@_batch_priority
 def compliance_checker(requirements: str) -> str:
     """
     Analyzes specific PCI DSS requirements and provides compliance guidance.
@@ -17,39 +73,18 @@ def compliance_checker(requirements: str) -> str:
     """
     try:
         # Get relevant PCI DSS context through RAG
-        docs = retriever.invoke(
-            f"PCI DSS requirements and controls related to: {requirements}"
-        )
+        docs = retrieve(ANALYSIS_QUERIES["compliance"].format(requirements))
 
         # Combine document contents for context
         pci_dss_context = (
             "\n\n".join([doc.page_content for doc in docs]) if docs else ""
         )
 
-        # Create analysis prompt with fallback to general knowledge
-        analysis_prompt = f"""You are Dexter.ai, a compliance specialist. Analyze the following PCI DSS requirements and provide a detailed compliance review. 
-
-Requirements to Check: {requirements}
-
-{f"PCI DSS Context: {pci_dss_context}" if pci_dss_context else "Note: Using general security and compliance knowledge."}
-
-Structure your response into the following sections:
-1. **Requirements Mapped**:
-   - {'''Clearly map each of the requirements to the relevant PCI DSS sections, indicating the section numbers and relevant clauses.''' if pci_dss_context else '''Map requirements to relevant security frameworks and standards (ISO 27001, NIST, etc.).'''}
-2. **Compliance Status**:
-   - Indicate whether the requirement is compliant, partially compliant, or non-compliant.
-   - For non-compliant sections, explain why.
-3. **Gap Analysis**:
-   - Identify any gaps between the requirements and the current state of compliance.
-4. **Implementation Recommendations**:
-   - Suggest actions, including controls, strategies, and technical specifications to close the gaps.
-5. **Detailed JSON Output**:
-   - Provide a detailed JSON response including the compliance status, gap analysis, and implementation guidance.
-
-{'''Use specific PCI DSS references and requirements.''' if pci_dss_context else '''Draw from general security frameworks and best practices.'''}"""
-
-        # Generate analysis using LLM
-        response = model.generate_content(analysis_prompt)
+        # Generate analysis using LLM, with fallback to general knowledge
+        try:
+            response = _analyze("compliance", requirements, pci_dss_context)
+        except UpstreamUnavailable:
+            return _degraded_response("the compliance analysis", pci_dss_context)
         return (
             response.text.strip()
             if response.text.strip()
@@ -71,6 +106,7 @@ Structure your response into the following sections:
 
 
 @tool
+@_batch_priority
 def policy_generator(policy_type: str) -> str:
     """
     Generates policy templates based on PCI DSS requirements or general security best practices.
@@ -82,44 +118,18 @@ def policy_generator(policy_type: str) -> str:
     """
     try:
         # Get relevant PCI DSS context through RAG
-        docs = retriever.invoke(
-            f"PCI DSS requirements and controls for {policy_type} policy"
-        )
+        docs = retrieve(ANALYSIS_QUERIES["policy"].format(policy_type))
 
         # Combine document contents for context
         pci_dss_context = (
             "\n\n".join([doc.page_content for doc in docs]) if docs else ""
         )
 
-        # Create policy generation prompt
-        policy_prompt = f"""You are Dexter.ai, creating a detailed policy for {'''PCI DSS compliance''' if pci_dss_context else "security compliance"}. 
-
-Policy Type: {policy_type}
-{f"PCI DSS Context: {pci_dss_context}" if pci_dss_context else "Note: Using general security and compliance knowledge."}
-
-**Policy Breakdown**:
-1. **Policy Overview**: 
-   - Provide an introduction to the policy's purpose and why it's critical for {'''PCI DSS compliance''' if pci_dss_context else "security compliance"}.
-
-2. **Scope and Applicability**: 
-   - Define who and what is affected by the policy.
-
-3. **Specific Requirements**: 
-   - {'''List the specific PCI DSS sections covered by this policy.''' if pci_dss_context else '''List the specific security requirements and standards covered by this policy.'''}
-
-4. **Governance**: 
-   - Define the roles, responsibilities, and decision-making processes for the policy.
-
-5. **Controls**: 
-   - Provide actionable controls required for compliance.
-
-6. **Audit Procedures**: 
-   - Outline audit methods and procedures to verify policy adherence.
-
-Format the response as a detailed JSON policy document."""
-
         # Generate policy using LLM
-        response = model.generate_content(policy_prompt)
+        try:
+            response = _analyze("policy", policy_type, pci_dss_context)
+        except UpstreamUnavailable:
+            return _degraded_response("the policy", pci_dss_context)
         return (
             response.text.strip()
             if response.text.strip()
@@ -141,6 +151,7 @@ Format the response as a detailed JSON policy document."""
 
 
 @tool
+@_batch_priority
 def risk_assessor(scenario: str) -> str:
     """
     Performs intelligent risk assessment using PCI DSS context or general security principles.
@@ -152,44 +163,18 @@ def risk_assessor(scenario: str) -> str:
     """
     try:
         # Get relevant PCI DSS context through RAG
-        docs = retriever.invoke(
-            f"PCI DSS requirements and controls related to: {scenario}"
-        )
+        docs = retrieve(ANALYSIS_QUERIES["risk"].format(scenario))
 
         # Combine document contents for context
         pci_dss_context = (
             "\n\n".join([doc.page_content for doc in docs]) if docs else ""
         )
 
-        # Create comprehensive analysis prompt
-        analysis_prompt = f"""You are Dexter.ai, performing a comprehensive risk assessment for a security scenario. 
-
-Scenario: {scenario}
-{f"PCI DSS Context: {pci_dss_context}" if pci_dss_context else "Note: Using general security and risk assessment knowledge."}
-
-**Assessment Structure**:
-1. **Executive Summary**: 
-   - Summarize the key risks and outcomes of the assessment.
-
-2. **Risk Identification**: 
-   - List and assess potential risks in the given scenario.
-
-3. **{'''PCI DSS Requirements Analysis''' if pci_dss_context else "Security Requirements Analysis"}**: 
-   - {'''Detail the PCI DSS requirements that apply to the scenario.''' if pci_dss_context else "Detail the security requirements and standards that apply to the scenario."}
-
-4. **Required Controls**: 
-   - Define the necessary technical and operational controls to mitigate risks.
-
-5. **Mitigation Strategies**: 
-   - Provide a clear strategy for mitigating identified risks.
-
-6. **Implementation Recommendations**: 
-   - Suggest practical, actionable steps to reduce risks and improve compliance.
-
-Format the response as a detailed JSON assessment document."""
-
         # Generate risk assessment using LLM
-        response = model.generate_content(analysis_prompt)
+        try:
+            response = _analyze("risk", scenario, pci_dss_context)
+        except UpstreamUnavailable:
+            return _degraded_response("the risk assessment", pci_dss_context)
 
         if response.text.strip():
             assessment = {
@@ -223,6 +208,7 @@ Format the response as a detailed JSON assessment document."""
 
 
 @tool
+@_batch_priority
 def implementation_planner(requirement: str) -> str:
     """
     Creates implementation plans based on PCI DSS requirements or security best practices.
@@ -234,53 +220,18 @@ def implementation_planner(requirement: str) -> str:
     """
     try:
         # Get relevant PCI DSS context through RAG
-        docs = retriever.invoke(
-            f"""PCI DSS implementation details for: {requirement}
-            Include:
-            - Requirement specifications
-            - Testing procedures
-            - Implementation guidance
-            - Technical requirements"""
-        )
+        docs = retrieve(ANALYSIS_QUERIES["implementation"].format(requirement))
 
         # Combine document contents for context
         pci_dss_context = (
             "\n\n".join([doc.page_content for doc in docs]) if docs else ""
         )
 
-        # Create implementation planning prompt
-        planning_prompt = f"""You are Dexter.ai, generating an implementation plan for {'''PCI DSS compliance''' if pci_dss_context else "security compliance"}. 
-
-Requirement: {requirement}
-{f"PCI DSS Context: {pci_dss_context}" if pci_dss_context else "Note: Using general security implementation knowledge."}
-
-**Plan Structure**:
-1. **Overview**: 
-   - Provide a high-level overview of the requirement and its importance.
-
-2. **Implementation Phases**: 
-   Break down the plan into actionable phases:
-   - **Phase 1: Assessment**
-     * Define the assessment requirements and necessary tools.
-   - **Phase 2: Planning**
-     * Outline how to plan for the implementation, including necessary resources and timelines.
-   - **Phase 3: Execution**
-     * Provide detailed technical steps for the execution of the plan.
-   - **Phase 4: Testing**
-     * Include specific testing procedures to validate compliance.
-   - **Phase 5: Maintenance**
-     * Define ongoing maintenance activities for long-term compliance.
-
-3. **Timeline and Resources**: 
-   - List the expected timeline for each phase and the required resources.
-
-4. **Validation**: 
-   - Explain how to validate successful implementation and compliance.
-
-Format the response as a detailed JSON implementation plan."""
-
         # Generate plan using LLM
-        response = model.generate_content(planning_prompt)
+        try:
+            response = _analyze("implementation", requirement, pci_dss_context)
+        except UpstreamUnavailable:
+            return _degraded_response("the implementation plan", pci_dss_context)
         return (
             response.text.strip()
             if response.text.strip()
@@ -299,3 +250,124 @@ Format the response as a detailed JSON implementation plan."""
                 "timestamp": datetime.now().isoformat(),
             }
         )
+
+
+# Analyses available to the composite assessment
+ASSESSMENT_ANALYSES = list(TOOL_INPUT_LABELS)
+
+
+def _run_analysis(name: str, scenario: str, pci_dss_context: str) -> dict:
+    """Generate one analysis and time it, capturing errors instead of raising."""
+    started = time.perf_counter()
+    try:
+        response = _analyze(name, scenario, pci_dss_context)
+        text = response.text.strip()
+        result = (
+            {"output": text}
+            if text
+            else {"error": f"Could not generate {name} analysis."}
+        )
+    except UpstreamUnavailable as e:
+        result = {"error": f"{name} analysis unavailable: {str(e)}", "degraded": True}
+    except Exception as e:
+        result = {"error": f"Error in {name} analysis: {str(e)}"}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+@tool
+@_batch_priority
+def full_assessment(scenario: str, analyses: Optional[List[str]] = None) -> str:
+    """
+    Runs several assessments of one scenario concurrently.
+
+    Each analysis is given the context its own tool would retrieve; the
+    distinct queries are embedded in one request and searched in one call.
+
+    Args:
+        scenario: Description of the scenario, requirement or policy area
+        analyses: Subset of "compliance", "policy", "risk" and "implementation"
+            (all of them when omitted)
+    Returns:
+        Merged JSON document with one section per analysis
+    """
+    try:
+        selected = analyses or list(ASSESSMENT_ANALYSES)
+        unknown = [name for name in selected if name not in ASSESSMENT_ANALYSES]
+        if unknown:
+            return json.dumps(
+                {
+                    "error": f"Unknown analyses: {', '.join(unknown)}. "
+                    f"Choose from: {', '.join(ASSESSMENT_ANALYSES)}",
+                    "timestamp": datetime.now().isoformat(),
+                }
+            )
+
+        started = time.perf_counter()
+
+        # Each analysis gets the context its own tool would retrieve, with one
+        # embedding request and one search for all of them
+        queries = list(
+            dict.fromkeys(ANALYSIS_QUERIES[name].format(scenario) for name in selected)
+        )
+        docs_by_query = dict(zip(queries, batch_retrieve(queries, boost_topics=False)))
+        docs = {
+            name: docs_by_query[ANALYSIS_QUERIES[name].format(scenario)]
+            for name in selected
+        }
+        contexts = {
+            name: "\n\n".join(doc.page_content for doc in found)
+            for name, found in docs.items()
+        }
+
+        # Run the generations concurrently with bounded parallelism
+        with ThreadPoolExecutor(
+            max_workers=min(ASSESSMENT_MAX_WORKERS, len(selected))
+        ) as executor:
+            futures = {
+                # Each worker gets a copy of the context so the priority holds
+                name: executor.submit(
+                    contextvars.copy_context().run,
+                    _run_analysis,
+                    name,
+                    scenario,
+                    contexts[name],
+                )
+                for name in selected
+            }
+            results = {name: future.result() for name, future in futures.items()}
+        degraded = {
+            name: contexts[name]
+            for name, result in results.items()
+            if result.get("degraded")
+        }
+
+        return json.dumps(
+            {
+                "timestamp": datetime.now().isoformat(),
+                "scenario": scenario,
+                "analyses": results,
+                "metadata": {
+                    "framework": "PCI DSS 4.0"
+                    if any(contexts.values())
+                    else "General Security Best Practices",
+                    # Analyses sharing a query share its chunks
+                    "retrieval_queries": len(queries),
+                    "context_chunks": {
+                        name: len(found) for name, found in docs.items()
+                    },
+                    "wall_seconds": round(time.perf_counter() - started, 3),
+                },
+                # Without the LLM, the retrieved context is the useful part
+                **({"degraded": True, "pci_dss_context": degraded} if degraded else {}),
+            },
+            indent=2,
+        )
+
+    except Exception as e:
+        return json.dumps(
+            {
+                "error": f"Error in full assessment: {str(e)}",
+                "timestamp": datetime.now().isoformat(),
+            }
+        )
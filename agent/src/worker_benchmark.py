@@ -0,0 +1,152 @@
+"""Measure memory and query throughput as serving worker processes scale.
+
+For each worker count, that many processes load the index, either each
+with its own unpickled copy ("private", the default serving mode) or
+attached read-only to shared memory maps ("shared", INDEX_SHARED_MEMORY).
+They then search random query vectors for a fixed time. The report gives
+total RSS, total PSS (shared pages split between the processes mapping
+them, so it adds up to real memory use) and queries per second.
+
+    python worker_benchmark.py --workers 1 2 4 8 --seconds 5
+    python worker_benchmark.py --synthetic-chunks 100000 --dimensions 1536
+
+With --synthetic-chunks, a throwaway index of random vectors and filler
+text is built instead of using the published one.
+"""
+
+import argparse
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from config import RETRIEVER_MAX_K
+from core.index_manager import current_index_version
+from core.local_embeddings import LocalEmbeddings
+from core.shards import ShardedIndex, save_index
+
+FILLER = (
+    "Examine system configuration standards and interview personnel to verify "
+    "that security policies and operational procedures are documented. "
+)
+
+
+def build_synthetic_index(chunks: int, dimensions: int) -> str:
+    path = tempfile.mkdtemp(prefix="worker_benchmark_")
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((chunks, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    texts = [f"{i}.1 {FILLER * 10}" for i in range(chunks)]
+    metadatas = [
+        {"document": "synthetic.pdf", "number": f"{i}.1"} for i in range(chunks)
+    ]
+    save_index(
+        path, texts, vectors.tolist(), metadatas, LocalEmbeddings(), strategy="hash"
+    )
+    return path
+
+
+def _memory() -> Dict[str, int]:
+    """This process's RSS and PSS in bytes, from /proc."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                fields[name.lower()] = int(rest.split()[0]) * 1024
+    return fields
+
+
+def _worker(index_path, shared, queries, seconds, ready, start, results) -> None:
+    index = ShardedIndex.load(
+        index_path, LocalEmbeddings(), rescore=False, shared=shared
+    )
+    index.warm_up()
+    ready.wait()
+    start.wait()
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        index.search([queries[count % len(queries)]], RETRIEVER_MAX_K)
+        count += 1
+    results.put({"queries": count, **_memory()})
+
+
+def measure(index_path: str, shared: bool, workers: int, queries, seconds) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers + 1)
+    start = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_worker,
+            args=(index_path, shared, queries, seconds, ready, start, results),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    ready.wait()
+    start.wait()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    return {
+        "mode": "shared" if shared else "private",
+        "workers": workers,
+        "rss_mb": round(sum(stat["rss"] for stat in stats) / 2**20, 1),
+        "pss_mb": round(sum(stat["pss"] for stat in stats) / 2**20, 1),
+        "qps": round(sum(stat["queries"] for stat in stats) / seconds, 1),
+    }
+
+
+def run_benchmark(
+    index_path: str, worker_counts: List[int], seconds: float, output: str = ""
+) -> List[Dict]:
+    # Export the shared files once, up front, and size the query vectors
+    index = ShardedIndex.load(index_path, LocalEmbeddings(), rescore=False, shared=True)
+    dimensions = next(iter(index.shards.values())).index.d
+    print(f"📚 {index.ntotal} chunks in {len(index.names)} shard(s), {dimensions} dims")
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((64, dimensions)).astype(np.float32)
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).tolist()
+
+    rows = []
+    for workers in worker_counts:
+        for shared in (False, True):
+            row = measure(index_path, shared, workers, queries, seconds)
+            rows.append(row)
+            print(
+                f"   {row['mode']:<8} {workers:>2} worker(s): RSS {row['rss_mb']:>8} MB  "
+                f"PSS {row['pss_mb']:>8} MB  {row['qps']:>8} queries/s"
+            )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"💾 Report written to {output}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-worker serving benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--synthetic-chunks", type=int, default=0)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    print("\n=== Multi-worker Serving Benchmark ===\n")
+    if args.synthetic_chunks:
+        print(f"🧪 Building a synthetic index of {args.synthetic_chunks} chunks...")
+        path = build_synthetic_index(args.synthetic_chunks, args.dimensions)
+    else:
+        _, path = current_index_version()
+    run_benchmark(path, args.workers, args.seconds, args.output)
+    if args.synthetic_chunks:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules import each other from src/, as when run from that directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+# Local deterministic providers, so no API keys or network are needed
+os.environ.setdefault("LLM_PROVIDER", "fake")
@@ -0,0 +1,22 @@
+import pytest
+from core.answers import detect_lookup
+
+
+@pytest.mark.parametrize(
+    "query, number",
+    [
+        ("explain 3.4.1", "3.4.1"),
+        ("What does requirement 6.4 say?", "6.4"),
+        ("req 8.2.3", "8.2.3"),
+        ("requirement 8", "8"),
+        ("explain 3", "3"),
+        ("3.4", "3.4"),
+    ],
+)
+def test_lookups(query, number):
+    assert detect_lookup(query) == number
+
+
+@pytest.mark.parametrize("query", ["1", "2", "3.", "pci 3", "10!"])
+def test_bare_numbers_are_not_lookups(query):
+    assert detect_lookup(query) is None
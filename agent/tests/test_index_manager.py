@@ -0,0 +1,73 @@
+import functools
+
+from core import index_manager
+from core.index_manager import (
+    IndexHolder,
+    IndexWatcher,
+    new_index_version,
+    publish_index_version,
+)
+from core.local_embeddings import (
+    LOCAL_EMBEDDING_FILE,
+    LocalEmbeddings,
+    fit_local_embeddings,
+)
+from core.shards import save_index
+
+CORPUS = [
+    "Install and maintain network security controls",
+    "Apply secure configurations to all system components",
+    "Protect stored account data with strong cryptography",
+    "Protect cardholder data with strong cryptography during transmission",
+    "Protect all systems and networks from malicious software",
+    "Develop and maintain secure systems and software",
+]
+
+
+def build_version(index_dir, texts):
+    """Publish a version embedded with a model fitted on `texts`."""
+    version, path = new_index_version(index_dir)
+    embeddings = fit_local_embeddings(
+        texts, f"{path}/{LOCAL_EMBEDDING_FILE}", dimensions=4
+    )
+    metadatas = [
+        {"document": "pci.pdf", "number": f"{i}.1"} for i in range(1, len(texts) + 1)
+    ]
+    save_index(
+        path,
+        texts,
+        embeddings.embed_documents(texts),
+        metadatas,
+        embeddings,
+        strategy="standard",
+    )
+    publish_index_version(version, index_dir=index_dir)
+    return embeddings
+
+
+def test_refit_model_goes_live_with_its_version(tmp_path, monkeypatch):
+    index_dir = str(tmp_path)
+    monkeypatch.setattr(
+        index_manager,
+        "current_index_version",
+        functools.partial(
+            index_manager.current_index_version, index_dir, legacy_path=None
+        ),
+    )
+    # The model at the legacy location, as loaded when the worker started
+    watcher = IndexWatcher(IndexHolder(), LocalEmbeddings(str(tmp_path / "legacy.npz")))
+    query = "strong cryptography for stored data"
+
+    first = build_version(index_dir, CORPUS)
+    assert watcher.check_once()
+    serving = watcher.holder.current
+    assert serving.embeddings.embed_query(query) == first.embed_query(query)
+
+    refit = build_version(index_dir, list(reversed(CORPUS[2:])))
+    assert refit.embed_query(query) != first.embed_query(query)
+    assert watcher.check_once()
+    assert watcher.holder.current.embeddings.embed_query(query) == refit.embed_query(
+        query
+    )
+    # Requests still holding the old snapshot keep its model
+    assert serving.embeddings.embed_query(query) == first.embed_query(query)
@@ -0,0 +1,67 @@
+import json
+import os
+
+import faiss
+import ingest_service
+from core.index_manager import (
+    current_index_version,
+    new_index_version,
+    publish_index_version,
+)
+from core.providers import build_embeddings
+from core.shards import SHARDS_DIR, save_index
+from ingest_service import IngestionJob, IngestionPipeline
+from setup_index import MANIFEST_FILE, write_manifest
+
+
+def chunks(standard_version, numbers):
+    texts = [f"Requirement {number} of {standard_version}" for number in numbers]
+    metadatas = [
+        {
+            "document": f"pci-{standard_version}",
+            "standard": "PCI DSS",
+            "version": standard_version,
+            "number": number,
+        }
+        for number in numbers
+    ]
+    return texts, metadatas
+
+
+def test_appended_shards_follow_the_base_version_layout(tmp_path, monkeypatch):
+    embeddings = build_embeddings()
+    index_dir = str(tmp_path)
+    monkeypatch.setattr(ingest_service, "FAISS_INDEX_DIR", index_dir)
+    monkeypatch.setattr(ingest_service, "FAISS_INDEX_PATH", None)
+
+    # Base version built with fp16 codes, whatever the environment says now
+    texts, metadatas = chunks("3.2.1", ["1.1", "1.2"])
+    version, path = new_index_version(index_dir)
+    save_index(
+        path,
+        texts,
+        embeddings.embed_documents(texts),
+        metadatas,
+        embeddings,
+        strategy="standard",
+        quantization="fp16",
+    )
+    write_manifest(path, {"shard_strategy": "standard", "quantization": "fp16"})
+    publish_index_version(version, index_dir=index_dir)
+
+    job = IngestionJob(1, "pci-4.0.pdf", None)
+    job.chunks, job.metadatas = chunks("4.0", ["2.1", "2.2"])
+    job.vectors = embeddings.embed_documents(job.chunks)
+    pipeline = IngestionPipeline(status_path=str(tmp_path / "status.json"))
+    job.embeddings = pipeline._serving_embeddings()
+    pipeline._append(None, [job])
+
+    _, path = current_index_version(index_dir, legacy_path=None)
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["quantization"] == "fp16"
+    shards = os.listdir(os.path.join(path, SHARDS_DIR))
+    assert len(shards) == 2
+    for name in shards:
+        index = faiss.read_index(os.path.join(path, SHARDS_DIR, name, "index.faiss"))
+        assert isinstance(index, faiss.IndexScalarQuantizer)
@@ -0,0 +1,25 @@
+import main
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+def serve(monkeypatch, messages):
+    monkeypatch.setattr(main, "lookup_materialized", lambda query: "canned answer")
+    monkeypatch.setattr(main, "materialized_doc_ids", lambda query: [])
+    return main.serve_materialized({"messages": list(messages)})
+
+
+def test_lookup_is_served_from_materialized_answers(monkeypatch):
+    state = serve(monkeypatch, [HumanMessage(content="explain 3.4.1")])
+    assert state["answered"]
+    assert state["messages"][-1].content == "canned answer"
+
+
+def test_reply_to_a_question_is_not_served(monkeypatch):
+    messages = [
+        HumanMessage(content="How do I protect cardholder data?"),
+        AIMessage(content="Do you mean data at rest (3.5) or in transit (4.2)?"),
+        HumanMessage(content="3.5"),
+    ]
+    state = serve(monkeypatch, messages)
+    assert not state["answered"]
+    assert len(state["messages"]) == 3
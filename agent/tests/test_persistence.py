@@ -0,0 +1,71 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+from core.persistence import SQLiteSaver, SQLiteStore, connect
+from langgraph.graph import END, START, StateGraph
+
+
+class State(TypedDict):
+    steps: Annotated[List[str], operator.add]
+
+
+def build_graph(saver):
+    graph = StateGraph(State)
+    graph.add_node("first", lambda state: {"steps": ["first"]})
+    graph.add_node("second", lambda state: {"steps": ["second"]})
+    graph.add_edge(START, "first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", END)
+    return graph.compile(checkpointer=saver, interrupt_before=["second"])
+
+
+def test_checkpoints_and_writes_round_trip(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    config = {"configurable": {"thread_id": "t1"}}
+    build_graph(SQLiteSaver(connect(path))).invoke({"steps": []}, config)
+
+    # A fresh connection resumes the interrupted thread where it stopped
+    saver = SQLiteSaver(connect(path))
+    graph = build_graph(saver)
+    assert graph.get_state(config).next == ("second",)
+    assert graph.invoke(None, config) == {"steps": ["first", "second"]}
+    history = list(saver.list(config))
+    assert len(history) >= 4
+    assert history[0].checkpoint["channel_values"]["steps"] == ["first", "second"]
+    assert history[0].parent_config == history[1].config
+
+    latest = saver.get_tuple(config)
+    saver.put_writes(latest.config, [("steps", ["pending"])], "task-1")
+    assert SQLiteSaver(connect(path)).get_tuple(config).pending_writes == [
+        ("task-1", "steps", ["pending"])
+    ]
+
+    saver.delete_thread("t1")
+    assert saver.get_tuple(config) is None
+
+
+def test_store_round_trip(tmp_path, capsys):
+    store = SQLiteStore(connect(str(tmp_path / "store.db")))
+    store.put(("users", "u1"), "prefs", {"tone": "brief"})
+    store.put(("users", "u1", "notes"), "n1", {"text": "PCI scope"})
+    store.put(("users", "u2"), "prefs", {"tone": "detailed"})
+
+    assert store.get(("users", "u1"), "prefs").value == {"tone": "brief"}
+    assert store.get(("users", "u1"), "missing") is None
+    found = store.search(("users", "u1"))
+    assert {(item.namespace, item.key) for item in found} == {
+        (("users", "u1"), "prefs"),
+        (("users", "u1", "notes"), "n1"),
+    }
+    assert [
+        item.key for item in store.search(("users",), filter={"tone": "detailed"})
+    ] == ["prefs"]
+
+    # Queries are not ranked, and say so instead of passing silently
+    ranked = store.search(("users", "u2"), query="tone")
+    assert [item.score for item in ranked] == [None]
+    assert "no semantic search" in capsys.readouterr().out
+
+    store.delete(("users", "u1"), "prefs")
+    assert store.get(("users", "u1"), "prefs") is None
+    assert len(store.search(("users",))) == 2
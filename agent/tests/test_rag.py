@@ -0,0 +1,103 @@
+from core import rag
+from core.query_builder import build_retrieval_query
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+def retrieval_filters(monkeypatch, query):
+    calls = []
+
+    def retrieve(query, filter=None, **kwargs):
+        calls.append(filter)
+        return []
+
+    monkeypatch.setattr(rag, "retrieve", retrieve)
+    rag._find_docs(query, [], bundle=None)
+    return calls
+
+
+def test_numbers_from_earlier_turns_are_not_looked_up(monkeypatch):
+    query = build_retrieval_query(
+        [
+            HumanMessage(content="Explain requirement 8.2"),
+            AIMessage(content="..."),
+            HumanMessage(content="How should stored passwords be protected?"),
+        ]
+    )
+    assert "Earlier: Explain requirement 8.2" in query
+    assert retrieval_filters(monkeypatch, query) == [None]
+
+
+def test_numbers_in_the_current_question_are_looked_up(monkeypatch):
+    query = "Explain requirement 8.2\nEarlier: What is requirement 3.4?"
+    filters = retrieval_filters(monkeypatch, query)
+    assert filters[0]["number"] == "8.2"
+
+
+def test_earlier_turns_stay_out_of_the_model_query(monkeypatch):
+    payloads = []
+
+    class Model:
+        def generate_content(self, payload):
+            payloads.append(payload)
+            return type("Response", (), {"text": "answer"})()
+
+    monkeypatch.setattr(rag, "prompt_model", lambda kind: Model())
+    monkeypatch.setattr(rag, "format_context", lambda docs: "context")
+    rag._answer_from_docs("Why?\nEarlier: Explain requirement 8.2", ["doc"], [])
+    assert payloads[0].startswith('QUERY: "Why?"')
+    assert "Earlier" not in payloads[0]
+
+
+class Index:
+    def __init__(self, docs):
+        self.docs = {
+            (doc.metadata["document"], doc.metadata["number"]): doc for doc in docs
+        }
+
+    def lookup(self, document, number):
+        return self.docs.get((document, number))
+
+
+class Bundle:
+    def __init__(self, docs):
+        self.index = Index(docs)
+        self.graph = {}
+        self.embeddings = None
+
+
+def chunk(number, parent=None):
+    metadata = {"document": "pci", "number": number, "type": "requirement"}
+    if parent:
+        metadata["parent_requirement"] = parent
+    return Document(page_content=f"Requirement {number}", metadata=metadata)
+
+
+def same_vector_turn(monkeypatch, question, found, docs):
+    """A turn whose query embeds exactly like the previous turn's."""
+    monkeypatch.setattr(rag.embedding_model, "embed_query", lambda query: [1.0, 0.0])
+    monkeypatch.setattr(rag, "_search_embeddings", lambda *args, **kwargs: [found])
+    monkeypatch.setattr(rag, "_find_docs", lambda *args: ["fresh"])
+    return rag.retrieve_for_turn(
+        question, [], Bundle(docs), ["pci::8.2"], last_query_vector=[1.0, 0.0]
+    )
+
+
+def test_new_requirement_number_skips_the_delta_path(monkeypatch):
+    docs, _, reuse = same_vector_turn(
+        monkeypatch, "Explain requirement 8.3 for passwords", [], [chunk("8.2")]
+    )
+    assert (docs, reuse) == (["fresh"], "fresh")
+
+
+def test_delta_chunks_are_expanded_like_fresh_ones(monkeypatch):
+    monkeypatch.setattr(rag, "RETRIEVER_EXPAND_PARENTS", True)
+    parent, previous = chunk("10.2"), chunk("8.2")
+    docs, _, reuse = same_vector_turn(
+        monkeypatch,
+        "How should requirement 8.2 passwords be logged?",
+        [chunk("10.2.1", parent="10.2")],
+        [previous, parent],
+    )
+    assert reuse == "delta"
+    assert [doc.metadata["number"] for doc in docs] == ["8.2", "10.2", "10.2.1"]
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from core.budget import run_budgeted, start_budget
+from core.providers import FakeGenerativeModel
+from core.resilience import (
+    BudgetExceeded,
+    CircuitBreaker,
+    ResilientCaller,
+    ResilientModel,
+    UpstreamUnavailable,
+    deadline,
+)
+from core.scheduler import ScheduledModel, UpstreamScheduler
+
+
+def in_thread(fn):
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_abandoned_budget_calls_do_not_block_new_ones():
+    caller = ResilientCaller("test", attempts=1, hedge=False)
+    stuck = threading.Event()
+
+    def slow():
+        with deadline(0.1):
+            try:
+                caller.call(stuck.wait, 3)
+            except BudgetExceeded:
+                pass
+
+    try:
+        for _ in range(40):
+            in_thread(slow)
+        time.sleep(0.2)
+        with deadline(1.0):
+            assert caller.call(lambda: "fast") == "fast"
+    finally:
+        stuck.set()
+
+
+def test_budgeted_nodes_do_not_wait_behind_overruns():
+    stuck = threading.Event()
+
+    def overrun():
+        state = {"messages": []}
+        start_budget(state, 0.1)
+        run_budgeted("understand", lambda s: stuck.wait(3) or s, state, dict)
+
+    try:
+        for _ in range(40):
+            in_thread(overrun)
+        time.sleep(0.2)
+        state = {"messages": []}
+        start_budget(state, 1.0)
+        result = run_budgeted("understand", dict, state, dict)
+        assert result["budget_log"][-1]["outcome"] == "ok"
+    finally:
+        stuck.set()
+
+
+def test_admission_gives_up_at_the_deadline():
+    scheduler = UpstreamScheduler("test", 1)
+    held = scheduler.acquire()
+    started = time.monotonic()
+    with deadline(0.1), pytest.raises(BudgetExceeded):
+        scheduler.acquire()
+    assert time.monotonic() - started < 1.0
+    assert scheduler.metrics()["queue_depth"] == 0
+    scheduler.release(held)
+
+
+def test_client_timeout_follows_the_budget():
+    caller = ResilientCaller("test", hedge=False)
+    model = ResilientModel(
+        ScheduledModel(FakeGenerativeModel(latency=2.0), UpstreamScheduler("test", 1)),
+        caller,
+    )
+    started = time.monotonic()
+    with deadline(0.2), pytest.raises(BudgetExceeded):
+        model.generate_content("slow")
+    assert time.monotonic() - started < 1.0
+    # Running out of request budget says nothing about the upstream
+    assert caller.breaker.state == "closed"
+    assert caller.stats["failures"] == 0
+
+
+class AsyncModel:
+    """Answers after the given latencies in turn, then instantly."""
+
+    def __init__(self, *latencies):
+        self.latencies = list(latencies)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        if self.latencies:
+            await asyncio.sleep(self.latencies.pop(0))
+        return prompt
+
+
+def test_budget_overruns_in_acall_release_their_slots():
+    scheduler = UpstreamScheduler("test", 1)
+    caller = ResilientCaller("test", attempts=1, hedge=False)
+    model = ResilientModel(ScheduledModel(AsyncModel(0.5, 0.5, 0.5), scheduler), caller)
+
+    async def overrun():
+        with deadline(0.1):
+            try:
+                await model.generate_content_async("slow")
+            except BudgetExceeded:
+                pass
+
+    async def scenario():
+        # One call is cancelled upstream, the others while queued for the slot
+        await asyncio.gather(*(overrun() for _ in range(3)))
+        await asyncio.sleep(0.1)
+        assert scheduler.metrics()["in_flight"] == 0
+        assert scheduler.metrics()["queue_depth"] == 0
+        with deadline(1.0):
+            assert await model.generate_content_async("fast") == "fast"
+
+    asyncio.run(scenario())
+    assert caller.stats["out_of_budget"] == 3
+
+
+def test_losing_hedge_in_acall_releases_its_slot():
+    scheduler = UpstreamScheduler("test", 2)
+    caller = ResilientCaller("test", attempts=1, hedge=True)
+    for _ in range(caller.latency.min_samples):
+        caller.latency.record(0.05)
+    model = ResilientModel(ScheduledModel(AsyncModel(1.0), scheduler), caller)
+
+    async def scenario():
+        assert await model.generate_content_async("hedged") == "hedged"
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert caller.stats["hedge_wins"] == 1
+    assert scheduler.metrics()["in_flight"] == 0
+
+
+def test_stats_count_every_call_across_threads():
+    caller = ResilientCaller("test", hedge=False)
+    threads = [
+        in_thread(lambda: [caller.call(lambda: None) for _ in range(500)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.join()
+    assert caller.snapshot()["calls"] == 4000
+
+
+def half_open_caller():
+    """A caller whose circuit has opened and is ready for a trial call."""
+    caller = ResilientCaller(
+        "test",
+        attempts=1,
+        hedge=False,
+        breaker=CircuitBreaker("test", failure_threshold=1, reset_seconds=0.05),
+    )
+
+    def down():
+        raise ConnectionError("down")
+
+    with pytest.raises(UpstreamUnavailable):
+        caller.call(down)
+    assert caller.breaker.state == "open"
+    time.sleep(0.1)
+    return caller
+
+
+def timed_out():
+    time.sleep(0.15)
+    raise TimeoutError("client timeout")
+
+
+def admission_timed_out():
+    raise BudgetExceeded("admission timed out")
+
+
+@pytest.mark.parametrize("trial", [timed_out, admission_timed_out])
+def test_trial_call_out_of_budget_does_not_wedge_the_circuit(trial):
+    caller = half_open_caller()
+    with deadline(0.1), pytest.raises(BudgetExceeded):
+        caller.call(trial)
+    assert caller.call(lambda: "ok") == "ok"
+    assert caller.breaker.state == "closed"
+
+
+def test_cancelled_trial_call_does_not_wedge_the_circuit():
+    caller = half_open_caller()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        trial = asyncio.ensure_future(caller.acall(hang))
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        assert await caller.acall(ok) == "ok"
+
+    asyncio.run(scenario())
+    assert caller.breaker.state == "closed"
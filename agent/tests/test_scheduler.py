@@ -0,0 +1,46 @@
+import asyncio
+
+from core.scheduler import ScheduledModel, UpstreamScheduler
+
+
+class SlowModel:
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(0.2)
+        return prompt
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    scheduler = UpstreamScheduler("test", 1)
+    model = ScheduledModel(SlowModel(), scheduler)
+
+    async def scenario():
+        running = asyncio.create_task(model.generate_content_async("first"))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(model.generate_content_async("second"))
+        await asyncio.sleep(0.05)
+        assert scheduler.metrics()["queue_depth"] == 1
+        waiting.cancel()
+        assert await running == "first"
+        await asyncio.sleep(0.1)
+        assert scheduler.metrics()["in_flight"] == 0
+        # A later call still gets the slot
+        assert await model.generate_content_async("third") == "third"
+
+    asyncio.run(scenario())
+    metrics = scheduler.metrics()
+    assert metrics["in_flight"] == 0
+    assert metrics["queue_depth"] == 0
+
+
+def test_cancel_after_admission_releases_the_slot():
+    scheduler = UpstreamScheduler("test", 1)
+
+    async def scenario():
+        # Admitted immediately, but the caller is cancelled before resuming
+        acquiring = asyncio.create_task(scheduler.acquire_async())
+        await asyncio.sleep(0)
+        acquiring.cancel()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert scheduler.metrics()["in_flight"] == 0
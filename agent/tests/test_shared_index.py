@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+from core.providers import build_embeddings
+from core.retrieval import filtered_positions
+from core.shards import ShardedIndex, save_index
+from core.shared_index import SHARED_META_FILE, MappedDocstore, load_shared_shard
+from langchain_community.vectorstores import FAISS
+
+
+def build(path):
+    embeddings = build_embeddings()
+    texts = [f"Requirement {number} text" for number in ("1.1", "1.2", "2.1")]
+    metadatas = [
+        {"document": "pci", "number": number, "parent_requirement": number[0]}
+        for number in ("1.1", "1.2", "2.1")
+    ]
+    save_index(
+        str(path),
+        texts,
+        embeddings.embed_documents(texts),
+        metadatas,
+        embeddings,
+        strategy="none",
+    )
+    return embeddings
+
+
+def test_shards_are_exported_when_built(tmp_path):
+    embeddings = build(tmp_path)
+    assert os.path.exists(tmp_path / SHARED_META_FILE)
+
+    store = load_shared_shard(str(tmp_path), embeddings)
+    assert isinstance(store.docstore, MappedDocstore)
+    assert store.docstore.metadata(store.index_to_docstore_id[1])["number"] == "1.2"
+    positions = filtered_positions(store, {"parent_requirement": "1"})
+    assert np.array_equal(positions, [0, 1])
+
+    index = ShardedIndex.load(str(tmp_path), embeddings, shared=True)
+    assert index.lookup("pci", "2.1").page_content == "Requirement 2.1 text"
+    assert [doc.metadata["number"] for doc in index.children("pci", "1")] == [
+        "1.1",
+        "1.2",
+    ]
+
+
+def test_serving_never_writes_into_an_index(tmp_path):
+    embeddings = build(tmp_path)
+    # An index built before shared files were exported with it
+    store = FAISS.load_local(
+        str(tmp_path), embeddings, allow_dangerous_deserialization=True
+    )
+    for name in os.listdir(tmp_path):
+        if name.startswith("shared_"):
+            os.remove(tmp_path / name)
+    before = sorted(os.listdir(tmp_path))
+
+    loaded = load_shared_shard(str(tmp_path), embeddings)
+    assert sorted(os.listdir(tmp_path)) == before
+    assert loaded.index.ntotal == store.index.ntotal
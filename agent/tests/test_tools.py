@@ -0,0 +1,30 @@
+import json
+
+from langchain_core.documents import Document
+from utils import tools
+
+
+def test_full_assessment_retrieves_every_analysis_in_one_batch(monkeypatch):
+    batches = []
+    contexts = {}
+
+    def batch_retrieve(queries, boost_topics=True):
+        batches.append(queries)
+        return [[Document(page_content=query)] for query in queries]
+
+    def run_analysis(name, scenario, pci_dss_context):
+        contexts[name] = pci_dss_context
+        return {"output": name}
+
+    monkeypatch.setattr(tools, "batch_retrieve", batch_retrieve)
+    monkeypatch.setattr(tools, "_run_analysis", run_analysis)
+    result = json.loads(tools.full_assessment.invoke({"scenario": "card storage"}))
+
+    # Compliance and risk share a query, so three queries cover four analyses
+    assert len(batches) == 1 and len(batches[0]) == 3
+    for name, template in tools.ANALYSIS_QUERIES.items():
+        assert contexts[name] == template.format("card storage")
+    assert result["metadata"]["retrieval_queries"] == 3
+    assert result["metadata"]["context_chunks"] == {
+        name: 1 for name in tools.ASSESSMENT_ANALYSES
+    }